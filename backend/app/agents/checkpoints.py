@@ -0,0 +1,193 @@
+import os
+import time
+import uuid
+import socket
+import asyncio
+from typing import Any, Dict, List, Optional
+from app.core.config import settings
+from app.core.logger import logger
+from app.core.metrics import CHECKPOINT_SECONDS
+from app.core.session import session_manager
+from app.db.redis import get_redis
+
+# Extend or drop the lease only while this worker still holds it.
+RENEW_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then return redis.call('EXPIRE', KEYS[1], ARGV[2]) end
+return 0
+"""
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then return redis.call('DEL', KEYS[1]) end
+return 0
+"""
+
+class SessionLease:
+    """
+    One worker runs a session at a time (`session_lease:{id}`, renewed while it runs).
+
+    With late acks, Celery redelivers a task whose worker died, and the Redis broker
+    also redelivers tasks that outlive its visibility timeout. The lease keeps the
+    second case from running a session twice, and in the first case the new worker
+    takes over once the dead worker's lease expires (SESSION_LEASE_TTL).
+    """
+
+    PREFIX = "session_lease:"
+    MIGRATE_PREFIX = "session_migrate:"
+
+    @staticmethod
+    def new_token() -> str:
+        return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+    async def acquire(self, session_id: str, token: str, wait: float = None) -> bool:
+        """Take the lease, waiting up to `wait` seconds (default: one TTL) for a previous holder's to expire."""
+        redis = await get_redis()
+        ttl = settings.SESSION_LEASE_TTL
+        deadline = time.monotonic() + (ttl + 1 if wait is None else wait)
+        while True:
+            if await redis.set(f"{self.PREFIX}{session_id}", token, nx=True, ex=ttl):
+                return True
+            if time.monotonic() >= deadline:
+                return False
+            await asyncio.sleep(min(1.0, max(0.0, deadline - time.monotonic())))
+
+    async def renew(self, session_id: str, token: str) -> bool:
+        redis = await get_redis()
+        return bool(await redis.eval(RENEW_SCRIPT, 1, f"{self.PREFIX}{session_id}", token, settings.SESSION_LEASE_TTL))
+
+    async def release(self, session_id: str, token: str):
+        redis = await get_redis()
+        await redis.eval(RELEASE_SCRIPT, 1, f"{self.PREFIX}{session_id}", token)
+
+    async def request_migration(self, session_id: str):
+        """Ask the worker running the session to checkpoint it and hand it back to the queue."""
+        redis = await get_redis()
+        await redis.set(f"{self.MIGRATE_PREFIX}{session_id}", "1", ex=settings.SESSION_LEASE_TTL * 10)
+
+    async def take_migration_request(self, session_id: str) -> bool:
+        redis = await get_redis()
+        return bool(await redis.getdel(f"{self.MIGRATE_PREFIX}{session_id}"))
+
+class Checkpointer:
+    """
+    Periodic checkpoints of a running session: storage_state, URL, planner history,
+    step counter and task, in the same form as suspend snapshots.
+
+    A checkpoint is written every `interval` steps. Its cost (capturing storage
+    state plus the Redis write) is compared with the wall time of the steps it
+    covers; above CHECKPOINT_OVERHEAD_BUDGET the interval doubles (up to
+    CHECKPOINT_MAX_INTERVAL), well below it the interval shrinks back. While the
+    session holds its lease, a heartbeat renews it and picks up migration requests.
+    If the lease is lost (Redis unreachable past the TTL, a stalled loop), another
+    worker may already be running the session, so the heartbeat cancels the task
+    that acquired it and `lease_lost` tells the orchestrator why.
+    With CHECKPOINTS_ENABLED off, nothing is leased or written.
+    """
+
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.enabled = settings.CHECKPOINTS_ENABLED
+        self.token = session_lease.new_token()
+        self.interval = settings.CHECKPOINT_INTERVAL
+        self.migration_requested = False
+        self.lease_lost = False
+        self._owner: Optional[asyncio.Task] = None
+        self._steps = 0
+        self._window_start = time.monotonic()
+        self._heartbeat: Optional[asyncio.Task] = None
+        self._capture_seconds = 0.0
+        self.stats = {"checkpoints": 0, "seconds": 0.0, "bytes": 0, "max_overhead": 0.0}
+
+    async def acquire(self, wait: float = None) -> bool:
+        if not self.enabled:
+            return True
+        if not await session_lease.acquire(self.session_id, self.token, wait):
+            return False
+        self._owner = asyncio.current_task()
+        self._heartbeat = asyncio.create_task(self._beat())
+        return True
+
+    async def load(self) -> Optional[Dict[str, Any]]:
+        return await session_manager.load_checkpoint(self.session_id) if self.enabled else None
+
+    def step_done(self) -> bool:
+        """Count a finished step; True when a checkpoint is due."""
+        self._steps += 1
+        return self.enabled and self._steps >= self.interval
+
+    async def capture(self, context, page, history: List[Dict[str, Any]], task: Optional[str],
+                      step_count: int) -> Dict[str, Any]:
+        """
+        The session at this step boundary. Taken before the next step runs, so URL,
+        cookies and history all describe the same step; `write()` may run later.
+        A checkpoint without a task is a session waiting for input.
+        """
+        start = time.monotonic()
+        checkpoint = {
+            "url": page.url,
+            "storage_state": await context.storage_state(),
+            "history": list(history),
+            "task": task,
+            "step_count": step_count,
+            "checkpointed_at": time.time(),
+            "worker": self.token,
+        }
+        self._capture_seconds = time.monotonic() - start
+        return checkpoint
+
+    async def save(self, context, page, history: List[Dict[str, Any]], task: Optional[str], step_count: int):
+        await self.write(await self.capture(context, page, history, task, step_count))
+
+    async def write(self, checkpoint: Dict[str, Any]):
+        start = time.monotonic()
+        size = await session_manager.save_checkpoint(self.session_id, checkpoint)
+        end = time.monotonic()
+        elapsed = end - start + self._capture_seconds
+        CHECKPOINT_SECONDS.observe(elapsed)
+
+        # Overhead: checkpoint time relative to the steps since the last checkpoint
+        overhead = elapsed / max(start - self._window_start, 1e-6)
+        budget = settings.CHECKPOINT_OVERHEAD_BUDGET
+        if overhead > budget and self.interval < settings.CHECKPOINT_MAX_INTERVAL:
+            self.interval = min(self.interval * 2, settings.CHECKPOINT_MAX_INTERVAL)
+            logger.info("checkpoint_interval_raised", session_id=self.session_id, interval=self.interval,
+                        overhead=round(overhead, 4))
+        elif overhead < budget / 4 and self.interval > settings.CHECKPOINT_INTERVAL:
+            self.interval = max(self.interval // 2, settings.CHECKPOINT_INTERVAL)
+        self.stats["checkpoints"] += 1
+        self.stats["seconds"] += elapsed
+        self.stats["bytes"] += size
+        self.stats["max_overhead"] = max(self.stats["max_overhead"], overhead)
+        self._steps = 0
+        self._window_start = end
+
+    async def close(self, keep_checkpoint: bool = False):
+        """Release the lease; the checkpoint is dropped unless another worker should continue from it."""
+        if not self.enabled:
+            return
+        if self._heartbeat:
+            self._heartbeat.cancel()
+        try:
+            if not keep_checkpoint:
+                await session_manager.delete_checkpoint(self.session_id)
+            await session_lease.release(self.session_id, self.token)
+        except Exception as e:
+            logger.error("checkpoint_close_failed", session_id=self.session_id, error=str(e))
+        if self.stats["checkpoints"]:
+            logger.info("session_checkpoints", session_id=self.session_id, interval=self.interval,
+                        **{k: round(v, 4) if isinstance(v, float) else v for k, v in self.stats.items()})
+
+    async def _beat(self):
+        while True:
+            await asyncio.sleep(settings.SESSION_LEASE_TTL / 3)
+            try:
+                if not await session_lease.renew(self.session_id, self.token):
+                    logger.warning("session_lease_lost", session_id=self.session_id)
+                    self.lease_lost = True
+                    if self._owner is not None:
+                        self._owner.cancel()
+                    return
+                if await session_lease.take_migration_request(self.session_id):
+                    self.migration_requested = True
+            except Exception as e:
+                logger.error("session_heartbeat_failed", session_id=self.session_id, error=str(e))
+
+session_lease = SessionLease()
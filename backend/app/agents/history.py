@@ -0,0 +1,140 @@
+import json
+from typing import Any, Dict, List, Optional
+from app.core.config import settings
+from app.core.logger import logger
+
+# Characters of tool output kept per step in the prompt; page text is the only output
+# the planner reads for content, the others are status lines.
+TOOL_OUTPUT_LIMITS = {"get_page_text": 1500, "get_screenshot": 40}
+DEFAULT_OUTPUT_LIMIT = 300
+ERROR_LIMIT = 300
+THOUGHT_LIMIT = 200
+MESSAGE_LIMIT = 1000
+SUMMARY_ARG_LIMIT = 60
+
+_encoding = None
+_encoding_failed = False
+
+def count_tokens(text: str) -> int:
+    """Tokens in `text` with the local tiktoken encoding (PROMPT_TOKENIZER), else ~4 characters per token."""
+    global _encoding, _encoding_failed
+    if _encoding is None and not _encoding_failed and settings.PROMPT_TOKENIZER:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding(settings.PROMPT_TOKENIZER)
+        except Exception as e:
+            # Not installed, or the encoding file is not cached and cannot be downloaded
+            _encoding_failed = True
+            logger.warning("tokenizer_unavailable", tokenizer=settings.PROMPT_TOKENIZER, error=str(e))
+    if _encoding is not None:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return (len(text) + 3) // 4
+
+def _clip(value: Any, limit: int) -> Any:
+    if isinstance(value, str) and len(value) > limit:
+        return f"{value[:limit]}... [{len(value) - limit} chars truncated]"
+    return value
+
+def _clip_output(output: Any, limit: int) -> Any:
+    if isinstance(output, str):
+        return _clip(output, limit)
+    if output is None or isinstance(output, (bool, int, float)):
+        return output
+    return _clip(json.dumps(output, default=str), limit)
+
+def compact_step(entry: Dict[str, Any], output_scale: float = 1.0, observation: bool = True) -> Dict[str, Any]:
+    """A step as the planner needs it: no screenshots or timings, outputs truncated per tool."""
+    if "plan" not in entry:
+        return {k: _clip(v, MESSAGE_LIMIT) for k, v in entry.items()}
+    plan = entry.get("plan") or {}
+    compact_plan = {k: plan[k] for k in ("action", "args", "actions") if k in plan}
+    if plan.get("thought_summary"):
+        compact_plan["thought_summary"] = _clip(plan["thought_summary"], THOUGHT_LIMIT)
+
+    result = entry.get("result") or {}
+    limit = int(TOOL_OUTPUT_LIMITS.get(plan.get("action"), DEFAULT_OUTPUT_LIMIT) * output_scale)
+    compact_result = {"success": result.get("success"), "output": _clip_output(result.get("output"), limit)}
+    if result.get("error"):
+        compact_result["error"] = _clip(result["error"], ERROR_LIMIT)
+
+    step = {"step": entry.get("step"), "plan": compact_plan, "result": compact_result}
+    if entry.get("url"):
+        step["url"] = entry["url"]
+    if observation and entry.get("observation"):
+        step["observation"] = entry["observation"]
+    return step
+
+def summarize_step(entry: Dict[str, Any]) -> str:
+    """One line per older step, e.g. `step 3: click(selector=#go) -> ok`."""
+    if "plan" not in entry:
+        return f"user: {_clip(entry.get('content') or '', SUMMARY_ARG_LIMIT)}"
+    plan = entry.get("plan") or {}
+    actions = plan.get("actions") or [plan]
+    calls = []
+    for action in actions:
+        args = ", ".join(f"{k}={_clip(str(v), SUMMARY_ARG_LIMIT)}" for k, v in (action.get("args") or {}).items())
+        calls.append(f"{action.get('action')}({args})")
+    result = entry.get("result") or {}
+    outcome = "ok" if result.get("success") else f"failed: {_clip(result.get('error') or '', SUMMARY_ARG_LIMIT)}"
+    return f"step {entry.get('step')}: {'; '.join(calls)} -> {outcome}"
+
+class HistoryCompactor:
+    """
+    Renders session history for the planner prompt within HISTORY_TOKEN_BUDGET tokens.
+
+    The last `recent` entries are kept as compacted steps. Older ones become a rolling
+    one-line-per-step summary, newest lines kept when it outgrows its share of the
+    budget. Over budget, the compactor drops the observations of older recent steps,
+    halves tool outputs, folds the oldest recent steps into the summary, and as a
+    last resort leaves out the oldest entries altogether.
+    """
+
+    SUMMARY_SHARE = 0.25
+
+    def __init__(self, token_budget: int = None, recent: int = None):
+        self.token_budget = token_budget or settings.HISTORY_TOKEN_BUDGET
+        self.recent = recent or settings.HISTORY_RECENT_STEPS
+
+    def _summary(self, older: List[Dict[str, Any]]) -> Optional[str]:
+        if not older:
+            return None
+        budget = int(self.token_budget * self.SUMMARY_SHARE)
+        lines, used = [], 0
+        for entry in reversed(older):
+            line = summarize_step(entry)
+            cost = count_tokens(line) + 1
+            if used + cost > budget:
+                lines.append(f"({len(older) - len(lines)} earlier steps omitted)")
+                break
+            lines.append(line)
+            used += cost
+        return "\n".join(reversed(lines))
+
+    def render(self, history: List[Dict[str, Any]]) -> str:
+        split = max(0, len(history) - self.recent)
+        scale = 1.0
+        squeezed = False  # once over budget, only the newest step keeps its observation
+        while True:
+            older, recent = history[:split], history[split:]
+            steps = [compact_step(entry, scale, observation=not squeezed or i == len(recent) - 1)
+                     for i, entry in enumerate(recent)]
+            summary = self._summary(older)
+            rendered = json.dumps({"summary": summary, "steps": steps} if summary else steps)
+            tokens = count_tokens(rendered)
+            if tokens <= self.token_budget:
+                return rendered
+            if not squeezed:
+                squeezed = True
+            elif scale > 0.1:
+                scale /= 2
+            elif split < len(history):
+                split += 1
+            elif history:
+                # Over budget with everything summarized (a tiny budget, or the ~4 chars per
+                # token estimate): drop whole entries, oldest first, so the JSON stays valid
+                history = history[1:]
+                split = len(history)
+            else:
+                return rendered
+
+history_compactor = HistoryCompactor()
@@ -1,104 +1,158 @@
-from typing import List, Dict, Any, Optional
-from openai import AsyncOpenAI
+from typing import List, Dict, Any, Optional, AsyncIterator, Mapping, Tuple
+import httpx
+from openai import AsyncOpenAI, AsyncAzureOpenAI
 from app.core.config import settings
 
+def http_client() -> httpx.AsyncClient:
+    """Keep-alive pool shared by all requests of one provider client."""
+    return httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=settings.LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.LLM_MAX_CONNECTIONS,
+            keepalive_expiry=settings.LLM_KEEPALIVE_EXPIRY,
+        ),
+        timeout=httpx.Timeout(settings.LLM_TIMEOUT, connect=10.0),
+    )
+
+def client_options() -> Dict[str, Any]:
+    # With the middleware on, retries happen there (with rate-limit awareness), not in the SDK.
+    return {"http_client": http_client(), "max_retries": 0 if settings.LLM_MIDDLEWARE_ENABLED else 2}
+
 class LLMProvider:
     async def generate(self, messages: List[Dict[str, str]], json_mode: bool = True) -> str:
         raise NotImplementedError
 
-class OpenAICompatibleProvider(LLMProvider):
-    """Handles OpenAI, Groq, and other compatible APIs"""
-    def __init__(self):
-        msg = f"Initializing OpenAICompatibleProvider with base_url={settings.LLM_BASE_URL}, model={settings.LLM_MODEL}"
-        print(msg)
-        
-        self.client = AsyncOpenAI(
-            api_key=settings.LLM_API_KEY or settings.OPENAI_API_KEY,
-            base_url=settings.LLM_BASE_URL # Required for Groq
-        )
-        self.model = settings.LLM_MODEL or "gpt-4-turbo-preview"
+    async def generate_raw(self, messages: List[Dict[str, str]], json_mode: bool = True) -> Tuple[str, Mapping[str, str]]:
+        """Completion text plus the HTTP response headers (rate-limit state). Providers without headers return {}."""
+        return await self.generate(messages, json_mode=json_mode), {}
 
-    async def generate(self, messages: List[Dict[str, str]], json_mode: bool = True) -> str:
+    async def generate_stream(self, messages: List[Dict[str, str]], json_mode: bool = True) -> AsyncIterator[str]:
+        """Yield the completion in text deltas. Providers without streaming yield it whole."""
+        yield await self.generate(messages, json_mode=json_mode)
+
+class ChatCompletionsProvider(LLMProvider):
+    """Calls shared by clients exposing the OpenAI `chat.completions` API (OpenAI, Azure, Groq)."""
+    client: Any
+    model: str
+
+    def _request_kwargs(self, messages: List[Dict[str, str]], json_mode: bool, **extra) -> Dict[str, Any]:
         kwargs = {
             "model": self.model,
             "messages": messages,
-            "temperature": 0.0
+            "temperature": 0.0,
+            **extra
         }
         if json_mode:
-            # Note: Grok beta might not support strict json_object mode yet, 
+            # Note: Grok beta might not support strict json_object mode yet,
             # but usually OpenAI compat APIs do.
             # If Grok fails with this, we might need a flag to disable it.
             kwargs["response_format"] = {"type": "json_object"}
-            
+        return kwargs
+
+    async def generate(self, messages: List[Dict[str, str]], json_mode: bool = True) -> str:
         try:
-            response = await self.client.chat.completions.create(**kwargs)
+            response = await self.client.chat.completions.create(**self._request_kwargs(messages, json_mode))
             return response.choices[0].message.content
         except Exception as e:
-            print(f"LLM Generation Error: {e}")
+            print(f"{type(self).__name__} Generation Error: {e}")
             raise e
 
-class AzureOpenAIProvider(LLMProvider):
-    def __init__(self):
+    async def generate_raw(self, messages: List[Dict[str, str]], json_mode: bool = True) -> Tuple[str, Mapping[str, str]]:
+        raw = await self.client.chat.completions.with_raw_response.create(**self._request_kwargs(messages, json_mode))
+        return raw.parse().choices[0].message.content, raw.headers
+
+    async def generate_stream(self, messages: List[Dict[str, str]], json_mode: bool = True) -> AsyncIterator[str]:
+        stream = await self.client.chat.completions.create(**self._request_kwargs(messages, json_mode, stream=True))
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+class OpenAICompatibleProvider(ChatCompletionsProvider):
+    """Handles OpenAI, Groq, and other compatible APIs"""
+    def __init__(self, api_key: Optional[str] = None, base_url: Optional[str] = None, model: Optional[str] = None):
+        base_url = base_url or settings.LLM_BASE_URL
+        model = model or settings.LLM_MODEL
+        msg = f"Initializing OpenAICompatibleProvider with base_url={base_url}, model={model}"
+        print(msg)
+        
         self.client = AsyncOpenAI(
-            api_key=settings.LLM_API_KEY,
-            api_version=settings.OPENAI_API_VERSION,
-            azure_endpoint=settings.LLM_BASE_URL,
+            api_key=api_key or settings.LLM_API_KEY or settings.OPENAI_API_KEY,
+            base_url=base_url, # Required for Groq
+            **client_options()
         )
-        self.deployment_name = settings.LLM_MODEL
+        self.model = model or "gpt-4-turbo-preview"
 
-    async def generate(self, messages: List[Dict[str, str]], json_mode: bool = True) -> str:
-        kwargs = {
-            "model": self.deployment_name, # Azure uses deployment name as model
-            "messages": messages,
-            "temperature": 0.0
-        }
-        if json_mode:
-            kwargs["response_format"] = {"type": "json_object"}
-            
-        response = await self.client.chat.completions.create(**kwargs)
-        return response.choices[0].message.content
+class AzureOpenAIProvider(ChatCompletionsProvider):
+    def __init__(self, api_key: Optional[str] = None, base_url: Optional[str] = None, model: Optional[str] = None,
+                 api_version: Optional[str] = None):
+        self.client = AsyncAzureOpenAI(
+            api_key=api_key or settings.LLM_API_KEY,
+            api_version=api_version or settings.OPENAI_API_VERSION,
+            azure_endpoint=base_url or settings.LLM_BASE_URL,
+            **client_options()
+        )
+        self.deployment_name = model or settings.LLM_MODEL
+
+    @property
+    def model(self) -> str:
+        return self.deployment_name # Azure uses deployment name as model
 
 import os
 from app.agents.mock_llm import MockLLMProvider
 
 from groq import AsyncGroq
 
-class GroqProvider(LLMProvider):
-    def __init__(self):
+class GroqProvider(ChatCompletionsProvider):
+    def __init__(self, api_key: Optional[str] = None, model: Optional[str] = None):
         self.client = AsyncGroq(
-            api_key=settings.LLM_API_KEY,
+            api_key=api_key or settings.LLM_API_KEY,
+            **client_options()
         )
-        self.model = settings.LLM_MODEL or "openai/gpt-oss-120b"
+        self.model = model or settings.LLM_MODEL or "openai/gpt-oss-120b"
 
-    async def generate(self, messages: List[Dict[str, str]], json_mode: bool = True) -> str:
-        kwargs = {
-            "model": self.model,
-            "messages": messages,
-            "temperature": 0.0
-        }
-        if json_mode:
-            kwargs["response_format"] = {"type": "json_object"}
-            
-        try:
-            response = await self.client.chat.completions.create(**kwargs)
-            return response.choices[0].message.content
-        except Exception as e:
-            print(f"Groq Generation Error: {e}")
-            raise e
+def build_provider(provider_type: str, **config) -> LLMProvider:
+    """One backend; `config` (api_key, base_url, model, api_version) overrides the LLM_* settings."""
+    provider_type = provider_type.lower()
+    if provider_type == "mock":
+        return MockLLMProvider()
+
+    if provider_type == "azure":
+        provider = AzureOpenAIProvider(**config)
+    elif provider_type == "groq":
+        config.pop("base_url", None)
+        config.pop("api_version", None)
+        provider = GroqProvider(**config)
+    else:
+        # Default covers "openai" and generic compatible APIs
+        config.pop("api_version", None)
+        provider = OpenAICompatibleProvider(**config)
+
+    if settings.LLM_MIDDLEWARE_ENABLED:
+        from app.agents.llm_middleware import ManagedLLMProvider
+        return ManagedLLMProvider(provider)
+    return provider
 
 def get_llm_provider():
     provider_type = settings.LLM_PROVIDER.lower()
     
     if os.getenv("USE_MOCK_LLM") == "true" or provider_type == "mock":
         return MockLLMProvider()
-    
-    if provider_type == "azure":
-        return AzureOpenAIProvider()
-    
-    if provider_type == "groq":
-        return GroqProvider()
-    
-    # Default covers "openai" and generic compatible APIs
-    return OpenAICompatibleProvider()
+
+    if provider_type == "router":
+        from app.agents.llm_router import RouterLLMProvider
+        return RouterLLMProvider.from_settings()
+
+    return build_provider(provider_type)
+
+def get_fast_llm_provider() -> Optional[LLMProvider]:
+    """The small model for tiered planning (PLANNER_TIERED), or None if LLM_FAST_MODEL is unset."""
+    if not settings.LLM_FAST_MODEL:
+        return None
+    provider_type = settings.LLM_FAST_PROVIDER or settings.LLM_PROVIDER
+    if os.getenv("USE_MOCK_LLM") == "true" or provider_type.lower() == "mock":
+        return MockLLMProvider()
+    config = {"model": settings.LLM_FAST_MODEL, "base_url": settings.LLM_FAST_BASE_URL, "api_key": settings.LLM_FAST_API_KEY}
+    return build_provider(provider_type, **config)
 
 llm_service = get_llm_provider()
+fast_llm_service = get_fast_llm_provider()
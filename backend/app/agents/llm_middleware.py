@@ -0,0 +1,224 @@
+import re
+import json
+import time
+import random
+import asyncio
+import hashlib
+from typing import Any, AsyncIterator, Dict, List, Mapping, Optional, Tuple
+import httpx
+from app.agents.llm import LLMProvider
+from app.core.config import settings
+from app.core.logger import logger
+from app.core.ratelimit import TokenBucket
+
+_DURATION = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+def parse_duration(value: Optional[str]) -> Optional[float]:
+    """Rate-limit reset values: '20ms', '7.66s', '6m0s', or plain seconds."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION.findall(value)
+    if not parts:
+        return None
+    return sum(float(amount) * _UNITS[unit] for amount, unit in parts)
+
+def retry_after(headers: Mapping[str, str]) -> Optional[float]:
+    if headers.get("retry-after-ms"):
+        try:
+            return float(headers["retry-after-ms"]) / 1000
+        except ValueError:
+            pass
+    return parse_duration(headers.get("retry-after"))
+
+def _retryable(e: Exception) -> Tuple[bool, Optional[int], Mapping[str, str]]:
+    """(retry?, HTTP status, response headers) for an error raised by a provider SDK."""
+    status = getattr(e, "status_code", None)
+    response = getattr(e, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    if status is not None:
+        return status == 429 or status >= 500, status, headers
+    # The OpenAI and Groq SDKs both name their transport errors this way
+    connection_error = type(e).__name__ in ("APIConnectionError", "APITimeoutError")
+    return connection_error or isinstance(e, (httpx.TransportError, asyncio.TimeoutError)), None, headers
+
+class _ModelLimits:
+    """Concurrency and rate-limit state shared by every wrapper of one model in this process."""
+
+    def __init__(self, max_concurrency: int, rate: float):
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.bucket = TokenBucket(rate, max(1.0, rate)) if rate > 0 else None
+        self.blocked_until = 0.0  # monotonic; set from 429s and exhausted x-ratelimit-remaining-*
+        self.loop = asyncio.get_running_loop()
+
+    def block_for(self, seconds: float):
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+    async def throttle(self) -> float:
+        """Wait until the provider is expected to accept a request; returns the seconds waited."""
+        waited = 0.0
+        while True:
+            delay = self.blocked_until - time.monotonic()
+            if self.bucket is not None and delay <= 0:
+                if self.bucket.try_take():
+                    return waited
+                delay = self.bucket.wait_time()
+            if delay <= 0:
+                return waited
+            await asyncio.sleep(delay)
+            waited += delay
+
+class ManagedLLMProvider(LLMProvider):
+    """
+    Wraps a provider with the plumbing a busy worker needs in front of a rate-limited API:
+
+    - at most LLM_MAX_CONCURRENCY completions in flight per model endpoint (provider
+      class, base URL and model; and an optional LLM_RATE_LIMIT token bucket);
+    - the provider's `x-ratelimit-remaining-*`/`x-ratelimit-reset-*` headers and
+      `retry-after` on 429 pause every caller of that endpoint, not only the one that
+      hit it (the same model behind another endpoint has its own limits);
+    - 429, 5xx and connection errors are retried with exponential backoff and full jitter;
+    - identical concurrent prompts (same model, messages and json_mode) are sent once
+      and share the response.
+
+    Streams are limited and retried (until the first chunk arrives) but not coalesced.
+    Other attributes (`model`, `deployment_name`, ...) are the wrapped provider's.
+    """
+
+    _limits: Dict[Tuple[str, str, str], _ModelLimits] = {}
+
+    def __init__(self, provider: LLMProvider, max_concurrency: int = None, rate: float = None,
+                 max_retries: int = None, base_delay: float = None):
+        self.provider = provider
+        self.max_concurrency = max_concurrency or settings.LLM_MAX_CONCURRENCY
+        self.rate = settings.LLM_RATE_LIMIT if rate is None else rate
+        self.max_retries = settings.LLM_MAX_RETRIES if max_retries is None else max_retries
+        self.base_delay = settings.LLM_RETRY_BASE_DELAY if base_delay is None else base_delay
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.stats = {"requests": 0, "coalesced": 0, "retries": 0, "throttled": 0, "throttle_seconds": 0.0}
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.provider, name)
+
+    @property
+    def model_name(self) -> str:
+        return (getattr(self.provider, "model", None) or getattr(self.provider, "deployment_name", None)
+                or type(self.provider).__name__)
+
+    @property
+    def limits_key(self) -> Tuple[str, str, str]:
+        """Rate limits are per endpoint: (provider class, base URL, model)."""
+        base_url = getattr(getattr(self.provider, "client", None), "base_url", None)
+        return type(self.provider).__name__, str(base_url or ""), self.model_name
+
+    def _model_limits(self) -> _ModelLimits:
+        key = self.limits_key
+        limits = self._limits.get(key)
+        # asyncio primitives belong to one event loop; start over if the loop was replaced
+        if limits is None or limits.loop is not asyncio.get_running_loop():
+            limits = self._limits[key] = _ModelLimits(self.max_concurrency, self.rate)
+        return limits
+
+    async def generate(self, messages: List[Dict[str, str]], json_mode: bool = True) -> str:
+        text, _ = await self.generate_raw(messages, json_mode=json_mode)
+        return text
+
+    async def generate_raw(self, messages: List[Dict[str, str]], json_mode: bool = True) -> Tuple[str, Mapping[str, str]]:
+        key = hashlib.sha256(json.dumps([self.limits_key, json_mode, messages], sort_keys=True).encode()).hexdigest()
+        task = self._inflight.get(key)
+        if task is not None:
+            self.stats["coalesced"] += 1
+        else:
+            task = asyncio.ensure_future(self._call(messages, json_mode))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # Shielded so a cancelled caller does not cancel the request for the others sharing it
+        return await asyncio.shield(task)
+
+    async def _call(self, messages: List[Dict[str, str]], json_mode: bool) -> Tuple[str, Mapping[str, str]]:
+        limits = self._model_limits()
+        attempt = 0
+        while True:
+            async with limits.semaphore:
+                await self._throttle(limits)
+                self.stats["requests"] += 1
+                try:
+                    text, headers = await self.provider.generate_raw(messages, json_mode=json_mode)
+                except Exception as e:
+                    delay = self._retry_delay(e, attempt, limits)
+                    if delay is None:
+                        raise
+                else:
+                    self._observe_headers(headers, limits)
+                    return text, headers
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    async def generate_stream(self, messages: List[Dict[str, str]], json_mode: bool = True) -> AsyncIterator[str]:
+        limits = self._model_limits()
+        attempt = 0
+        while True:
+            async with limits.semaphore:
+                await self._throttle(limits)
+                self.stats["requests"] += 1
+                started = False
+                try:
+                    async for chunk in self.provider.generate_stream(messages, json_mode=json_mode):
+                        started = True
+                        yield chunk
+                    return
+                except Exception as e:
+                    # Chunks already handed to the caller cannot be taken back
+                    delay = None if started else self._retry_delay(e, attempt, limits)
+                    if delay is None:
+                        raise
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    async def _throttle(self, limits: _ModelLimits):
+        waited = await limits.throttle()
+        if waited:
+            self.stats["throttled"] += 1
+            self.stats["throttle_seconds"] += waited
+
+    def _retry_delay(self, e: Exception, attempt: int, limits: _ModelLimits) -> Optional[float]:
+        """Seconds to wait before the next attempt, or None if `e` should propagate."""
+        retry, status, headers = _retryable(e)
+        if not retry or attempt >= self.max_retries:
+            return None
+        # Full jitter spreads out the retries of callers that failed together
+        delay = random.uniform(0, self.base_delay * 2 ** attempt)
+        if status == 429:
+            hinted = retry_after(headers) or self._reset_from(headers)
+            if hinted:
+                limits.block_for(hinted)
+                delay = max(delay, hinted)
+        self.stats["retries"] += 1
+        logger.warning("llm_retry", model=self.model_name, attempt=attempt + 1, status=status,
+                       delay=round(delay, 3), error=str(e))
+        return delay
+
+    @staticmethod
+    def _reset_from(headers: Mapping[str, str]) -> Optional[float]:
+        resets = [parse_duration(headers.get(f"x-ratelimit-reset-{kind}")) for kind in ("requests", "tokens")]
+        resets = [r for r in resets if r]
+        return max(resets) if resets else None
+
+    def _observe_headers(self, headers: Mapping[str, str], limits: _ModelLimits):
+        for kind in ("requests", "tokens"):
+            remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+            if remaining is None:
+                continue
+            try:
+                exhausted = float(remaining) <= 0
+            except ValueError:
+                continue
+            reset = parse_duration(headers.get(f"x-ratelimit-reset-{kind}"))
+            if exhausted and reset:
+                limits.block_for(reset)
+                logger.info("llm_rate_limit_exhausted", model=self.model_name, kind=kind, reset=reset)
@@ -0,0 +1,212 @@
+import json
+import time
+import asyncio
+from collections import deque
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Dict, List, Mapping, Optional, Tuple
+from app.agents.llm import LLMProvider, build_provider
+from app.core.config import settings
+from app.core.logger import logger
+from app.core.metrics import LLM_BACKEND_COST, LLM_BACKEND_EVENTS, LLM_BACKEND_LATENCY
+
+# The backend whose response the router returned last in this task, so callers can label
+# their metrics with the model that actually answered rather than the router.
+serving_backend: ContextVar[Optional["Backend"]] = ContextVar("serving_backend", default=None)
+
+def estimate_tokens(messages: List[Dict[str, str]], completion: str = "") -> Tuple[int, int]:
+    """Rough (prompt, completion) token counts, ~4 characters per token."""
+    prompt = sum(len(m.get("content") or "") for m in messages)
+    return (prompt + 3) // 4, (len(completion) + 3) // 4
+
+def _quantile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+class Backend:
+    """One configured provider plus its rolling latency/error window and spend."""
+
+    def __init__(self, name: str, provider: LLMProvider, cost_per_1k_input: float = 0.0,
+                 cost_per_1k_output: float = 0.0, window: int = None):
+        self.name = name
+        self.provider = provider
+        self.cost_per_1k_input = cost_per_1k_input
+        self.cost_per_1k_output = cost_per_1k_output
+        window = window or settings.LLM_ROUTER_WINDOW
+        self.latencies: deque = deque(maxlen=window)  # seconds, successful calls only
+        self.outcomes: deque = deque(maxlen=window)  # True = success
+        self.stats = {"calls": 0, "errors": 0, "hedges": 0, "wins": 0, "cancelled": 0,
+                      "prompt_tokens": 0, "completion_tokens": 0, "cost": 0.0}
+
+    def error_rate(self) -> float:
+        return self.outcomes.count(False) / len(self.outcomes) if self.outcomes else 0.0
+
+    def latency(self, q: float) -> Optional[float]:
+        return _quantile(list(self.latencies), q)
+
+    def score(self) -> float:
+        """Expected seconds per successful call; untried backends score 0 so they get sampled."""
+        p50 = self.latency(0.5)
+        if p50 is None:
+            return float("inf") if self.outcomes else 0.0
+        return p50 / max(0.05, 1.0 - self.error_rate())
+
+    def record(self, messages: List[Dict[str, str]], elapsed: float, completion: Optional[str]):
+        self.stats["calls"] += 1
+        self.outcomes.append(completion is not None)
+        LLM_BACKEND_LATENCY.labels(backend=self.name, outcome="error" if completion is None else "success").observe(elapsed)
+        if completion is None:
+            self.stats["errors"] += 1
+            return
+        self.latencies.append(elapsed)
+        prompt_tokens, completion_tokens = estimate_tokens(messages, completion)
+        cost = (prompt_tokens * self.cost_per_1k_input + completion_tokens * self.cost_per_1k_output) / 1000
+        self.stats["prompt_tokens"] += prompt_tokens
+        self.stats["completion_tokens"] += completion_tokens
+        self.stats["cost"] += cost
+        LLM_BACKEND_COST.labels(backend=self.name).inc(cost)
+        logger.info("llm_backend_call", backend=self.name, latency_ms=round(elapsed * 1000),
+                    prompt_tokens=prompt_tokens, completion_tokens=completion_tokens, cost=round(cost, 6))
+
+    def count(self, event: str):
+        """Count a routing decision (hedges, wins, cancelled) in stats and metrics."""
+        self.stats[event] += 1
+        LLM_BACKEND_EVENTS.labels(backend=self.name, event=event).inc()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {**self.stats, "cost": round(self.stats["cost"], 6), "error_rate": round(self.error_rate(), 3),
+                **{f"p{int(q * 100)}_ms": round(v * 1000) if (v := self.latency(q)) is not None else None
+                   for q in (0.5, 0.9, 0.99)}}
+
+class RouterLLMProvider(LLMProvider):
+    """
+    Routes each completion to the backend with the best recent latency/error record
+    (LLM_PROVIDER=router, backends from LLM_BACKENDS).
+
+    With hedging on, a call still running after the primary's p90 latency is duplicated
+    on the next-best backend and the first valid response wins (valid JSON when
+    json_mode); the loser is cancelled. A failed call fails over to the next backend.
+    Streams are routed and fail over before their first chunk, but are not hedged.
+    """
+
+    def __init__(self, backends: List[Backend], hedge: bool = None):
+        if not backends:
+            raise ValueError("RouterLLMProvider needs at least one backend (LLM_BACKENDS)")
+        self.backends = backends
+        self.hedge = settings.LLM_HEDGE_ENABLED if hedge is None else hedge
+        self.model = "router:" + ",".join(backend.name for backend in backends)
+
+    @classmethod
+    def from_settings(cls) -> "RouterLLMProvider":
+        backends = []
+        for i, config in enumerate(settings.LLM_BACKENDS):
+            config = dict(config)
+            name = config.pop("name", None) or f"backend{i}"
+            costs = {k: float(config.pop(k, 0.0)) for k in ("cost_per_1k_input", "cost_per_1k_output")}
+            provider = build_provider(config.pop("provider", "openai"), **config)
+            backends.append(Backend(name, provider, **costs))
+        return cls(backends)
+
+    def ranked(self) -> List[Backend]:
+        return sorted(self.backends, key=lambda backend: backend.score())
+
+    def hedge_delay(self, backend: Backend) -> float:
+        if len(backend.latencies) < settings.LLM_HEDGE_MIN_SAMPLES:
+            return settings.LLM_HEDGE_DEFAULT_DELAY
+        return backend.latency(settings.LLM_HEDGE_QUANTILE)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        return {backend.name: backend.snapshot() for backend in self.backends}
+
+    async def generate(self, messages: List[Dict[str, str]], json_mode: bool = True) -> str:
+        text, _ = await self.generate_raw(messages, json_mode=json_mode)
+        return text
+
+    async def _attempt(self, backend: Backend, messages, json_mode: bool) -> Tuple[str, Mapping[str, str]]:
+        started = time.monotonic()
+        try:
+            text, headers = await backend.provider.generate_raw(messages, json_mode=json_mode)
+        except asyncio.CancelledError:
+            backend.count("cancelled")
+            raise
+        except Exception:
+            backend.record(messages, time.monotonic() - started, None)
+            raise
+        backend.record(messages, time.monotonic() - started, text)
+        return text, headers
+
+    @staticmethod
+    def _valid(text: str, json_mode: bool) -> bool:
+        if not json_mode:
+            return bool(text)
+        try:
+            json.loads(text)
+            return True
+        except (TypeError, ValueError):
+            return False
+
+    async def generate_raw(self, messages: List[Dict[str, str]], json_mode: bool = True) -> Tuple[str, Mapping[str, str]]:
+        queue = self.ranked()
+        running: Dict[asyncio.Task, Backend] = {}
+        fallback: Optional[Tuple[str, Mapping[str, str]]] = None  # a response that was not valid JSON
+        fallback_backend: Optional[Backend] = None
+        error: Optional[BaseException] = None
+
+        def launch():
+            backend = queue.pop(0)
+            running[asyncio.ensure_future(self._attempt(backend, messages, json_mode))] = backend
+            return backend
+
+        primary = launch()
+        timeout = self.hedge_delay(primary) if self.hedge and queue else None
+        try:
+            while running:
+                done, _ = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                timeout = None
+                if not done:
+                    hedge = launch()
+                    primary.count("hedges")
+                    logger.info("llm_hedged", primary=primary.name, hedge=hedge.name)
+                    continue
+                for task in done:
+                    backend = running.pop(task)
+                    if task.exception() is not None:
+                        error = task.exception()
+                        logger.warning("llm_backend_failed", backend=backend.name, error=str(error))
+                        continue
+                    text, headers = task.result()
+                    if self._valid(text, json_mode):
+                        backend.count("wins")
+                        serving_backend.set(backend)
+                        return text, headers
+                    if fallback is None:
+                        fallback, fallback_backend = (text, headers), backend
+                if not running and queue:
+                    launch()  # fail over (also after a response that was not valid JSON)
+        finally:
+            for task in running:
+                task.cancel()
+        if fallback is not None:
+            serving_backend.set(fallback_backend)
+            return fallback
+        raise error
+
+    async def generate_stream(self, messages: List[Dict[str, str]], json_mode: bool = True) -> AsyncIterator[str]:
+        backends = self.ranked()
+        for i, backend in enumerate(backends):
+            started, parts = time.monotonic(), []
+            try:
+                async for chunk in backend.provider.generate_stream(messages, json_mode=json_mode):
+                    parts.append(chunk)
+                    yield chunk
+            except Exception as e:
+                backend.record(messages, time.monotonic() - started, None)
+                if parts or i == len(backends) - 1:
+                    raise
+                logger.warning("llm_backend_failed", backend=backend.name, error=str(e))
+                continue
+            backend.record(messages, time.monotonic() - started, "".join(parts))
+            backend.count("wins")
+            serving_backend.set(backend)
+            return
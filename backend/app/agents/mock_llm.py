@@ -1,9 +1,19 @@
 import json
+import asyncio
 from typing import List, Dict
 from app.agents.llm import LLMProvider
 
 class MockLLMProvider(LLMProvider):
+    def __init__(self, start_url: str = "https://google.com", latency: float = 0.0):
+        # start_url/latency let benchmarks point the scripted flow at a local page
+        # and simulate model think time.
+        self.start_url = start_url
+        self.latency = latency
+
     async def generate(self, messages: List[Dict[str, str]], json_mode: bool = True) -> str:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
         # The system prompt contains the history. It is usually the first message.
         system_prompt = messages[0]["content"] if len(messages) > 0 and messages[0]["role"] == "system" else ""
         
@@ -17,9 +27,9 @@ class MockLLMProvider(LLMProvider):
         
         if 'open_url' not in history_part: 
             return json.dumps({
-                "thought_summary": "I need to navigate to google.com first.",
+                "thought_summary": f"I need to navigate to {self.start_url} first.",
                 "action": "open_url",
-                "args": {"url": "https://google.com"},
+                "args": {"url": self.start_url},
                 "confidence": 1.0,
                 "done": False
             })
@@ -1,107 +1,326 @@
+import time
 import asyncio
-from typing import Dict, Any
+import functools
+from typing import Dict, Any, List, Optional
 from app.agents.planner import planner
+from app.agents.recipes import recipe_store, verify_step
+from app.agents.checkpoints import Checkpointer
+from app.agents.side_effects import SideEffectPipeline
 from app.browser.context import browser_manager
-from app.tools.executor import tool_executor
+from app.browser.network import network_router
+from app.tools.executor import tool_executor, EARLY_DISPATCH_TOOLS
+from app.tools.prefetch import observation_prefetcher, PREFETCH_TOOLS
+from app.core.config import settings
+from app.core.inbox import session_inbox
 from app.core.session import session_manager
+from app.browser.live_view import LiveView
+from app.browser.observation import PageObserver
 from app.core.logger import logger
+from app.core.tracing import tracer
+from app.core.metrics import SESSION_DURATION, SESSION_STEPS
 
 class AgentOrchestrator:
-    async def run_session(self, session_id: str, task: str):
-        logger.info("session_started", session_id=session_id)
-        
-        # 1. Initialize Context
-        context = await browser_manager.create_context()
-        page = await context.new_page()
-        
-        # 2. Update Session State
-        await session_manager.update_session(session_id, {"status": "running", "task": task})
+    async def run_session(self, session_id: str, task: Optional[str], wait_for_input: bool = True, resume: bool = False):
+        logger.info("session_started", session_id=session_id, resume=resume)
+
+        # A redelivered task waits here until the worker that ran the session stops or its lease expires
+        checkpoints = Checkpointer(session_id)
+        if not await checkpoints.acquire():
+            logger.warning("session_already_running", session_id=session_id)
+            return "duplicate"
+
+        snapshot = checkpoint = None
+        context = page = None
+        try:
+            if resume:
+                snapshot = await session_manager.load_snapshot(session_id)
+                if not snapshot:
+                    logger.warning("session_resume_without_snapshot", session_id=session_id)
+                    await session_inbox.release_resume(session_id)
+                    await checkpoints.close()
+                    return "stopped"
+            else:
+                # Left behind by a worker that died or by a migration: continue from there
+                checkpoint = await checkpoints.load()
+            saved = snapshot or checkpoint
+
+            # 1. Initialize Context (pre-warmed from the pool when enabled, rebuilt from storage state on resume)
+            context, page = await browser_manager.acquire_page(storage_state=saved["storage_state"] if saved else None)
+            live_view = LiveView(session_id, page)
+            await live_view.start()
+        except BaseException:
+            # Nothing has run yet: give back the page and the lease (its heartbeat would renew
+            # it forever) so a redelivered task can start over from the same checkpoint
+            if page is not None:
+                await browser_manager.release_page(context, page)
+            await checkpoints.close(keep_checkpoint=True)
+            raise
+        # Frames and step persistence run while the next step is planned
+        effects = SideEffectPipeline(session_id)
+        observer = PageObserver(page) if settings.OBSERVATION_MODE == "digest" else None
         
-        history = []
+        history = saved["history"] if saved else []
+        resume_step = checkpoint["step_count"] if checkpoint else 0
+        run_start, history_start, status = time.time(), len(history), "stopped"
+        early_dispatch = {}  # the tool started while this step's plan streams: action, args, task
         
         try:
             import json
             from app.db.redis import get_redis
             redis = await get_redis()
-            pubsub = redis.pubsub()
-            await pubsub.subscribe(f"session_input:{session_id}")
+
+            session = await session_manager.get_session(session_id, step_limit=0) or {}
+            use_plan_cache = session.get("options", {}).get("plan_cache", True)
+            use_recipes = settings.RECIPES_ENABLED and session.get("options", {}).get("recipes", True)
+            tenant = session.get("tenant") or "default"
+
+            # Streaming planner hooks: thoughts go to the UI, tools start before the plan is complete
+
+            async def on_thought(delta: str):
+                await redis.publish(f"session_updates:{session_id}", json.dumps({"type": "thought", "delta": delta}))
+
+            async def on_action(action: str, args: Dict[str, Any]):
+                if action in EARLY_DISPATCH_TOOLS:
+                    early_dispatch.update(action=action, args=args,
+                                          task=asyncio.create_task(tool_executor.execute(action, page, **args)))
+
+            if snapshot:
+                task = await self._restore(session_id, page, snapshot)
+                if task:
+                    history.append({"role": "user", "content": task})
+            elif checkpoint:
+                task = checkpoint["task"]
+                await self._reopen(session_id, page, checkpoint.get("url"))
+                logger.info("session_restored_from_checkpoint", session_id=session_id, step=resume_step,
+                            worker=checkpoint.get("worker"))
+
+            # 2. Update Session State
+            if task:
+                await session_manager.update_session(session_id, {"status": "running", "task": task})
 
             while True:
-                step_count = 0
+                step_count, resume_step = resume_step, 0
                 MAX_STEPS = 20
+
+                # A recorded workflow for this kind of task is replayed without the LLM
+                task_start = len(history)
+                replay = await self._match_recipe(task, tenant) if task and use_recipes and not step_count else []
+                replayed_recipe = replay[0]["recipe_id"] if replay else None
                 
-                while step_count < MAX_STEPS:
-                    # 3. Observe
-                    # For now, just getting URL, we could get simplified DOM or accessibility tree
-                    browser_state = f"Current URL: {page.url}" 
-                    
-                    # 4. Think
-                    plan = await planner.plan(task, history, browser_state)
-                    print(f"DEBUG: Plan received: {plan}")
+                while task and step_count < MAX_STEPS:
+                    with tracer.span("agent.step", session_id=session_id, step=step_count, replay=bool(replay)):
+                        self._drop_early_dispatch(early_dispatch)
+                        if replay:
+                            browser_state = None
+                            plan = replay.pop(0)
+                        else:
+                            # 3. Observe (element digest, or only what changed since the last step)
+                            browser_state = await observer.observe() if observer else f"Current URL: {page.url}"
+                        
+                            # 4. Think
+                            # Page text and a screenshot are captured while the LLM thinks
+                            observation_prefetcher.start(page)
+                            plan = await planner.plan(task, history, browser_state, use_cache=use_plan_cache,
+                                                      on_thought=on_thought, on_action=on_action)
+                            if plan.get("action") not in PREFETCH_TOOLS:
+                                observation_prefetcher.cancel(page)
+                        logger.debug("plan_received", session_id=session_id, plan=plan)
                     
-                    # 5. Act
-                    action = plan.get("action")
-                    args = plan.get("args", {})
-                    print(f"DEBUG: Executing action {action} with args {args}")
+                        # 5. Act
+                        action = plan.get("action")
+                        args = plan.get("args", {})
+                        if plan.get("actions") or (early_dispatch.get("action"), early_dispatch.get("args")) != (action, args):
+                            self._drop_early_dispatch(early_dispatch)
                     
-                    if action == "finish":
-                        final_answer = args.get("final_answer", "Task complete.")
-                        await session_manager.update_session(session_id, {"status": "completed", "result": final_answer})
-                        logger.info("session_completed", session_id=session_id)
+                        if action == "finish":
+                            final_answer = args.get("final_answer", "Task complete.")
+                            await effects.flush()
+                            await session_manager.update_session(session_id, {"status": "completed", "result": final_answer})
+                            logger.info("session_completed", session_id=session_id)
+                            if replayed_recipe:
+                                await self._report_recipe(replayed_recipe, success=True)
+                            elif use_recipes:
+                                await self._record_recipe(task, history[task_start:], final_answer, tenant)
                         
-                        chat_msg = {"type": "chat", "sender": "agent", "message": final_answer}
-                        await redis.publish(f"session_updates:{session_id}", json.dumps(chat_msg))
-                        break
+                            chat_msg = {"type": "chat", "sender": "agent", "message": final_answer}
+                            await redis.publish(f"session_updates:{session_id}", json.dumps(chat_msg))
+                            status = "completed"
+                            break
                     
-                    tool_result = await tool_executor.execute(action, page, **args)
-                    print(f"DEBUG: Tool result: {tool_result}")
+                        if plan.get("actions"):
+                            # Multi-action plan: the whole batch is one step
+                            tool_result = await tool_executor.execute_batch(plan["actions"], page)
+                        elif "task" in early_dispatch:
+                            tool_result = await early_dispatch.pop("task")
+                        else:
+                            tool_result = await tool_executor.execute(action, page, **args)
+                        logger.debug("tool_result", session_id=session_id, action=action, success=tool_result.success)
                     
-                    # 5.5 Capture Screenshot & Stream
-                    try:
-                        screenshot_bytes = await page.screenshot(type="jpeg", quality=50)
-                        import base64
-                        b64_img = base64.b64encode(screenshot_bytes).decode('utf-8')
-                        img_data = f"data:image/jpeg;base64,{b64_img}"
-                        
-                        await redis.publish(f"session_updates:{session_id}", json.dumps({"type": "image", "data": img_data}))
-                    except Exception as sc_err:
-                        print(f"DEBUG: Screenshot failed: {sc_err}")
-
-                    # 6. Update History & State
-                    step_data = {
-                        "step": step_count,
-                        "plan": plan,
-                        "result": tool_result.dict()
-                    }
-                    history.append(step_data)
-                    await session_manager.add_step(session_id, step_data)
+                        # 5.5 Stream a frame (only if someone is watching and the page changed)
+                        await effects.submit("live_view", live_view.capture)
+
+                        # 6. Update History & State
+                        step_data = {
+                            "step": step_count,
+                            "observation": browser_state,
+                            "plan": plan,
+                            "result": tool_result.dict(),
+                            "url": page.url
+                        }
+                        history.append(step_data)
+                        await effects.submit("add_step", functools.partial(session_manager.add_step, session_id, step_data))
+
+                        if plan.get("recipe_id"):
+                            divergence = verify_step(plan, step_data["result"], page.url)
+                            if divergence:
+                                # Hand over to the planner from here; history already holds the replayed steps
+                                logger.info("recipe_diverged", session_id=session_id, recipe_id=plan["recipe_id"],
+                                            step=step_count, reason=divergence)
+                                await self._report_recipe(plan["recipe_id"], success=False)
+                                replay, replayed_recipe = [], None
+                            if not replay and observer:
+                                observer.reset()
                     
-                    step_count += 1
+                        step_count += 1
+                        if checkpoints.step_done():
+                            # Captured here, written off the critical path
+                            checkpoint = await checkpoints.capture(context, page, history, task, step_count)
+                            await effects.submit("checkpoint", functools.partial(checkpoints.write, checkpoint))
+
+                    if checkpoints.migration_requested:
+                        # Hand the session back to the queue; another worker continues from this checkpoint
+                        await effects.flush()
+                        await checkpoints.save(context, page, history, task, step_count)
+                        await session_manager.update_session(session_id, {"status": "migrating"})
+                        logger.info("session_migrating", session_id=session_id, step=step_count)
+                        status = "migrated"
+                        break
 
-                # Wait for next task/message from user
+                if status == "migrated" or not wait_for_input:
+                    break
+
+                # Wait for next task/message from user; release the browser if none comes
+                await effects.flush()
+                if checkpoints.enabled:
+                    # The task is over: restoring from here waits for input instead of running it again
+                    await checkpoints.save(context, page, history, None, step_count)
                 await session_manager.update_session(session_id, {"status": "waiting_for_input"})
                 
-                new_task = None
-                while True:
-                    message = await pubsub.get_message(ignore_subscribe_messages=True)
-                    if message:
-                        data = message["data"]
-                        if isinstance(data, bytes):
-                            data = data.decode('utf-8')
-                        new_task = data
+                new_task = await session_inbox.wait(session_id, timeout=settings.SESSION_IDLE_TIMEOUT)
+                if new_task is None:
+                    new_task = await self._suspend(session_id, context, page, history, task)
+                    if new_task is None:
+                        status = "suspended"
                         break
-                    await asyncio.sleep(0.1)
                 
                 if new_task:
                     task = new_task
                     history.append({"role": "user", "content": task})
+                    if observer:
+                        observer.reset()
                     await session_manager.update_session(session_id, {"status": "running", "task": task})
 
+        except asyncio.CancelledError:
+            if not checkpoints.lease_lost:
+                # Worker shutdown: the checkpoint stays for the redelivered task
+                status = "interrupted"
+                raise
+            # Another worker may own the session now: stop without touching its status
+            current = asyncio.current_task()
+            if hasattr(current, "uncancel"):  # Python 3.11+: the cancellation is handled here
+                current.uncancel()
+            logger.warning("session_stopped_lease_lost", session_id=session_id)
+            status = "lease_lost"
         except Exception as e:
-            print(f"DEBUG: Orchestrator failed with exception: {e}")
             logger.error("session_failed", session_id=session_id, error=str(e))
+            await effects.flush()
             await session_manager.update_session(session_id, {"status": "failed", "error": str(e)})
+            status = "failed"
         finally:
-            await context.close()
+            self._drop_early_dispatch(early_dispatch)
+            observation_prefetcher.cancel(page)
+            await effects.close()
+            await checkpoints.close(keep_checkpoint=status in ("migrated", "interrupted", "lease_lost"))
+            await live_view.close()
+            network_router.report(session_id, context)
+            await browser_manager.release_page(context, page)
+            SESSION_DURATION.labels(status=status).observe(time.time() - run_start)
+            SESSION_STEPS.labels(status=status).observe(sum(1 for entry in history[history_start:] if "plan" in entry))
+        return status
+
+    @staticmethod
+    def _drop_early_dispatch(early_dispatch: Dict[str, Any]):
+        """Cancel a tool started while streaming that the step did not use (the plan changed or never ran it)."""
+        task = early_dispatch.pop("task", None)
+        if task is not None and not task.done():
+            logger.warning("early_dispatch_dropped", action=early_dispatch.get("action"))
+            task.cancel()
+        early_dispatch.clear()
+
+    async def _match_recipe(self, task: str, tenant: str) -> List[Dict[str, Any]]:
+        try:
+            return await recipe_store.match(task, tenant) or []
+        except Exception as e:
+            logger.error("recipe_match_failed", error=str(e))
+            return []
+
+    async def _record_recipe(self, task: str, steps: List[Dict], final_answer: str, tenant: str):
+        try:
+            await recipe_store.record(task, steps, final_answer, tenant)
+        except Exception as e:
+            logger.error("recipe_record_failed", error=str(e))
+
+    async def _report_recipe(self, recipe_id: str, success: bool):
+        try:
+            await recipe_store.report(recipe_id, success)
+        except Exception as e:
+            logger.error("recipe_report_failed", recipe_id=recipe_id, error=str(e))
+
+    async def _suspend(self, session_id: str, context, page, history: List[Dict], task: Optional[str]) -> Optional[str]:
+        """Persist an idle session so its browser can be released; any worker can resume it later.
+
+        Returns a message instead if one slipped in while suspending and this worker won the resume.
+        """
+        snapshot = {
+            "url": page.url,
+            "storage_state": await context.storage_state(),
+            "history": history,
+            "task": task,
+            "suspended_at": time.time(),
+        }
+        await session_manager.save_snapshot(session_id, snapshot)
+        await session_manager.update_session(session_id, {"status": "suspended"})
+        logger.info("session_suspended", session_id=session_id, url=page.url)
+
+        # The API only schedules a resume for sessions it sees as suspended, so a message
+        # that arrived after the wait timed out but before the status changed is ours.
+        pending = await session_inbox.pop(session_id)
+        if pending is None:
+            return None
+        if await session_inbox.claim_resume(session_id):
+            await session_manager.delete_snapshot(session_id)
+            await session_inbox.release_resume(session_id)
+            logger.info("session_resumed_in_place", session_id=session_id)
+            return pending
+        # Someone else is already resuming the session; leave the message for them.
+        await session_inbox.push_front(session_id, pending)
+        return None
+
+    async def _restore(self, session_id: str, page, snapshot: Dict[str, Any]) -> Optional[str]:
+        """Reopen the suspended URL and take the message that triggered the resume."""
+        url = snapshot.get("url") or ""
+        await self._reopen(session_id, page, url)
+        task = await session_inbox.pop(session_id)
+        await session_manager.delete_snapshot(session_id)
+        await session_inbox.release_resume(session_id)
+        logger.info("session_resumed", session_id=session_id, url=url)
+        return task
+
+    async def _reopen(self, session_id: str, page, url: Optional[str]):
+        if url and url.startswith("http"):
+            try:
+                await page.goto(url, wait_until="domcontentloaded")
+            except Exception as e:
+                logger.warning("session_restore_navigation_failed", session_id=session_id, url=url, error=str(e))
 
 agent_orchestrator = AgentOrchestrator()
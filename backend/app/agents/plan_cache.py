@@ -0,0 +1,94 @@
+import json
+import time
+import hashlib
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+from app.core.config import settings
+from app.core.logger import logger
+from app.db.redis import get_redis
+
+# Per-step fields that change between otherwise identical runs (timings, frame refs)
+# and would make every key unique.
+VOLATILE_RESULT_FIELDS = ("execution_time", "wait_time", "settled", "screenshot_base64", "screenshot_ref")
+
+def canonical_history(history: List[Dict]) -> List[Dict]:
+    canonical = []
+    for entry in history:
+        result = entry.get("result")
+        if isinstance(result, dict):
+            entry = {**entry, "result": {k: v for k, v in result.items() if k not in VOLATILE_RESULT_FIELDS}}
+        canonical.append(entry)
+    return canonical
+
+def cache_key(messages: List[Dict[str, str]], model: str) -> str:
+    payload = json.dumps({"model": model, "messages": messages}, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class PlanCache:
+    """
+    Two-tier cache of raw planner responses, keyed by the rendered prompt and model.
+
+    The in-process tier is an LRU with TTL; the Redis tier (`plan_cache:{key}`) is
+    shared by all workers so a workflow planned on one worker is a hit on the rest.
+    Only responses that parsed into a plan are stored.
+    """
+
+    PREFIX = "plan_cache:"
+
+    def __init__(self, max_entries: int = None, ttl: int = None, shared: bool = None):
+        self.max_entries = max_entries or settings.PLAN_CACHE_MAX_ENTRIES
+        self.ttl = ttl or settings.PLAN_CACHE_TTL
+        self.shared = settings.PLAN_CACHE_SHARED if shared is None else shared
+        self._local: "OrderedDict[str, tuple]" = OrderedDict()
+        self.stats = {"local_hits": 0, "shared_hits": 0, "misses": 0, "stores": 0}
+
+    @property
+    def hit_rate(self) -> float:
+        hits = self.stats["local_hits"] + self.stats["shared_hits"]
+        total = hits + self.stats["misses"]
+        return hits / total if total else 0.0
+
+    async def get(self, key: str) -> Optional[str]:
+        entry = self._local.get(key)
+        if entry and entry[0] > time.monotonic():
+            self._local.move_to_end(key)
+            self.stats["local_hits"] += 1
+            return entry[1]
+        if entry:
+            del self._local[key]
+
+        if self.shared:
+            try:
+                redis = await get_redis()
+                value = await redis.get(f"{self.PREFIX}{key}")
+            except Exception as e:
+                logger.error("plan_cache_read_failed", error=str(e))
+                value = None
+            if value is not None:
+                self._remember(key, value)
+                self.stats["shared_hits"] += 1
+                return value
+
+        self.stats["misses"] += 1
+        return None
+
+    async def set(self, key: str, response_text: str):
+        self._remember(key, response_text)
+        self.stats["stores"] += 1
+        if self.shared:
+            try:
+                redis = await get_redis()
+                await redis.setex(f"{self.PREFIX}{key}", self.ttl, response_text)
+            except Exception as e:
+                logger.error("plan_cache_write_failed", error=str(e))
+
+    def _remember(self, key: str, value: str):
+        self._local[key] = (time.monotonic() + self.ttl, value)
+        self._local.move_to_end(key)
+        while len(self._local) > self.max_entries:
+            self._local.popitem(last=False)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {**self.stats, "hit_rate": round(self.hit_rate, 4), "entries": len(self._local)}
+
+plan_cache = PlanCache()
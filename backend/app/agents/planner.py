@@ -1,28 +1,49 @@
 import json
-from typing import List, Dict, Any
-from app.agents.llm import llm_service
+import time
+from typing import List, Dict, Any, Awaitable, Callable, Optional, Tuple
+from app.agents.llm import llm_service, fast_llm_service
+from app.agents.history import history_compactor, count_tokens
+from app.agents.llm_router import serving_backend
+from app.agents.plan_cache import plan_cache, cache_key, canonical_history
+from app.agents.stream_parser import PlanStreamParser
+from app.core.config import settings
 from app.core.logger import logger
+from app.core.tracing import tracer
+from app.core.metrics import LLM_ERRORS, LLM_LATENCY, LLM_TOKENS
 
 PLANNER_PROMPT = """
 You are an autonomous browser agent. Your goal is to complete the user's task: "{task}"
 
 You must output a JSON object with the following structure:
 {{
-    "thought_summary": "Short reasoning about the current state and what to do next",
     "action": "Name of the tool to execute (open_url, click, type_text, get_page_text, finish)",
     "args": {{ ... arguments for the tool ... }},
+    "thought_summary": "Short reasoning about the current state and what to do next",
     "confidence": 0.9,
     "done": false
 }}
 
 If the task is complete, set "action" to "finish", "done" to true, and put your final answer in "args": {{ "final_answer": "..." }}.
 
+When several steps can be planned from the current page (e.g. filling the fields of a form and submitting it), replace "action" and "args" with an ordered list:
+    "actions": [
+        {{ "action": "type_text", "args": {{ ... }}, "expect": {{ "selector": "#next-field" }} }},
+        {{ "action": "click", "args": {{ ... }}, "expect": {{ "navigation": true }} }}
+    ]
+The list runs in order and stops at the first failure, unmet "expect" or unexpected page navigation. "expect" is optional and may contain
+"url_contains", "selector" (visible), "text" (visible) or "navigation" (true when the action is meant to change the URL). "finish" must always be a single action.
+
 Available Tools:
 - open_url(url: str)
 - click(selector: str)
 - type_text(selector: str, text: str)
 - get_page_text()
 - get_screenshot()
+open_url, click and type_text wait until the page settles. To wait for a specific outcome instead, add "wait" to their args,
+e.g. {{ "selector": "#results" }} or {{ "navigation": true }}.
+
+The browser context lists interactive elements as [index] role "name" -> selector; pass those selectors to click and type_text.
+Lines starting with + / ~ / - are elements added, changed or removed since the previous observation.
 
 Current Browser Context:
 {context}
@@ -31,20 +52,157 @@ Previous Steps:
 {history}
 """
 
+def model_name(provider) -> str:
+    return getattr(provider, "model", None) or getattr(provider, "deployment_name", None) or type(provider).__name__
+
+def provider_name(provider) -> str:
+    # ManagedLLMProvider wraps the real provider as .provider
+    return type(getattr(provider, "provider", None) or provider).__name__
+
 class Planner:
-    async def plan(self, task: str, history: List[Dict], context: str) -> Dict[str, Any]:
+    def _messages(self, task: str, history: List[Dict], context: str) -> List[Dict[str, str]]:
+        rendered = history_compactor.render(history) if settings.HISTORY_COMPACTION else json.dumps(history[-5:])
+        return [
+            {"role": "system", "content": PLANNER_PROMPT.format(task=task, history=rendered, context=context)},
+            {"role": "user", "content": "What is the next step?"}
+        ]
+
+    async def plan(self, task: str, history: List[Dict], context: str, use_cache: bool = True,
+                   on_thought: Optional[Callable[[str], Awaitable[None]]] = None,
+                   on_action: Optional[Callable[[str, Dict[str, Any]], Awaitable[None]]] = None) -> Dict[str, Any]:
+        """
+        Ask the LLM for the next step. With LLM_STREAMING, `on_thought` receives
+        thought_summary deltas and `on_action` is called as soon as action and args
+        are complete, before the rest of the completion arrives. Once `on_action`
+        has been called the returned plan always carries that action and args.
+        """
+        with tracer.span("planner.plan", history_entries=len(history)) as span:
+            plan = await self._plan(task, history, context, use_cache, on_thought, on_action)
+            if span:
+                span.set_attribute("action", plan.get("action"))
+            return plan
+
+    async def _plan(self, task: str, history: List[Dict], context: str, use_cache: bool,
+                    on_thought, on_action) -> Dict[str, Any]:
+        parser = PlanStreamParser() if settings.LLM_STREAMING and (on_thought or on_action) else None
         try:
-            messages = [
-                {"role": "system", "content": PLANNER_PROMPT.format(task=task, history=json.dumps(history[-5:]), context=context)},
-                {"role": "user", "content": "What is the next step?"}
-            ]
-        
-            response_text = await llm_service.generate(messages, json_mode=True)
-            plan = json.loads(response_text)
+            messages = self._messages(task, history, context)
+            prompt_tokens = sum(count_tokens(m["content"]) for m in messages)
+            logger.info("planner_prompt", prompt_tokens=prompt_tokens, history_entries=len(history))
+
+            key = None
+            if use_cache and settings.PLAN_CACHE_ENABLED:
+                key = cache_key(self._messages(task, canonical_history(history), context), model_name(llm_service))
+                cached = await plan_cache.get(key)
+                if cached is not None:
+                    logger.info("plan_cache_hit", hit_rate=round(plan_cache.hit_rate, 4))
+                    return json.loads(cached)
+
+            tiered = settings.PLANNER_TIERED and fast_llm_service
+            fast = await self._fast_plan(messages, history, prompt_tokens) if tiered else None
+            if fast:
+                plan, response_text = fast
+            else:
+                stream = (parser, on_thought, on_action) if parser else None
+                response_text = await self._generate(llm_service, messages, prompt_tokens,
+                                                     "large" if tiered else "default", stream)
+                plan = json.loads(response_text)
+            if key:
+                await plan_cache.set(key, response_text)
+            if settings.PLANNER_TIERED and fast_llm_service:
+                plan["tier"] = "fast" if fast else "large"
             return plan
         except Exception as e:
             logger.error("planning_failed", error=str(e))
+            if parser and parser.action:
+                # The action is already running; report it rather than a wait.
+                return {"thought_summary": parser.fields.get("thought_summary") or "", **parser.action, "done": False}
             # Fallback or retry logic could go here
             return {"thought_summary": "Error in planning", "action": "wait", "args": {}, "done": False}
 
+    async def _generate(self, provider, messages: List[Dict[str, str]], prompt_tokens: int, tier: str,
+                        stream: Optional[Tuple] = None) -> str:
+        """One model call, traced and recorded; `stream` is (parser, on_thought, on_action) to stream it."""
+        labels = {"provider": provider_name(provider), "model": model_name(provider)}
+        start = time.time()
+        serving_backend.set(None)
+        with tracer.span("llm.generate", tier=tier, streaming=bool(stream), **labels) as span:
+            try:
+                if stream:
+                    response_text = await self._stream(messages, *stream)
+                else:
+                    response_text = await provider.generate(messages, json_mode=True)
+            except Exception:
+                LLM_ERRORS.labels(**labels).inc()
+                raise
+            backend = serving_backend.get()
+            if backend is not None:
+                # Routed: record the backend that answered, not the router
+                labels = {"provider": provider_name(backend.provider), "model": model_name(backend.provider)}
+                if span:
+                    span.set_attribute("backend", backend.name)
+        LLM_LATENCY.labels(tier=tier, **labels).observe(time.time() - start)
+        LLM_TOKENS.labels(kind="prompt", **labels).inc(prompt_tokens)
+        LLM_TOKENS.labels(kind="completion", **labels).inc(count_tokens(response_text or ""))
+        return response_text
+
+    async def _fast_plan(self, messages: List[Dict[str, str]], history: List[Dict],
+                         prompt_tokens: int = 0) -> Optional[Tuple[Dict[str, Any], str]]:
+        """
+        Plan with the fast model; None means escalate to the large one. The fast call is
+        not streamed: its action must not start before its confidence has been read.
+        """
+        reason = "tool_failure" if self._last_step_failed(history) else None
+        plan, start = {}, time.time()
+        if reason is None:
+            try:
+                response_text = await self._generate(fast_llm_service, messages, prompt_tokens, "fast")
+                plan = json.loads(response_text)
+                reason = self._escalation_reason(plan, history)
+            except Exception as e:
+                logger.warning("fast_planning_failed", error=str(e))
+                reason = "fast_model_error"
+        logger.info("planner_tier", tier="large" if reason else "fast", reason=reason,
+                    confidence=plan.get("confidence"), action=plan.get("action"),
+                    fast_ms=round(1000 * (time.time() - start)))
+        return None if reason else (plan, response_text)
+
+    @staticmethod
+    def _last_step_failed(history: List[Dict]) -> bool:
+        steps = [step for step in history if "plan" in step]
+        return bool(steps) and not (steps[-1].get("result") or {}).get("success", True)
+
+    @staticmethod
+    def _escalation_reason(plan: Dict[str, Any], history: List[Dict]) -> Optional[str]:
+        try:
+            confidence = float(plan.get("confidence", 0))
+        except (TypeError, ValueError):
+            confidence = 0.0
+        if confidence < settings.PLANNER_ESCALATION_CONFIDENCE:
+            return "low_confidence"
+        steps = [step for step in history if "plan" in step]
+        if steps:
+            last = steps[-1]["plan"]
+            if all(last.get(k) == plan.get(k) for k in ("action", "args", "actions")):
+                return "repeated_action"
+        return None
+
+    async def _stream(self, messages: List[Dict[str, str]], parser: PlanStreamParser, on_thought, on_action) -> str:
+        start = time.time()
+        action_at = None
+        parts = []
+        async for delta in llm_service.generate_stream(messages, json_mode=True):
+            parts.append(delta)
+            for kind, value in parser.feed(delta):
+                if kind == "thought" and on_thought:
+                    await on_thought(value)
+                elif kind == "action":
+                    action_at = time.time()
+                    if on_action:
+                        await on_action(value["action"], value["args"])
+        end = time.time()
+        logger.info("plan_streamed", total_ms=round(1000 * (end - start)),
+                    first_action_ms=round(1000 * (action_at - start)) if action_at else None)
+        return "".join(parts)
+
 planner = Planner()
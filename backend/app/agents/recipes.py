@@ -0,0 +1,185 @@
+import re
+import json
+import time
+import hashlib
+from typing import Any, Dict, List, Optional, Tuple
+from app.core.config import settings
+from app.core.logger import logger
+from app.db.mongo import get_db
+
+# Task parts treated as parameters: "quoted text", URLs, e-mail addresses and numbers/dates.
+_PARAM = re.compile(r'"([^"]+)"|(https?://[^\s"]+)|([\w.+-]+@[\w-]+\.[\w.-]+)|(\d[\d,./:-]*)')
+
+# Read-only tools: their output is page content, so an answer recorded after one
+# is not reusable and the planner writes the final answer on replay.
+READ_TOOLS = {"get_page_text", "get_screenshot"}
+
+# An observation that is only this line carries no page content (OBSERVATION_MODE=url).
+_URL_ONLY = re.compile(r"^Current URL: \S*$")
+
+def _saw_page_content(step: Dict[str, Any]) -> bool:
+    observation = step.get("observation")
+    return isinstance(observation, str) and not _URL_ONLY.match(observation.strip())
+
+def normalize_task(task: str) -> Tuple[str, List[str]]:
+    """'Search "RPA" on https://x.com' -> ('search {p0} on {p1}', ['RPA', 'https://x.com'])."""
+    params = []
+
+    def placeholder(match):
+        if match.group(1) is not None:
+            value, suffix = match.group(1), ""
+        else:
+            raw = match.group(0)
+            value = raw.rstrip(".,;:)")
+            suffix = raw[len(value):]
+        params.append(value)
+        return f"{{p{len(params) - 1}}}{suffix}"
+
+    template = _PARAM.sub(placeholder, task.strip())
+    template = re.sub(r"\s+", " ", template).lower().rstrip(" .!?")
+    return template, params
+
+def _substitute(value: Any, replacements: List[Tuple[str, str]]) -> Any:
+    if isinstance(value, str):
+        for old, new in replacements:
+            value = value.replace(old, new)
+        return value
+    if isinstance(value, dict):
+        return {k: _substitute(v, replacements) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_substitute(v, replacements) for v in value]
+    return value
+
+def _token(value: str) -> "re.Pattern":
+    return re.compile(rf"(?<!\w){re.escape(value)}(?!\w)")
+
+def _bind(value: Any, params: Dict[int, str]) -> Any:
+    """Replace whole-token occurrences of parameter values with placeholders, leaving selectors alone."""
+    if isinstance(value, str):
+        # Longest values first so "https://x.com/a" is not split by "https://x.com".
+        for i, param in sorted(params.items(), key=lambda p: -len(p[1])):
+            value = _token(param).sub(f"{{p{i}}}", value)
+        return value
+    if isinstance(value, dict):
+        return {k: v if k == "selector" else _bind(v, params) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_bind(v, params) for v in value]
+    return value
+
+def _recipe_id(tenant: str, shape: str, literals: Dict[str, str]) -> str:
+    return hashlib.sha256(json.dumps([tenant, shape, literals], sort_keys=True).encode()).hexdigest()[:32]
+
+def build_recipe(task: str, steps: List[Dict[str, Any]], final_answer: str,
+                 tenant: str = "default") -> Optional[Dict[str, Any]]:
+    """
+    Turn the successful steps of a finished task into a parameterized recipe.
+
+    Only parameters that actually appear in the recorded actions are bound; the
+    others are kept as literals the next task must match exactly (so "repeat 3
+    times" never replays as "repeat 5 times"). The final answer is only kept if
+    it cannot have come from the page: no read tool ran and no observation (e.g.
+    the element digest) showed page content.
+    """
+    shape, params = normalize_task(task)
+    kept = []
+    for step in steps:
+        plan, result = step.get("plan") or {}, step.get("result") or {}
+        if not result.get("success"):
+            continue
+        if plan.get("actions"):
+            kept.append({"actions": [{k: a[k] for k in ("action", "args", "expect") if k in a} for a in plan["actions"]],
+                         "url": step.get("url")})
+        elif plan.get("action") and plan["action"] not in ("finish", "wait"):
+            kept.append({"action": plan["action"], "args": plan.get("args") or {}, "url": step.get("url")})
+    if not kept:
+        return None
+
+    bindable = {i: value for i, value in enumerate(params)}
+    steps_bound = _bind([{k: v for k, v in step.items() if k != "url"} for step in kept], bindable)
+    bound = {i for i in bindable if f"{{p{i}}}" in json.dumps(steps_bound)}
+    literals = {str(i): value for i, value in enumerate(params) if i not in bound}
+    bound_params = {i: params[i] for i in bound}
+    actions = [step.get("action") for step in kept] + [a["action"] for step in kept for a in step.get("actions", [])]
+    answer_from_page = bool(READ_TOOLS & set(actions)) or any(_saw_page_content(step) for step in steps)
+
+    return {
+        "_id": _recipe_id(tenant, shape, literals),
+        "tenant": tenant,
+        "shape": shape,
+        "literals": literals,
+        "steps": _bind(kept, bound_params),
+        "final_answer": None if answer_from_page else _bind(final_answer, bound_params),
+        "example_task": task,
+    }
+
+def instantiate(recipe: Dict[str, Any], params: List[str]) -> List[Dict[str, Any]]:
+    """Concrete plans for a matched recipe; the last is a finish plan when the answer is reusable."""
+    replacements = [(f"{{p{i}}}", value) for i, value in enumerate(params)]
+    plans = []
+    for step in _substitute(recipe["steps"], replacements):
+        plan = {k: v for k, v in step.items() if k != "url"}
+        plan.update(thought_summary=f"Replaying recipe {recipe['_id']}", confidence=1.0, done=False,
+                    recipe_id=recipe["_id"], expect_url=step.get("url"))
+        plans.append(plan)
+    if recipe.get("final_answer") is not None:
+        plans.append({"thought_summary": f"Replaying recipe {recipe['_id']}", "action": "finish",
+                      "args": {"final_answer": _substitute(recipe["final_answer"], replacements)},
+                      "confidence": 1.0, "done": True, "recipe_id": recipe["_id"]})
+    return plans
+
+def verify_step(plan: Dict[str, Any], result: Dict[str, Any], url: str) -> Optional[str]:
+    """Why a replayed step diverged from the recording, or None if it matched."""
+    if not result.get("success"):
+        return result.get("error") or "step failed"
+    expected = plan.get("expect_url")
+    if expected and expected.split("#", 1)[0] != url.split("#", 1)[0]:
+        return f"expected {expected}, at {url}"
+    return None
+
+class RecipeStore:
+    """Recorded workflows in the `recipes` collection, matched by tenant and normalized task shape."""
+
+    COLLECTION = "recipes"
+
+    def __init__(self):
+        self._indexed = False
+
+    async def _collection(self):
+        collection = (await get_db())[self.COLLECTION]
+        if not self._indexed:
+            await collection.create_index([("tenant", 1), ("shape", 1), ("updated_at", -1)])
+            self._indexed = True
+        return collection
+
+    async def match(self, task: str, tenant: str = "default") -> Optional[List[Dict[str, Any]]]:
+        shape, params = normalize_task(task)
+        collection = await self._collection()
+        candidates = await collection.find({"tenant": tenant, "shape": shape}).sort("updated_at", -1).to_list(length=20)
+        for recipe in candidates:
+            if any(params[int(i)] != value for i, value in recipe["literals"].items()):
+                continue
+            if recipe.get("failures", 0) >= settings.RECIPE_MAX_FAILURES and recipe["failures"] > recipe.get("successes", 0):
+                continue
+            logger.info("recipe_matched", recipe_id=recipe["_id"], shape=shape)
+            return instantiate(recipe, params)
+        return None
+
+    async def record(self, task: str, steps: List[Dict[str, Any]], final_answer: str, tenant: str = "default"):
+        recipe = build_recipe(task, steps, final_answer, tenant)
+        if recipe is None:
+            return
+        collection = await self._collection()
+        now = time.time()
+        await collection.update_one(
+            {"_id": recipe["_id"]},
+            {"$set": {**{k: v for k, v in recipe.items() if k != "_id"}, "updated_at": now, "failures": 0},
+             "$setOnInsert": {"created_at": now, "successes": 0}},
+            upsert=True,
+        )
+        logger.info("recipe_recorded", recipe_id=recipe["_id"], shape=recipe["shape"], steps=len(recipe["steps"]))
+
+    async def report(self, recipe_id: str, success: bool):
+        collection = await self._collection()
+        await collection.update_one({"_id": recipe_id}, {"$inc": {"successes" if success else "failures": 1}})
+
+recipe_store = RecipeStore()
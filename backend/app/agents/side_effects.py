@@ -0,0 +1,74 @@
+import time
+import asyncio
+from typing import Awaitable, Callable, Optional
+from app.core.config import settings
+from app.core.logger import logger
+from app.core.tracing import tracer
+
+class SideEffectPipeline:
+    """
+    Per-session queue for work the next step does not depend on: live-view frames,
+    step persistence, chat publishes.
+
+    - Ordering: one consumer runs effects strictly in submission order, so a step is
+      persisted before the next one and before any status change that follows a flush.
+    - Backpressure: at most SIDE_EFFECTS_MAX_PENDING effects wait; `submit` blocks
+      when Redis falls that far behind, which slows the step loop down instead of
+      growing memory.
+    - Failures are logged and do not stop later effects; `flush()` waits for
+      everything submitted so far (before status changes, suspend and release).
+
+    Each effect is traced as a child of the span that submitted it. With
+    SIDE_EFFECTS_PIPELINED off, effects run inline.
+    """
+
+    def __init__(self, session_id: str, max_pending: int = None):
+        self.session_id = session_id
+        self.enabled = settings.SIDE_EFFECTS_PIPELINED
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_pending or settings.SIDE_EFFECTS_MAX_PENDING)
+        self._worker: Optional[asyncio.Task] = None
+        self.stats = {"submitted": 0, "failed": 0, "blocked": 0, "blocked_seconds": 0.0}
+
+    async def submit(self, name: str, effect: Callable[[], Awaitable]):
+        self.stats["submitted"] += 1
+        if not self.enabled:
+            await effect()
+            return
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+        if self._queue.full():
+            self.stats["blocked"] += 1
+            start = time.monotonic()
+            await self._queue.put((name, effect, tracer.traceparent()))
+            self.stats["blocked_seconds"] += time.monotonic() - start
+            logger.warning("side_effects_backpressure", session_id=self.session_id, effect=name,
+                           waited=round(time.monotonic() - start, 3))
+        else:
+            self._queue.put_nowait((name, effect, tracer.traceparent()))
+
+    async def flush(self):
+        """Wait until every effect submitted so far has run."""
+        if self._worker is not None and not self._worker.done():
+            await self._queue.join()
+
+    async def close(self):
+        try:
+            await self.flush()
+        finally:
+            if self._worker is not None:
+                self._worker.cancel()
+                self._worker = None
+            if self.stats["submitted"]:
+                logger.info("side_effects_closed", session_id=self.session_id, **self.stats)
+
+    async def _run(self):
+        while True:
+            name, effect, traceparent = await self._queue.get()
+            try:
+                with tracer.span("side_effect", traceparent=traceparent, effect=name):
+                    await effect()
+            except Exception as e:
+                self.stats["failed"] += 1
+                logger.error("side_effect_failed", session_id=self.session_id, effect=name, error=str(e))
+            finally:
+                self._queue.task_done()
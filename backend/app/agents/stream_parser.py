@@ -0,0 +1,132 @@
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+class PlanStreamParser:
+    """
+    Incremental scanner for a planner JSON object arriving in arbitrary chunks.
+
+    `feed()` returns events as soon as they can be known:
+      ("thought", delta)                      new text of the `thought_summary` string
+      ("action", {"action": .., "args": ..})  once both top-level fields are complete
+    Only top-level values are decoded; nested objects are skipped by bracket depth.
+    Anything before the opening brace (e.g. a ```json fence) is ignored.
+    """
+
+    THOUGHT_KEY = "thought_summary"
+
+    def __init__(self):
+        self.buffer = ""
+        self.fields: Dict[str, Any] = {}
+        self.action: Optional[Dict[str, Any]] = None
+        self.complete = False
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._expect = "key"  # at depth 1: key, colon or value
+        self._key: Optional[str] = None
+        self._start: Optional[int] = None  # start of the current top-level key or value
+        self._thought_sent = 0
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        events: List[Tuple[str, Any]] = []
+        self.buffer += chunk
+        buf = self.buffer
+        while self._pos < len(buf) and not self.complete:
+            i, c = self._pos, buf[self._pos]
+            self._pos += 1
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    if self._depth == 1:
+                        if self._expect == "key":
+                            self._key = json.loads(buf[self._start:i + 1])
+                            self._expect = "colon"
+                            self._start = None
+                        else:
+                            self._finish_value(buf[self._start:i + 1], events)
+                continue
+
+            if self._depth == 0:
+                if c == "{":
+                    self._depth = 1
+                continue
+
+            if self._depth > 1:
+                if c == '"':
+                    self._in_string = True
+                elif c in "{[":
+                    self._depth += 1
+                elif c in "}]":
+                    self._depth -= 1
+                    if self._depth == 1:
+                        self._finish_value(buf[self._start:i + 1], events)
+                continue
+
+            # depth 1: between top-level keys and values
+            if c == '"':
+                self._in_string = True
+                if self._expect in ("key", "value"):
+                    self._start = i
+            elif c == ":":
+                self._expect = "value"
+            elif c in "{[":
+                self._start = i
+                self._depth += 1
+            elif c in ",}":
+                if self._start is not None:
+                    self._finish_value(buf[self._start:i], events)
+                self._expect = "key"
+                if c == "}":
+                    self._depth = 0
+                    self.complete = True
+                    if self.action is None and "action" in self.fields:
+                        self._action_ready(events)
+            elif not c.isspace() and self._expect == "value" and self._start is None:
+                self._start = i
+
+        if self._in_string and self._depth == 1 and self._expect == "value" and self._key == self.THOUGHT_KEY:
+            self._emit_thought(buf[self._start + 1:], events)
+        return events
+
+    def _finish_value(self, raw: str, events: List[Tuple[str, Any]]):
+        try:
+            value = json.loads(raw)
+        except ValueError:
+            value = None
+        key = self._key
+        self.fields[key] = value
+        self._start = None
+        self._expect = "key"
+        if key == self.THOUGHT_KEY and isinstance(value, str):
+            if len(value) > self._thought_sent:
+                events.append(("thought", value[self._thought_sent:]))
+                self._thought_sent = len(value)
+        if self.action is None and "action" in self.fields and "args" in self.fields:
+            self._action_ready(events)
+
+    def _action_ready(self, events: List[Tuple[str, Any]]):
+        args = self.fields.get("args")
+        self.action = {"action": self.fields["action"], "args": args if isinstance(args, dict) else {}}
+        events.append(("action", self.action))
+
+    def _emit_thought(self, raw: str, events: List[Tuple[str, Any]]):
+        # A chunk can end mid escape sequence (at most "\\uXXX"); hold that part back.
+        for trim in range(7):
+            try:
+                text = json.loads(f'"{raw[:len(raw) - trim]}"')
+                break
+            except ValueError:
+                continue
+        else:
+            return
+        if text and "\ud800" <= text[-1] <= "\udbff":
+            text = text[:-1]  # first half of a surrogate pair
+        if len(text) > self._thought_sent:
+            events.append(("thought", text[self._thought_sent:]))
+            self._thought_sent = len(text)
@@ -0,0 +1,121 @@
+import asyncio
+from collections import deque
+from typing import Deque, Dict, Optional, Set, Tuple
+from app.core.config import settings
+from app.core.logger import logger
+from app.core.metrics import PUBSUB_BYTES, PUBSUB_MESSAGES
+from app.db.redis import get_redis_binary
+
+# (kind, payload): kind is "text" for session_updates JSON, "bytes" for live-view frames.
+Message = Tuple[str, object]
+
+class Subscription:
+    """Bounded per-WebSocket queue. When a slow client falls behind, the oldest messages are dropped."""
+
+    def __init__(self, session_id: str, maxsize: int):
+        self.session_id = session_id
+        self._queue: Deque[Message] = deque(maxlen=maxsize)
+        self._ready = asyncio.Event()
+        self.dropped = 0
+
+    def push(self, message: Message):
+        if len(self._queue) == self._queue.maxlen:
+            self.dropped += 1  # deque(maxlen) evicts the oldest entry on append
+        self._queue.append(message)
+        self._ready.set()
+
+    async def get(self) -> Message:
+        while not self._queue:
+            self._ready.clear()
+            await self._ready.wait()
+        return self._queue.popleft()
+
+class SessionBroadcaster:
+    """
+    One Redis pattern subscription per API process, fanned out in-process.
+
+    Instead of a pubsub connection and a 50 ms polling loop per WebSocket, a single
+    task blocks on `listen()` for `session_updates:*` and `session_frames:*` and
+    pushes each message to the subscriptions registered for that session. Idle
+    viewers cost one small queue each and no CPU.
+    """
+
+    PATTERNS = ("session_updates:*", "session_frames:*")
+
+    def __init__(self, queue_size: int = None):
+        self.queue_size = queue_size or settings.WS_QUEUE_SIZE
+        self._subs: Dict[str, Set[Subscription]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._pubsub = None
+        self.stats = {"received": 0, "delivered": 0}
+
+    async def start(self):
+        if self._task and not self._task.done():
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        await self._close_pubsub()
+
+    async def _close_pubsub(self):
+        if self._pubsub:
+            pubsub, self._pubsub = self._pubsub, None
+            try:
+                await pubsub.close()
+            except Exception:
+                pass
+
+    def subscribe(self, session_id: str) -> Subscription:
+        sub = Subscription(session_id, self.queue_size)
+        self._subs.setdefault(session_id, set()).add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription):
+        subs = self._subs.get(sub.session_id)
+        if subs:
+            subs.discard(sub)
+            if not subs:
+                del self._subs[sub.session_id]
+
+    @property
+    def connections(self) -> int:
+        return sum(len(s) for s in self._subs.values())
+
+    async def _run(self):
+        backoff = 0.5
+        while True:
+            try:
+                redis = await get_redis_binary()
+                self._pubsub = redis.pubsub()
+                await self._pubsub.psubscribe(*self.PATTERNS)
+                logger.info("ws_broadcaster_subscribed", patterns=self.PATTERNS)
+                backoff = 0.5
+                async for message in self._pubsub.listen():
+                    if message["type"] == "pmessage":
+                        self._dispatch(message["channel"], message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("ws_broadcaster_failed", error=str(e), retry_in=backoff)
+                await self._close_pubsub()  # its connection goes back to the pool before we reconnect
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 10)
+
+    def _dispatch(self, channel: bytes, data: bytes):
+        self.stats["received"] += 1
+        prefix, _, session_id = channel.decode().partition(":")
+        kind = "frames" if prefix == "session_frames" else "updates"
+        PUBSUB_MESSAGES.labels(kind=kind).inc()
+        PUBSUB_BYTES.labels(kind=kind).observe(len(data))
+        subs = self._subs.get(session_id)
+        if not subs:
+            return
+        message = ("bytes", data) if prefix == "session_frames" else ("text", data.decode("utf-8"))
+        for sub in subs:
+            sub.push(message)
+        self.stats["delivered"] += len(subs)
+
+broadcaster = SessionBroadcaster()
@@ -1,53 +1,150 @@
-from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi import APIRouter, HTTPException, Query, Request, Response, WebSocket, WebSocketDisconnect
 from pydantic import BaseModel
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Literal
 import asyncio
 import json
+import uuid
 
 from app.core.session import session_manager
+from app.core.batches import batch_manager
+from app.core.config import settings
+from app.core.inbox import session_inbox
+from app.core.screenshots import REF_PATTERN, screenshot_store
+from app.core.tracing import tracer, task_kwargs
+from app.agents.checkpoints import session_lease
 from app.worker.tasks import run_agent_task
 from app.db.redis import get_redis
+from app.browser.live_view import VIEWER_TTL, add_viewer, remove_viewer
+from app.api.broadcast import broadcaster
 
 router = APIRouter()
 
 class CreateSessionRequest(BaseModel):
     task: str
+    plan_cache: bool = True # set false to always call the model (when PLAN_CACHE_ENABLED)
+    recipes: bool = True # set false to never replay a recorded workflow (when RECIPES_ENABLED)
 
 class SessionResponse(BaseModel):
     session_id: str
     status: str
 
+class SessionMessageRequest(BaseModel):
+    message: str
+
+class CreateBatchRequest(BaseModel):
+    tasks: List[str]
+    tenant: str = "default"
+    priority: Literal["high", "normal", "low"] = "normal"
+    plan_cache: bool = True
+    recipes: bool = True
+
+class BatchResponse(BaseModel):
+    batch_id: str
+    total: int
+    status: str
+
+async def deliver_input(session_id: str, message: str):
+    """Queue a user message for a session, waking it on a worker if it was suspended."""
+    await session_inbox.push(session_id, message)
+    session = await session_manager.get_session(session_id, step_limit=0)
+    if session and session.get("status") == "suspended" and await session_inbox.claim_resume(session_id):
+        await session_manager.update_session(session_id, {"status": "resuming"})
+        run_agent_task.delay(session_id, resume=True, **task_kwargs())
+
 @router.post("/sessions", response_model=SessionResponse)
 async def create_session(request: CreateSessionRequest):
-    session_id = await session_manager.create_session()
-    
-    # Trigger Worker
-    run_agent_task.delay(session_id, request.task)
+    with tracer.span("api.create_session") as span:
+        session_id = await session_manager.create_session(options={"plan_cache": request.plan_cache, "recipes": request.recipes})
+        if span:
+            span.set_attribute("session_id", session_id)
+
+        # Trigger Worker
+        run_agent_task.delay(session_id, request.task, **task_kwargs())
     
     return SessionResponse(session_id=session_id, status="ready")
 
+@router.post("/batches", response_model=BatchResponse)
+async def create_batch(request: CreateBatchRequest):
+    if not request.tasks:
+        raise HTTPException(status_code=422, detail="A batch needs at least one task")
+    if len(request.tasks) > settings.BATCH_MAX_TASKS:
+        raise HTTPException(status_code=413, detail=f"At most {settings.BATCH_MAX_TASKS} tasks per batch")
+    # Sessions are created in pipelined chunks; the scheduler starts them at the tenant's fair share.
+    batch_id = await batch_manager.create_batch(
+        request.tasks, request.tenant, request.priority,
+        options={"plan_cache": request.plan_cache, "recipes": request.recipes},
+    )
+    return BatchResponse(batch_id=batch_id, total=len(request.tasks), status="queued")
+
+@router.get("/batches/{batch_id}")
+async def get_batch(batch_id: str):
+    batch = await batch_manager.get_batch(batch_id)
+    if not batch:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return batch
+
+@router.get("/batches/{batch_id}/sessions")
+async def get_batch_sessions(batch_id: str, offset: int = Query(0, ge=0), limit: int = Query(100, ge=1, le=1000)):
+    if not await batch_manager.get_batch(batch_id):
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return {"batch_id": batch_id, "session_ids": await batch_manager.list_sessions(batch_id, offset, limit)}
+
 @router.get("/sessions/{session_id}")
-async def get_session(session_id: str):
-    data = await session_manager.get_session(session_id)
+async def get_session(session_id: str, offset: int = Query(0, ge=0), limit: Optional[int] = Query(None, ge=0)):
+    # Steps are paginated with offset/limit; `step_count` is the total.
+    data = await session_manager.get_session(session_id, step_offset=offset, step_limit=limit)
     if not data:
         raise HTTPException(status_code=404, detail="Session not found")
     return data
 
+@router.post("/sessions/{session_id}/messages", response_model=SessionResponse)
+async def send_message(session_id: str, request: SessionMessageRequest):
+    if not await session_manager.get_session(session_id, step_limit=0):
+        raise HTTPException(status_code=404, detail="Session not found")
+    await deliver_input(session_id, request.message)
+    return SessionResponse(session_id=session_id, status="queued")
+
+@router.post("/sessions/{session_id}/migrate", response_model=SessionResponse)
+async def migrate_session(session_id: str):
+    # The worker checkpoints the session at its next step and re-queues it for any worker to pick up.
+    session = await session_manager.get_session(session_id, step_limit=0)
+    if not session:
+        raise HTTPException(status_code=404, detail="Session not found")
+    if session.get("status") != "running":
+        raise HTTPException(status_code=409, detail=f"Only running sessions can be migrated (status: {session.get('status')})")
+    await session_lease.request_migration(session_id)
+    return SessionResponse(session_id=session_id, status="migration_requested")
+
+@router.get("/screenshots/{ref}")
+async def get_screenshot(ref: str, request: Request):
+    if screenshot_store is None or not REF_PATTERN.match(ref):
+        raise HTTPException(status_code=404, detail="Screenshot not found")
+    # Content-addressed, so a ref's bytes never change: cache forever, revalidate by ETag.
+    headers = {"Cache-Control": "public, max-age=31536000, immutable", "ETag": f'"{ref}"'}
+    if request.headers.get("if-none-match") == headers["ETag"]:
+        return Response(status_code=304, headers=headers)
+    data = await screenshot_store.get(ref)
+    if data is None:
+        raise HTTPException(status_code=404, detail="Screenshot not found")
+    return Response(content=data, media_type="image/jpeg", headers=headers)
+
 @router.websocket("/sessions/{session_id}/ws")
 async def websocket_endpoint(websocket: WebSocket, session_id: str):
     await websocket.accept()
     redis = await get_redis()
-    pubsub = redis.pubsub()
-    
-    channel = f"session_updates:{session_id}"
-    await pubsub.subscribe(channel)
-    input_channel = f"session_input:{session_id}"
+    # Updates and frames come from the process-wide subscription (app/api/broadcast.py).
+    await broadcaster.start()
+    subscription = broadcaster.subscribe(session_id)
+
+    # Workers only capture live-view frames while the session has viewers.
+    viewer_id = uuid.uuid4().hex
+    await add_viewer(redis, session_id, viewer_id)
 
     async def receive_from_client():
         try:
             while True:
                 data = await websocket.receive_text()
-                await redis.publish(input_channel, data)
+                await deliver_input(session_id, data)
         except WebSocketDisconnect:
             pass
         except Exception as e:
@@ -56,29 +153,32 @@ async def websocket_endpoint(websocket: WebSocket, session_id: str):
     async def send_to_client():
         try:
             while True:
-                message = await pubsub.get_message(ignore_subscribe_messages=True)
-                if message:
-                    data = message["data"]
-                    if isinstance(data, bytes):
-                        data = data.decode('utf-8')
-                    try:
-                        await websocket.send_text(data)
-                    except Exception:
-                        break
-                await asyncio.sleep(0.05)
+                kind, data = await subscription.get()
+                if kind == "bytes":
+                    await websocket.send_bytes(data)
+                else:
+                    await websocket.send_text(data)
         except WebSocketDisconnect:
             pass
         except Exception as e:
             pass
 
+    async def keep_presence():
+        # Refresh well within the TTL; a crashed API process's viewers just expire.
+        while True:
+            await asyncio.sleep(VIEWER_TTL / 3)
+            await add_viewer(redis, session_id, viewer_id)
+
     send_task = asyncio.create_task(send_to_client())
     recv_task = asyncio.create_task(receive_from_client())
+    presence_task = asyncio.create_task(keep_presence())
     
     done, pending = await asyncio.wait(
         [send_task, recv_task],
         return_when=asyncio.FIRST_COMPLETED,
     )
-    for task in pending:
+    for task in [*pending, presence_task]:
         task.cancel()
     
-    await pubsub.unsubscribe(channel)
+    broadcaster.unsubscribe(subscription)
+    await remove_viewer(redis, session_id, viewer_id)
@@ -1,17 +1,35 @@
-from playwright.async_api import async_playwright, Browser, Playwright, BrowserContext
+import asyncio
+from typing import Tuple
+from playwright.async_api import async_playwright, Browser, Playwright, BrowserContext, Page
+from app.browser.network import network_router
+from app.browser.pool import ContextPool
 from app.core.config import settings
 from app.core.logger import logger
+from app.core.metrics import BROWSER_CONTEXTS
 
 class BrowserManager:
     playwright: Playwright = None
     browser: Browser = None
 
+    def __init__(self):
+        # Several sessions can share this manager on one loop (async worker mode),
+        # so launching must not race.
+        self._start_lock = asyncio.Lock()
+        self.pool = ContextPool(lambda: self.create_context(record_video=False))
+        self.pool.reset_hooks.append(network_router.reset_hook)
+        self._leases = {}
+
     async def start(self):
+        async with self._start_lock:
+            await self._start()
+
+    async def _start(self):
         if not self.playwright:
             self.playwright = await async_playwright().start()
             logger.info("Playwright started")
         
-        if not self.browser:
+        # A long-lived worker process shares one Chromium; relaunch it if it crashed.
+        if not self.browser or not self.browser.is_connected():
             # Headless=True for docker usually, but requirements say Headful mode support.
             # We can control this via env var or simply default to Headless=True for server.
             # For "Live View", we might need to stream screenshots/video anyway.
@@ -21,20 +39,55 @@ class BrowserManager:
             )
             logger.info("Browser launched")
 
-    async def create_context(self) -> BrowserContext:
-        if not self.browser:
+    async def create_context(self, record_video: bool = None, storage_state: dict = None) -> BrowserContext:
+        if not self.browser or not self.browser.is_connected():
             await self.start()
         
+        if record_video is None:
+            record_video = settings.BROWSER_RECORD_VIDEO
         context = await self.browser.new_context(
             viewport={"width": 1280, "height": 720},
-            record_video_dir="videos/" # Optional for debugging
+            record_video_dir="videos/" if record_video else None, # Optional for debugging
+            storage_state=storage_state
         )
+        BROWSER_CONTEXTS.inc()
+        context.on("close", lambda _: BROWSER_CONTEXTS.dec())
+        if settings.NETWORK_ROUTING_ENABLED:
+            await network_router.attach(context)
         return context
 
+    async def acquire_page(self, storage_state: dict = None) -> Tuple[BrowserContext, Page]:
+        """Context + page for one session: a reset, pre-warmed one when pooling is on, else a fresh one.
+
+        Restoring `storage_state` (cookies + localStorage) needs a context created with it, so it bypasses the pool.
+        """
+        if storage_state is not None or not settings.BROWSER_POOL_ENABLED:
+            context = await self.create_context(storage_state=storage_state)
+            return context, await context.new_page()
+        entry = await self.pool.acquire()
+        self._leases[id(entry.context)] = entry
+        return entry.context, entry.page
+
+    async def release_page(self, context: BrowserContext, page: Page, reusable: bool = True):
+        entry = self._leases.pop(id(context), None)
+        if entry is None:
+            await context.close()
+            return
+        await self.pool.release(entry, reusable=reusable)
+
+    async def warm_up(self):
+        await self.start()
+        if settings.BROWSER_POOL_ENABLED:
+            await self.pool.start()
+
     async def close(self):
+        await self.pool.close()
+        self._leases.clear()
         if self.browser:
             await self.browser.close()
+            self.browser = None
         if self.playwright:
             await self.playwright.stop()
+            self.playwright = None
 
 browser_manager = BrowserManager()
@@ -0,0 +1,223 @@
+import io
+import time
+import json
+import base64
+import asyncio
+import hashlib
+from typing import Optional
+from PIL import Image
+from playwright.async_api import Page
+from app.core.config import settings
+from app.core.logger import logger
+from app.core.tracing import tracer
+from app.core.screenshots import image_message
+from app.db.redis import get_redis, get_redis_binary
+
+VIEWERS_KEY = "session_viewers:{session_id}"
+FRAMES_CHANNEL = "session_frames:{session_id}"
+UPDATES_CHANNEL = "session_updates:{session_id}"
+VIEWER_TTL = 60  # seconds a viewer counts without refreshing its presence
+
+async def add_viewer(redis, session_id: str, viewer_id: str):
+    """
+    Register or refresh one viewer. Viewers are members of a sorted set scored by
+    their expiry, so one whose API process died stops counting after VIEWER_TTL
+    without anyone having to decrement for it.
+    """
+    key = VIEWERS_KEY.format(session_id=session_id)
+    now = time.time()
+    async with redis.pipeline(transaction=False) as pipe:
+        pipe.zremrangebyscore(key, "-inf", now)
+        pipe.zadd(key, {viewer_id: now + VIEWER_TTL})
+        pipe.expire(key, VIEWER_TTL)
+        await pipe.execute()
+
+async def remove_viewer(redis, session_id: str, viewer_id: str):
+    await redis.zrem(VIEWERS_KEY.format(session_id=session_id), viewer_id)
+
+async def count_viewers(redis, session_id: str) -> int:
+    return await redis.zcount(VIEWERS_KEY.format(session_id=session_id), time.time(), "+inf")
+
+def dhash(jpeg: bytes, size: int = 8) -> int:
+    """64-bit difference hash: near-identical frames differ in only a few bits."""
+    with Image.open(io.BytesIO(jpeg)) as img:
+        img.draft("L", (size * 8, size * 8))  # let the JPEG decoder downscale cheaply
+        pixels = list(img.convert("L").resize((size + 1, size)).getdata())
+    bits = 0
+    for row in range(size):
+        for col in range(size):
+            left = pixels[row * (size + 1) + col]
+            right = pixels[row * (size + 1) + col + 1]
+            bits = (bits << 1) | (left > right)
+    return bits
+
+class LiveView:
+    """
+    Live-view frames for one session, produced only while someone is watching.
+
+    - Presence: the WebSocket endpoint registers each viewer in `session_viewers:{id}`
+      (see `add_viewer`); with no viewers nothing is captured or published.
+    - Diffing: frames identical to the last one sent, or within
+      LIVE_VIEW_DIFF_THRESHOLD bits of its perceptual hash, are dropped.
+    - Rate limiting: at most LIVE_VIEW_MAX_FPS frames/s; a frame that arrives too
+      early is deferred to the end of the interval (trailing edge), so the final
+      state of a burst of actions is still shown.
+    - Source: `page.screenshot` after each action, or a CDP screencast
+      (LIVE_VIEW_MODE=screencast) that Chromium pushes while viewers are present.
+    - Transport: raw JPEG bytes on the `session_frames:{id}` channel, which the
+      WebSocket endpoint forwards as binary messages.
+    """
+
+    def __init__(self, session_id: str, page: Page):
+        self.session_id = session_id
+        self.page = page
+        self.mode = settings.LIVE_VIEW_MODE
+        self.min_interval = 1.0 / settings.LIVE_VIEW_MAX_FPS if settings.LIVE_VIEW_MAX_FPS > 0 else 0.0
+        self.threshold = settings.LIVE_VIEW_DIFF_THRESHOLD
+
+        self._viewers = 0
+        self._viewers_checked = 0.0
+        self._last_sent_at = 0.0
+        self._last_digest: Optional[bytes] = None
+        self._last_hash: Optional[int] = None
+        self._deferred: Optional[bytes] = None
+        self._flush_task: Optional[asyncio.Task] = None
+        self._presence_task: Optional[asyncio.Task] = None
+        self._cdp = None
+        self.stats = {"captured": 0, "published": 0, "skipped_unchanged": 0, "skipped_no_viewers": 0, "bytes": 0}
+
+    async def start(self):
+        if self.mode == "screencast":
+            self._presence_task = asyncio.create_task(self._follow_presence())
+
+    async def close(self):
+        for task in (self._presence_task, self._flush_task):
+            if task:
+                task.cancel()
+        await self._stop_screencast()
+
+    async def watching(self) -> bool:
+        now = time.monotonic()
+        if now - self._viewers_checked >= settings.LIVE_VIEW_PRESENCE_INTERVAL:
+            self._viewers_checked = now
+            try:
+                redis = await get_redis()
+                self._viewers = await count_viewers(redis, self.session_id)
+            except Exception as e:
+                logger.error("live_view_presence_failed", session_id=self.session_id, error=str(e))
+        return self._viewers > 0
+
+    async def capture(self):
+        """Called after each action. In screencast mode Chromium pushes frames itself."""
+        if self.mode == "screencast":
+            return
+        if not await self.watching():
+            self.stats["skipped_no_viewers"] += 1
+            return
+        try:
+            with tracer.span("screenshot.capture", reason="live_view"):
+                frame = await self.page.screenshot(type="jpeg", quality=settings.LIVE_VIEW_JPEG_QUALITY)
+        except Exception as e:
+            logger.error("live_view_capture_failed", session_id=self.session_id, error=str(e))
+            return
+        self.stats["captured"] += 1
+        await self.offer(frame)
+
+    async def offer(self, frame: bytes):
+        wait = self._last_sent_at + self.min_interval - time.monotonic()
+        if wait > 0:
+            # Keep only the newest frame and send it when the interval is up.
+            self._deferred = frame
+            if not self._flush_task or self._flush_task.done():
+                self._flush_task = asyncio.create_task(self._flush_after(wait))
+            return
+        await self._publish_if_changed(frame)
+
+    async def _flush_after(self, delay: float):
+        await asyncio.sleep(delay)
+        frame, self._deferred = self._deferred, None
+        if frame is not None:
+            await self._publish_if_changed(frame)
+
+    def _changed(self, frame: bytes) -> bool:
+        digest = hashlib.blake2b(frame, digest_size=16).digest()
+        if digest == self._last_digest:
+            return False
+        frame_hash = None
+        if self.threshold > 0:
+            try:
+                frame_hash = dhash(frame)
+            except Exception:
+                frame_hash = None
+            if frame_hash is not None and self._last_hash is not None \
+                    and bin(frame_hash ^ self._last_hash).count("1") <= self.threshold:
+                return False
+        self._last_digest = digest
+        self._last_hash = frame_hash
+        return True
+
+    async def _publish_if_changed(self, frame: bytes):
+        if not self._changed(frame):
+            self.stats["skipped_unchanged"] += 1
+            return
+        self._last_sent_at = time.monotonic()
+        try:
+            if settings.LIVE_VIEW_BINARY_FRAMES:
+                redis = await get_redis_binary()
+                await redis.publish(FRAMES_CHANNEL.format(session_id=self.session_id), frame)
+            else:
+                redis = await get_redis()
+                await redis.publish(UPDATES_CHANNEL.format(session_id=self.session_id), json.dumps(await image_message(frame)))
+            self.stats["published"] += 1
+            self.stats["bytes"] += len(frame)
+        except Exception as e:
+            logger.error("live_view_publish_failed", session_id=self.session_id, error=str(e))
+
+    # --- CDP screencast -------------------------------------------------
+
+    async def _follow_presence(self):
+        while True:
+            try:
+                if await self.watching():
+                    await self._start_screencast()
+                else:
+                    await self._stop_screencast()
+            except Exception as e:
+                logger.error("live_view_screencast_failed", session_id=self.session_id, error=str(e))
+            await asyncio.sleep(settings.LIVE_VIEW_PRESENCE_INTERVAL)
+
+    async def _start_screencast(self):
+        if self._cdp:
+            return
+        self._cdp = await self.page.context.new_cdp_session(self.page)
+        self._cdp.on("Page.screencastFrame", self._on_screencast_frame)
+        await self._cdp.send("Page.startScreencast", {
+            "format": "jpeg",
+            "quality": settings.LIVE_VIEW_JPEG_QUALITY,
+            "maxWidth": 1280,
+            "maxHeight": 720,
+        })
+
+    async def _stop_screencast(self):
+        if not self._cdp:
+            return
+        cdp, self._cdp = self._cdp, None
+        try:
+            await cdp.send("Page.stopScreencast")
+            await cdp.detach()
+        except Exception:
+            pass
+
+    def _on_screencast_frame(self, params):
+        asyncio.create_task(self._handle_screencast_frame(params))
+
+    async def _handle_screencast_frame(self, params):
+        cdp = self._cdp
+        if cdp:
+            # Chromium waits for the ack before sending the next frame.
+            try:
+                await cdp.send("Page.screencastFrameAck", {"sessionId": params["sessionId"]})
+            except Exception:
+                pass
+        self.stats["captured"] += 1
+        await self.offer(base64.b64decode(params["data"]))
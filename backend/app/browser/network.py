@@ -0,0 +1,365 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+import weakref
+import threading
+from collections import OrderedDict
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlparse
+from playwright.async_api import BrowserContext, Page, Request, Route
+from app.core.config import settings
+from app.core.logger import logger
+from app.core.metrics import NETWORK_BYTES, NETWORK_REQUESTS, PAGE_LOAD
+
+# Third-party analytics, ads and session-replay hosts (and their subdomains).
+TRACKING_DOMAINS = {
+    "google-analytics.com", "googletagmanager.com", "googlesyndication.com", "googleadservices.com",
+    "doubleclick.net", "adservice.google.com", "connect.facebook.net", "analytics.twitter.com",
+    "bat.bing.com", "clarity.ms", "hotjar.com", "hotjar.io", "segment.io", "segment.com", "mixpanel.com",
+    "amplitude.com", "fullstory.com", "newrelic.com", "nr-data.net", "criteo.com", "taboola.com",
+    "outbrain.com", "scorecardresearch.com", "quantserve.com", "adsrvr.org", "amazon-adsystem.com",
+}
+# NETWORK_BLOCK categories that map to Playwright resource types.
+BLOCK_RESOURCE_TYPES = {"image": {"image"}, "media": {"media"}, "font": {"font"}}
+CACHEABLE_RESOURCE_TYPES = {"stylesheet", "script", "image", "font"}
+# Not replayable from the cache: the body is stored decoded, framing is recomputed.
+HOP_HEADERS = {"content-encoding", "content-length", "transfer-encoding", "connection", "keep-alive", "set-cookie"}
+
+def _cache_control(headers: Dict[str, str]) -> Dict[str, Optional[str]]:
+    directives = {}
+    for part in (headers.get("cache-control") or "").split(","):
+        name, _, value = part.strip().partition("=")
+        if name:
+            directives[name.lower()] = value.strip('"') or None
+    return directives
+
+def _http_date(value: Optional[str]) -> Optional[float]:
+    try:
+        return parsedate_to_datetime(value).timestamp() if value else None
+    except (TypeError, ValueError):
+        return None
+
+def freshness_lifetime(headers: Dict[str, str], now: float) -> Optional[float]:
+    """
+    Seconds a response may be served without revalidation, or None if it must not be
+    stored at all. The DiskCache is shared by every session on a worker, so these are
+    the RFC 9111 rules for a shared cache: `private` responses are not stored and
+    `s-maxage` takes precedence over `max-age`.
+    """
+    directives = _cache_control(headers)
+    if "no-store" in directives or "private" in directives or "set-cookie" in headers:
+        return None
+    vary = {v.strip().lower() for v in (headers.get("vary") or "").split(",") if v.strip()}
+    if vary - {"accept-encoding"}:
+        return None
+    if "no-cache" in directives:
+        return 0.0
+    for directive in ("s-maxage", "max-age"):
+        if directives.get(directive) is not None:
+            try:
+                return max(0.0, float(directives[directive]))
+            except ValueError:
+                return 0.0
+    date = _http_date(headers.get("date")) or now
+    expires = _http_date(headers.get("expires"))
+    if expires is not None:
+        return max(0.0, expires - date)
+    last_modified = _http_date(headers.get("last-modified"))
+    if last_modified is not None:
+        # Heuristic freshness: a tenth of the time since the asset last changed
+        return max(0.0, (date - last_modified) / 10)
+    return 0.0
+
+class DiskCache:
+    """
+    Static-asset responses shared by every context and session on a worker, as
+    `<root>/<key[:2]>/<key>` files (a JSON metadata line, then the body). Worker
+    processes on the same host can share `root`: files are written then renamed, hits
+    bump the mtime, and eviction rescans the directory so it sees other processes'
+    entries. Least recently used entries are evicted above `max_bytes`.
+    """
+
+    def __init__(self, root: str = None, max_bytes: int = None):
+        self.root = root or settings.NETWORK_CACHE_DIR
+        self.max_bytes = max_bytes or settings.NETWORK_CACHE_MAX_BYTES
+        self._index: "OrderedDict[str, int]" = OrderedDict()  # key -> file size, least recent first
+        self._size = 0
+        self._loaded = False
+        self._lock = threading.Lock()  # reads and writes run in worker threads
+
+    @staticmethod
+    def key(url: str) -> str:
+        return hashlib.sha256(url.encode()).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key)
+
+    def _scan(self):
+        entries = []
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                if name.endswith(".tmp"):
+                    continue
+                try:
+                    stat = os.stat(os.path.join(dirpath, name))
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, name, stat.st_size))
+        entries.sort()
+        self._index = OrderedDict((name, size) for _, name, size in entries)
+        self._size = sum(self._index.values())
+        self._loaded = True
+
+    def _read(self, key: str) -> Optional[Tuple[Dict[str, Any], bytes]]:
+        with self._lock:
+            return self._read_locked(key)
+
+    def _read_locked(self, key: str) -> Optional[Tuple[Dict[str, Any], bytes]]:
+        if not self._loaded:
+            self._scan()
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                meta = json.loads(f.readline())
+                body = f.read()
+            os.utime(path)
+        except (FileNotFoundError, ValueError):
+            self._forget(key)
+            return None
+        if key in self._index:
+            self._index.move_to_end(key)
+        return meta, body
+
+    def _write(self, key: str, meta: Dict[str, Any], body: bytes):
+        with self._lock:
+            self._write_locked(key, meta, body)
+
+    def _write_locked(self, key: str, meta: Dict[str, Any], body: bytes):
+        if not self._loaded:
+            self._scan()
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = json.dumps(meta).encode() + b"\n" + body
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        self._forget(key)
+        self._index[key] = len(data)
+        self._size += len(data)
+        if self._size > self.max_bytes:
+            self._evict()
+
+    def _forget(self, key: str):
+        self._size -= self._index.pop(key, 0)
+
+    def _evict(self):
+        self._scan()
+        target = int(self.max_bytes * 0.9)
+        evicted = 0
+        while self._size > target and self._index:
+            key, size = self._index.popitem(last=False)
+            self._size -= size
+            try:
+                os.remove(self._path(key))
+                evicted += 1
+            except FileNotFoundError:
+                pass
+        logger.info("network_cache_evicted", entries=evicted, size=self._size)
+
+    async def get(self, url: str) -> Optional[Tuple[Dict[str, Any], bytes]]:
+        return await asyncio.to_thread(self._read, self.key(url))
+
+    async def put(self, url: str, meta: Dict[str, Any], body: bytes):
+        await asyncio.to_thread(self._write, self.key(url), meta, body)
+
+class NetworkStats:
+    """What one session's browser context downloaded, blocked and loaded from the cache."""
+
+    def __init__(self):
+        self.requests = 0
+        self.blocked = 0
+        self.cache_hits = 0
+        self.revalidated = 0
+        self.bytes_transferred = 0
+        self.bytes_from_cache = 0
+        self.page_loads = 0
+        self.page_load_time = 0.0
+        self.navigation_start: Optional[float] = None  # main-frame navigation awaiting its load event
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests, "blocked": self.blocked, "cache_hits": self.cache_hits,
+            "revalidated": self.revalidated, "bytes_transferred": self.bytes_transferred,
+            "bytes_from_cache": self.bytes_from_cache, "page_loads": self.page_loads,
+            "page_load_ms": round(1000 * self.page_load_time / self.page_loads) if self.page_loads else None,
+        }
+
+class NetworkRouter:
+    """
+    Request interception for browser contexts: aborts blocked requests
+    (NETWORK_BLOCK categories and NETWORK_BLOCK_DOMAINS), serves static assets from
+    the shared DiskCache, and counts bytes and page-load time per context. Routing a
+    context turns off Chromium's own HTTP cache, which the disk cache replaces.
+    """
+
+    def __init__(self, cache: Optional[DiskCache] = None):
+        self.cache = cache
+        self._stats: "weakref.WeakKeyDictionary[BrowserContext, NetworkStats]" = weakref.WeakKeyDictionary()
+        self._handled: "weakref.WeakSet[Request]" = weakref.WeakSet()  # fulfilled or aborted by the router
+
+    def _cache(self) -> Optional[DiskCache]:
+        if self.cache is None and settings.NETWORK_CACHE_ENABLED:
+            self.cache = DiskCache()
+        return self.cache
+
+    async def attach(self, context: BrowserContext):
+        self._stats[context] = NetworkStats()
+        await context.route("**/*", lambda route, request: self.handle(context, route, request))
+        context.on("requestfinished", lambda request: self._on_finished(context, request))
+        context.on("page", lambda page: self._track_page(context, page))
+
+    def stats(self, context: BrowserContext) -> NetworkStats:
+        return self._stats.setdefault(context, NetworkStats())
+
+    def report(self, session_id: str, context: BrowserContext) -> Dict[str, Any]:
+        """Log a session's network totals (called once, when the session releases its context)."""
+        stats = self._stats.get(context)
+        if stats is None:
+            return {}
+        NETWORK_BYTES.labels(source="network").inc(stats.bytes_transferred)
+        NETWORK_BYTES.labels(source="cache").inc(stats.bytes_from_cache)
+        summary = stats.as_dict()
+        logger.info("session_network", session_id=session_id, **summary)
+        return summary
+
+    async def reset_hook(self, entry):
+        """ContextPool reset hook: the next lease starts with fresh counters."""
+        if entry.context in self._stats:
+            self._stats[entry.context] = NetworkStats()
+
+    def blocked(self, request: Request) -> bool:
+        categories = set(settings.NETWORK_BLOCK)
+        for category, resource_types in BLOCK_RESOURCE_TYPES.items():
+            if category in categories and request.resource_type in resource_types:
+                return True
+        host = (urlparse(request.url).hostname or "").lower()
+        domains = set(settings.NETWORK_BLOCK_DOMAINS)
+        if "tracking" in categories:
+            domains |= TRACKING_DOMAINS
+        return any(host == domain or host.endswith("." + domain) for domain in domains)
+
+    async def handle(self, context: BrowserContext, route: Route, request: Request):
+        stats = self.stats(context)
+        stats.requests += 1
+        if request.is_navigation_request() and request.frame.parent_frame is None:
+            stats.navigation_start = time.monotonic()
+        try:
+            if self.blocked(request):
+                stats.blocked += 1
+                self._handled.add(request)
+                NETWORK_REQUESTS.labels(outcome="blocked").inc()
+                await route.abort("blockedbyclient")
+                return
+            cache = self._cache()
+            if cache and await self._cacheable(request):
+                await self._cached_fetch(cache, stats, route, request)
+                return
+            NETWORK_REQUESTS.labels(outcome="network").inc()
+            await route.continue_()
+        except Exception as e:
+            # The page may have navigated away (route already handled) or the fetch failed
+            logger.debug("network_route_failed", url=request.url, error=str(e))
+            try:
+                await route.continue_()
+            except Exception:
+                pass
+
+    @staticmethod
+    async def _cacheable(request: Request) -> bool:
+        if request.method != "GET" or request.resource_type not in CACHEABLE_RESOURCE_TYPES:
+            return False
+        # The cache is keyed by URL and shared across sessions and tenants: a response to a
+        # request carrying credentials may be personalised. `headers` leaves out cookies, so
+        # look at what is actually sent.
+        headers = await request.all_headers()
+        return "authorization" not in headers and "cookie" not in headers
+
+    async def _cached_fetch(self, cache: DiskCache, stats: NetworkStats, route: Route, request: Request):
+        now = time.time()
+        entry = await cache.get(request.url)
+        self._handled.add(request)
+        if entry is not None:
+            meta, body = entry
+            if now < meta["expires"]:
+                stats.cache_hits += 1
+                stats.bytes_from_cache += len(body)
+                NETWORK_REQUESTS.labels(outcome="cache_hit").inc()
+                await route.fulfill(status=meta["status"], headers=meta["headers"], body=body)
+                return
+            validators = {k: v for k, v in (("if-none-match", meta["headers"].get("etag")),
+                                             ("if-modified-since", meta["headers"].get("last-modified"))) if v}
+            if validators:
+                response = await route.fetch(headers={**request.headers, **validators})
+                if response.status == 304:
+                    headers = {**meta["headers"], **_replayable(response.headers)}
+                    lifetime = freshness_lifetime(headers, now)
+                    if lifetime is not None:
+                        await cache.put(request.url, {**meta, "headers": headers, "expires": now + lifetime}, body)
+                    stats.revalidated += 1
+                    stats.bytes_from_cache += len(body)
+                    NETWORK_REQUESTS.labels(outcome="revalidated").inc()
+                    await route.fulfill(status=meta["status"], headers=headers, body=body)
+                    return
+                await self._store_and_fulfill(cache, stats, route, request, response, now)
+                return
+
+        await self._store_and_fulfill(cache, stats, route, request, await route.fetch(), now)
+
+    async def _store_and_fulfill(self, cache: DiskCache, stats: NetworkStats, route: Route, request: Request,
+                                 response, now: float):
+        body = await response.body()
+        headers = _replayable(response.headers)
+        stats.bytes_transferred += len(body)
+        NETWORK_REQUESTS.labels(outcome="cache_miss").inc()
+        lifetime = freshness_lifetime(response.headers, now) if response.status == 200 else None
+        if lifetime is not None and len(body) <= settings.NETWORK_CACHE_MAX_ENTRY_BYTES:
+            has_validator = "etag" in headers or "last-modified" in headers
+            if lifetime > 0 or has_validator:
+                await cache.put(request.url, {"status": response.status, "headers": headers,
+                                              "expires": now + lifetime}, body)
+        await route.fulfill(status=response.status, headers=headers, body=body)
+
+    def _on_finished(self, context: BrowserContext, request: Request):
+        if request in self._handled:
+            self._handled.discard(request)
+            return
+        asyncio.create_task(self._count_transferred(self.stats(context), request))
+
+    async def _count_transferred(self, stats: NetworkStats, request: Request):
+        try:
+            sizes = await request.sizes()
+            stats.bytes_transferred += sizes["responseBodySize"] + sizes["responseHeadersSize"]
+        except Exception:
+            pass
+
+    def _track_page(self, context: BrowserContext, page: Page):
+        page.on("load", lambda _: self._on_load(context))
+
+    def _on_load(self, context: BrowserContext):
+        stats = self.stats(context)
+        if stats.navigation_start is None:
+            return
+        elapsed = time.monotonic() - stats.navigation_start
+        stats.navigation_start = None
+        stats.page_loads += 1
+        stats.page_load_time += elapsed
+        PAGE_LOAD.observe(elapsed)
+
+def _replayable(headers: Dict[str, str]) -> Dict[str, str]:
+    return {k: v for k, v in headers.items() if k.lower() not in HOP_HEADERS}
+
+network_router = NetworkRouter()
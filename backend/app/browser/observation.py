@@ -0,0 +1,263 @@
+from typing import Any, Dict, List, Optional, Tuple
+from playwright.async_api import Page
+from app.core.config import settings
+from app.core.logger import logger
+
+# One evaluate per observation. The first call on a document installs a
+# MutationObserver (plus input/change listeners, since typing changes properties,
+# not attributes) that bumps an epoch counter; if the caller's doc id and epoch
+# still match, the DOM walk is skipped entirely.
+INSTALL_EPOCH = """
+  if (!window.__rpaObserver) {
+    window.__rpaDoc = Math.random().toString(36).slice(2);
+    window.__rpaEpoch = 0;
+    const bump = () => { window.__rpaEpoch++; };
+    window.__rpaObserver = new MutationObserver(bump);
+    window.__rpaObserver.observe(document, {subtree: true, childList: true, attributes: true, characterData: true});
+    document.addEventListener('input', bump, true);
+    document.addEventListener('change', bump, true);
+  }
+"""
+
+# Document id, DOM epoch and readiness, installing the observer if needed.
+VERSION_SCRIPT = "() => {" + INSTALL_EPOCH + """
+  return {doc: window.__rpaDoc, epoch: window.__rpaEpoch, ready: document.readyState};
+}
+"""
+
+OBSERVE_SCRIPT = """
+({doc, epoch, maxElements, maxText}) => {""" + INSTALL_EPOCH + """
+  if (window.__rpaDoc === doc && window.__rpaEpoch === epoch) {
+    return {doc, epoch, unchanged: true};
+  }
+
+  const clip = (s, n) => (s || '').replace(/\\s+/g, ' ').trim().slice(0, n);
+  const generated = /\\d{4,}|^[0-9]|[:]/;
+  const unique = (sel) => { try { return document.querySelectorAll(sel).length === 1; } catch (e) { return false; } };
+
+  const selectorFor = (el) => {
+    const tag = el.tagName.toLowerCase();
+    if (el.id && !generated.test(el.id) && unique('#' + CSS.escape(el.id))) return '#' + CSS.escape(el.id);
+    for (const attr of ['data-testid', 'data-test', 'data-qa', 'name', 'aria-label', 'placeholder']) {
+      const v = el.getAttribute(attr);
+      if (v) {
+        const sel = `${tag}[${attr}="${v.replace(/"/g, '\\\\"')}"]`;
+        if (unique(sel)) return sel;
+      }
+    }
+    const parts = [];
+    for (let node = el; node && node.nodeType === 1 && node !== document.body; node = node.parentElement) {
+      if (node !== el && node.id && !generated.test(node.id)) { parts.unshift('#' + CSS.escape(node.id)); break; }
+      let i = 1;
+      for (let sib = node.previousElementSibling; sib; sib = sib.previousElementSibling) if (sib.tagName === node.tagName) i++;
+      parts.unshift(`${node.tagName.toLowerCase()}:nth-of-type(${i})`);
+    }
+    if (!parts.length || !parts[0].startsWith('#')) parts.unshift('body');
+    return parts.join(' > ');
+  };
+
+  const roleOf = (el) => {
+    const explicit = el.getAttribute('role');
+    if (explicit) return explicit;
+    const tag = el.tagName.toLowerCase();
+    if (tag === 'a') return 'link';
+    if (tag === 'select') return 'combobox';
+    if (tag === 'textarea' || el.isContentEditable) return 'textbox';
+    if (tag === 'input') {
+      const type = (el.type || 'text').toLowerCase();
+      return {checkbox: 'checkbox', radio: 'radio', submit: 'button', button: 'button', reset: 'button',
+              image: 'button', range: 'slider', search: 'searchbox'}[type] || 'textbox';
+    }
+    return 'button';
+  };
+
+  const nameOf = (el) => {
+    const labelledBy = el.getAttribute('aria-labelledby');
+    if (labelledBy) {
+      const text = labelledBy.split(/\\s+/).map(id => (document.getElementById(id) || {}).innerText || '').join(' ');
+      if (text.trim()) return text;
+    }
+    if (el.getAttribute('aria-label')) return el.getAttribute('aria-label');
+    if (el.labels && el.labels.length) return Array.from(el.labels).map(l => l.innerText).join(' ');
+    const text = el.tagName === 'SELECT' ? '' : el.innerText;
+    if (text && text.trim()) return text;
+    return el.getAttribute('placeholder') || el.getAttribute('alt') || el.getAttribute('title') ||
+           el.getAttribute('name') || (['submit', 'button'].includes(el.type) ? el.value : '') || '';
+  };
+
+  const visible = (el) => el.checkVisibility
+    ? el.checkVisibility({checkOpacity: true, checkVisibilityCSS: true})
+    : !!(el.offsetParent || el.getClientRects().length);
+
+  const query = 'a[href], button, input:not([type=hidden]), select, textarea, [contenteditable=""], [contenteditable=true], ' +
+    '[role=button], [role=link], [role=checkbox], [role=radio], [role=tab], [role=menuitem], [role=option], ' +
+    '[role=switch], [role=combobox], [role=textbox], [role=searchbox], [onclick]';
+  const elements = [];
+  let total = 0;
+  for (const el of document.querySelectorAll(query)) {
+    if (!visible(el)) continue;
+    total++;
+    if (elements.length >= maxElements) continue;
+    const item = {role: roleOf(el), name: clip(nameOf(el), 80), selector: selectorFor(el)};
+    if (el.type === 'checkbox' || el.type === 'radio') item.checked = el.checked;
+    else if ('value' in el && el.type !== 'password' && el.value) item.value = clip(String(el.value), 80);
+    if (el.disabled) item.disabled = true;
+    elements.push(item);
+  }
+  return {
+    doc: window.__rpaDoc, epoch: window.__rpaEpoch, unchanged: false,
+    title: clip(document.title, 120), elements, total,
+    text: clip(document.body ? document.body.innerText : '', maxText),
+  };
+}
+"""
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + 3) // 4
+
+def format_element(index: int, element: Dict[str, Any]) -> str:
+    line = f'[{index}] {element["role"]} "{element["name"]}"'
+    if "checked" in element:
+        line += " checked" if element["checked"] else " unchecked"
+    if element.get("value"):
+        line += f' value="{element["value"]}"'
+    if element.get("disabled"):
+        line += " disabled"
+    return f"{line} -> {element['selector']}"
+
+class PageObserver:
+    """
+    Builds the planner's `context`: a digest of the page's visible interactive
+    elements (role, accessible name, stable selector) and a text excerpt, within
+    a token budget.
+
+    Successive observations of the same document are diffed, so the prompt only
+    carries added, removed and changed elements. A full digest is re-sent every
+    `full_every` steps (so one stays inside the planner's history window), after
+    navigation, after `reset()`, or when the diff would not be smaller.
+    """
+
+    def __init__(self, page: Page, token_budget: int = None, full_every: int = 4):
+        self.page = page
+        self.token_budget = token_budget or settings.OBSERVATION_TOKEN_BUDGET
+        self.full_every = full_every
+        self._snapshot: Optional[Dict[str, Any]] = None  # last evaluated page state
+        self._baseline: Optional[Dict[str, str]] = None  # selector -> line, as last sent
+        self._baseline_text = ""
+        self._indexes: Dict[str, int] = {}
+        self._since_full = 0
+        self.stats = {"observations": 0, "cached": 0, "full": 0, "diffs": 0, "tokens": 0}
+
+    def reset(self):
+        """Send a full digest next time (e.g. the history window no longer holds one)."""
+        self._baseline = None
+
+    async def observe(self) -> str:
+        self.stats["observations"] += 1
+        url = self.page.url
+        try:
+            snapshot = await self._evaluate()
+        except Exception as e:
+            logger.warning("observation_failed", url=url, error=str(e))
+            snapshot = None
+        if snapshot is None:
+            return f"Current URL: {url}"
+
+        if snapshot["doc"] != (self._snapshot or {}).get("doc"):
+            self._indexes = {}
+            self._baseline = None
+        self._snapshot = snapshot
+
+        lines = {}
+        for element in snapshot["elements"]:
+            index = self._indexes.setdefault(element["selector"], len(self._indexes) + 1)
+            lines[element["selector"]] = format_element(index, element)
+
+        full, shown = self._full(url, snapshot, lines)
+        if self._baseline is not None and self._since_full < self.full_every:
+            diff, baseline = self._diff(url, snapshot, lines)
+            if estimate_tokens(diff) < estimate_tokens(full):
+                self._since_full += 1
+                self._baseline, self._baseline_text = baseline, snapshot["text"]
+                self.stats["diffs"] += 1
+                self.stats["tokens"] += estimate_tokens(diff)
+                return diff
+
+        self._since_full = 0
+        # Elements cut by the budget were never sent; leaving them out of the baseline
+        # makes the next diff list them as added.
+        self._baseline = dict(list(lines.items())[:shown])
+        self._baseline_text = snapshot["text"]
+        self.stats["full"] += 1
+        self.stats["tokens"] += estimate_tokens(full)
+        return full
+
+    async def _evaluate(self) -> Optional[Dict[str, Any]]:
+        previous = self._snapshot or {}
+        result = await self.page.evaluate(OBSERVE_SCRIPT, {
+            "doc": previous.get("doc"),
+            "epoch": previous.get("epoch"),
+            "maxElements": settings.OBSERVATION_MAX_ELEMENTS,
+            "maxText": 4 * self.token_budget,
+        })
+        if not isinstance(result, dict):
+            return None
+        if result.get("unchanged"):
+            self.stats["cached"] += 1
+            return previous
+        return result
+
+    def _full(self, url: str, snapshot: Dict[str, Any], lines: Dict[str, str]) -> Tuple[str, int]:
+        header = [f"Current URL: {url}", f"Title: {snapshot['title']}",
+                  "Interactive elements ([index] role \"name\" -> selector):"]
+        return self._fit(header, list(lines.values()), snapshot["total"] - len(lines), snapshot["text"])
+
+    def _diff(self, url: str, snapshot: Dict[str, Any],
+              lines: Dict[str, str]) -> Tuple[str, Dict[str, str]]:
+        """The diff against the baseline, and the baseline updated with the changes it shows."""
+        changes = ([("+", selector, line) for selector, line in lines.items() if selector not in self._baseline]
+                   + [("~", selector, line) for selector, line in lines.items()
+                      if selector in self._baseline and self._baseline[selector] != line]
+                   + [("-", selector, line.split(" -> ")[0]) for selector, line in self._baseline.items()
+                      if selector not in lines])
+        header = [f"Current URL: {url}", f"Title: {snapshot['title']}",
+                  "Changes since the previous observation (unchanged elements omitted):"]
+        if not changes:
+            header.append("No element changes.")
+        body = [f"{mark} {line}" for mark, _, line in changes]
+        text = snapshot["text"] if snapshot["text"] != self._baseline_text else ""
+        rendered, shown = self._fit(header, body, 0, text, text_label="Page text (changed):")
+        baseline = dict(self._baseline)
+        for mark, selector, _ in changes[:shown]:
+            if mark == "-":
+                del baseline[selector]
+            else:
+                baseline[selector] = lines[selector]
+        return rendered, baseline
+
+    def _fit(self, header: List[str], body: List[str], hidden: int, text: str,
+             text_label: str = "Page text:") -> Tuple[str, int]:
+        """
+        Elements get up to three quarters of the budget, the text excerpt what is left.
+        Returns the observation and how many `body` lines it holds.
+        """
+        out = list(header)
+        used = estimate_tokens("\n".join(out))
+        element_budget = self.token_budget * 3 // 4
+        shown = 0
+        for line in body:
+            cost = estimate_tokens(line) + 1
+            if used + cost > element_budget:
+                break
+            out.append(line)
+            used += cost
+            shown += 1
+        hidden += len(body) - shown
+        if hidden:
+            out.append(f"(+{hidden} more elements not shown)")
+            used += 8
+        if text:
+            remaining = 4 * max(0, self.token_budget - used) - len(text_label) - 1
+            if remaining > 40:
+                out += [text_label, text[:remaining]]
+        return "\n".join(out), shown
@@ -0,0 +1,279 @@
+import time
+import asyncio
+from collections import deque
+from typing import Callable, Deque, List, Optional, Set
+from urllib.parse import urlparse
+from playwright.async_api import BrowserContext, Page
+from app.core.config import settings
+from app.core.logger import logger
+from app.core.metrics import BROWSER_POOL_ACQUIRES, BROWSER_POOL_CONTEXTS
+
+class PooledContext:
+    """A browser context plus its ready-to-use page, owned by the pool between leases."""
+
+    def __init__(self, context: BrowserContext, page: Page):
+        self.context = context
+        self.page = page
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.uses = 0
+        # Origins the lease touched; their storage is wiped on reset.
+        self.origins: Set[str] = set()
+        self._track_page(page)
+        context.on("page", self._track_page)
+
+    def _track_page(self, page: Page):
+        page.on("framenavigated", self._on_navigated)
+
+    def _on_navigated(self, frame):
+        parsed = urlparse(frame.url)
+        if parsed.scheme in ("http", "https"):
+            self.origins.add(f"{parsed.scheme}://{parsed.netloc}")
+
+class ContextPool:
+    """
+    Pool of pre-warmed browser contexts that are reset and reused between sessions.
+
+    - `min_size` contexts are kept warm; at most `max_size` exist at once and
+      `acquire()` waits when all of them are leased.
+    - Idle contexts above `min_size` are closed after `idle_ttl` seconds, and every
+      context is retired after `max_uses` leases to bound memory growth.
+    - `release()` wipes cookies, permissions, per-origin storage and the HTTP cache and
+      replaces the page, so nothing leaks from one tenant to the next. A context that
+      fails its reset or health check is closed instead of being reused.
+    """
+
+    def __init__(self, create_context: Callable, min_size: int = None, max_size: int = None,
+                 idle_ttl: float = None, max_uses: int = None):
+        self._create_context = create_context
+        self.min_size = settings.BROWSER_POOL_MIN_SIZE if min_size is None else min_size
+        self.max_size = max_size or settings.BROWSER_POOL_MAX_SIZE
+        self.idle_ttl = settings.BROWSER_POOL_IDLE_TTL if idle_ttl is None else idle_ttl
+        self.max_uses = max_uses or settings.BROWSER_POOL_MAX_USES
+        # Extra reset steps registered by other browser features (e.g. request routing).
+        self.reset_hooks: List[Callable] = []
+
+        self._idle: Deque[PooledContext] = deque()
+        self._in_use: Set[PooledContext] = set()
+        self._pending = 0  # contexts being created
+        self._cond: Optional[asyncio.Condition] = None
+        self._reaper: Optional[asyncio.Task] = None
+        self._filler: Optional[asyncio.Task] = None
+
+        self._acquire_latencies: Deque[float] = deque(maxlen=1000)
+        self._counters = {"acquired": 0, "hits": 0, "misses": 0, "created": 0, "evicted": 0,
+                          "reset_failures": 0, "health_failures": 0}
+
+    @property
+    def size(self) -> int:
+        return len(self._idle) + len(self._in_use) + self._pending
+
+    def _condition(self) -> asyncio.Condition:
+        if self._cond is None:
+            self._cond = asyncio.Condition()
+        return self._cond
+
+    async def start(self):
+        """Pre-warm `min_size` contexts and start the idle reaper."""
+        if self._reaper is None or self._reaper.done():
+            self._reaper = asyncio.create_task(self._reap_idle())
+        await self._fill_to_min()
+
+    async def acquire(self, timeout: float = None) -> PooledContext:
+        start = time.perf_counter()
+        if self._reaper is None:
+            await self.start()
+        cond = self._condition()
+
+        async def _wait_for_entry():
+            while True:
+                async with cond:
+                    while not self._idle and self.size >= self.max_size:
+                        await cond.wait()
+                    if self._idle:
+                        entry = self._idle.pop()  # LIFO keeps the warmest context busy
+                        self._in_use.add(entry)
+                    else:
+                        entry = None
+                        self._pending += 1
+
+                if entry is not None:
+                    try:
+                        healthy = await self._healthy(entry)
+                    except asyncio.CancelledError:
+                        self._in_use.discard(entry)
+                        self._idle.append(entry)
+                        raise
+                    if healthy:
+                        return entry, True
+                    self._counters["health_failures"] += 1
+                    self._in_use.discard(entry)
+                    await self._discard(entry)
+                    continue
+
+                try:
+                    entry = await self._new_entry()
+                except BaseException:
+                    async with cond:
+                        self._pending -= 1
+                        cond.notify()
+                    raise
+                # Swap the pending slot for a leased one without yielding in between.
+                self._pending -= 1
+                self._in_use.add(entry)
+                return entry, False
+
+        entry, hit = await asyncio.wait_for(_wait_for_entry(), timeout) if timeout else await _wait_for_entry()
+        entry.uses += 1
+        entry.last_used = time.monotonic()
+
+        latency = time.perf_counter() - start
+        self._acquire_latencies.append(latency)
+        self._counters["acquired"] += 1
+        self._counters["hits" if hit else "misses"] += 1
+        BROWSER_POOL_ACQUIRES.labels(outcome="hit" if hit else "miss").inc()
+        self._export_size()
+        logger.info("context_pool_acquired", latency=latency, warm=hit,
+                    in_use=len(self._in_use), idle=len(self._idle))
+        return entry
+
+    async def release(self, entry: PooledContext, reusable: bool = True):
+        self._in_use.discard(entry)
+        if reusable and entry.uses < self.max_uses and await self._reset(entry):
+            entry.last_used = time.monotonic()
+            async with self._condition():
+                self._idle.append(entry)
+                self._condition().notify()
+        else:
+            await self._discard(entry)
+            async with self._condition():
+                self._condition().notify()
+            # Keep the floor warm so the next burst does not pay cold-start cost.
+            if self._filler is None or self._filler.done():
+                self._filler = asyncio.create_task(self._fill_to_min())
+                self._filler.add_done_callback(self._filler_done)
+        self._export_size()
+
+    async def close(self):
+        if self._reaper:
+            self._reaper.cancel()
+            self._reaper = None
+        if self._filler:
+            self._filler.cancel()
+            self._filler = None
+        while self._idle:
+            await self._discard(self._idle.pop(), evicted=False)
+        for entry in list(self._in_use):
+            self._in_use.discard(entry)
+            await self._discard(entry, evicted=False)
+        self._export_size()
+
+    def stats(self) -> dict:
+        latencies = sorted(self._acquire_latencies)
+        def pct(p):
+            return latencies[min(len(latencies) - 1, int(p * len(latencies)))] if latencies else 0.0
+        return {
+            **self._counters,
+            "size": self.size,
+            "in_use": len(self._in_use),
+            "idle": len(self._idle),
+            "max_size": self.max_size,
+            "acquire_latency_p50": pct(0.50),
+            "acquire_latency_p99": pct(0.99),
+        }
+
+    def _export_size(self):
+        BROWSER_POOL_CONTEXTS.labels(state="idle").set(len(self._idle))
+        BROWSER_POOL_CONTEXTS.labels(state="in_use").set(len(self._in_use))
+        BROWSER_POOL_CONTEXTS.labels(state="pending").set(self._pending)
+
+    async def _new_entry(self) -> PooledContext:
+        context = await self._create_context()
+        page = await context.new_page()
+        self._counters["created"] += 1
+        return PooledContext(context, page)
+
+    async def _fill_to_min(self):
+        cond = self._condition()
+        while True:
+            async with cond:
+                if self.size >= self.min_size:
+                    return
+                self._pending += 1
+            try:
+                entry = await self._new_entry()
+            except Exception as e:
+                logger.error("context_pool_warm_failed", error=str(e))
+                async with cond:
+                    self._pending -= 1
+                return
+            async with cond:
+                self._pending -= 1
+                self._idle.appendleft(entry)
+                cond.notify()
+            self._export_size()
+
+    def _filler_done(self, task: asyncio.Task):
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("context_pool_warm_failed", error=str(task.exception()))
+
+    async def _healthy(self, entry: PooledContext) -> bool:
+        try:
+            if entry.page.is_closed():
+                return False
+            browser = entry.context.browser
+            if browser is not None and not browser.is_connected():
+                return False
+            return await asyncio.wait_for(entry.page.evaluate("1"), 2) == 1
+        except Exception:
+            return False
+
+    async def _reset(self, entry: PooledContext) -> bool:
+        try:
+            context = entry.context
+            for page in list(context.pages):
+                await page.close()
+            await context.clear_cookies()
+            await context.clear_permissions()
+            page = await context.new_page()
+            cdp = await context.new_cdp_session(page)
+            try:
+                for origin in entry.origins:
+                    await cdp.send("Storage.clearDataForOrigin", {"origin": origin, "storageTypes": "all"})
+                await cdp.send("Network.clearBrowserCache")
+            finally:
+                await cdp.detach()
+            for hook in self.reset_hooks:
+                await hook(entry)
+            entry.page = page
+            entry.origins.clear()
+            return True
+        except Exception as e:
+            self._counters["reset_failures"] += 1
+            logger.error("context_pool_reset_failed", error=str(e))
+            return False
+
+    async def _discard(self, entry: PooledContext, evicted: bool = True):
+        if evicted:
+            self._counters["evicted"] += 1
+        try:
+            await entry.context.close()
+        except Exception:
+            pass
+
+    async def _reap_idle(self):
+        interval = max(1.0, min(30.0, self.idle_ttl / 2))
+        while True:
+            await asyncio.sleep(interval)
+            now = time.monotonic()
+            expired = []
+            async with self._condition():
+                # Oldest idle contexts sit at the left end of the deque.
+                while (self._idle and self.size > self.min_size
+                       and now - self._idle[0].last_used > self.idle_ttl):
+                    expired.append(self._idle.popleft())
+            for entry in expired:
+                await self._discard(entry)
+            if expired:
+                self._export_size()
+                logger.info("context_pool_evicted", count=len(expired), **self.stats())
@@ -0,0 +1,239 @@
+import os
+import glob
+import json
+import time
+import uuid
+import asyncio
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Set
+from app.core.config import settings
+from app.core.logger import logger
+from app.core.metrics import AUDIT_EVENTS
+from app.db.mongo import get_db
+
+class AuditLog:
+    """
+    Session history for compliance in the `audit_events` collection: session
+    creation, status changes and every step, kept after the Redis session expires.
+
+    `record()` only appends to an in-memory buffer, so the agent loop never waits
+    for Mongo. A background task per process writes the buffer with `insert_many`
+    whenever AUDIT_BATCH_SIZE events are waiting or AUDIT_FLUSH_INTERVAL seconds
+    have passed. Writes that fail or exceed AUDIT_WRITE_TIMEOUT are appended to
+    JSON-lines files in AUDIT_SPILL_DIR, and further batches go straight to disk
+    for AUDIT_RETRY_INTERVAL seconds. When the buffer reaches AUDIT_BUFFER_SIZE
+    (Mongo slower than the sessions), it is spilled as well, in a thread so the
+    caller's loop is not blocked on disk. Spilled files are
+    written back once a write succeeds again.
+
+    Events carry a client-side `_id`, so replaying a batch that was in fact written
+    before its timeout only produces duplicate-key errors, which are ignored.
+    """
+
+    COLLECTION = "audit_events"
+
+    def __init__(self, spill_dir: str = None):
+        self.spill_dir = spill_dir or settings.AUDIT_SPILL_DIR
+        self._buffer: List[Dict[str, Any]] = []
+        self._tenants: "OrderedDict[str, str]" = OrderedDict()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._write_lock: Optional[asyncio.Lock] = None
+        self._spilling: Set[asyncio.Task] = set()
+        self._indexed = False
+        self._retry_at = 0.0
+        self.stats = {"recorded": 0, "written": 0, "spilled": 0, "replayed": 0, "batches": 0}
+
+    def record(self, session_id: str, kind: str, tenant: str = None, **data):
+        """Queue an event (kind: created, status or step); returns immediately."""
+        if not settings.AUDIT_LOG_ENABLED:
+            return
+        if tenant:
+            self._remember_tenant(session_id, tenant)
+        self._buffer.append({
+            "_id": uuid.uuid4().hex,
+            "session_id": session_id,
+            "tenant": tenant,
+            "kind": kind,
+            "ts": time.time(),
+            **data,
+        })
+        self.stats["recorded"] += 1
+        if len(self._buffer) >= settings.AUDIT_BUFFER_SIZE:
+            # Mongo is not keeping up: move the backlog to disk rather than grow
+            events, self._buffer = self._buffer, []
+            self._spill_in_background(events)
+            logger.warning("audit_buffer_spilled", events=len(events))
+        self._ensure_flusher()
+        if len(self._buffer) >= settings.AUDIT_BATCH_SIZE and self._wake is not None:
+            self._wake.set()
+
+    async def flush(self):
+        """Write everything buffered so far (session end, shutdown)."""
+        if self._spilling:
+            await asyncio.gather(*self._spilling, return_exceptions=True)
+        if not self._buffer:
+            return
+        self._ensure_flusher()
+        while self._buffer:
+            await self._write_batch()
+
+    async def stop(self):
+        try:
+            await self.flush()
+        finally:
+            if self._task is not None:
+                self._task.cancel()
+                await asyncio.gather(self._task, return_exceptions=True)
+                self._task = None
+
+    def spill_buffer(self):
+        """Move the buffer to disk without an event loop (worker process shutdown)."""
+        events, self._buffer = self._buffer, []
+        if events:
+            self._spill(events)
+
+    def _spill_in_background(self, events: List[Dict[str, Any]]):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._spill(events)  # no loop to block
+            return
+        task = loop.create_task(asyncio.to_thread(self._spill, events))
+        self._spilling.add(task)
+        task.add_done_callback(self._spilling.discard)
+
+    def _ensure_flusher(self):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        if loop is not self._loop:
+            # Primitives belong to one loop; benchmarks and tests start several
+            self._loop, self._wake, self._write_lock = loop, asyncio.Event(), asyncio.Lock()
+            self._task = None
+        if self._task is None or self._task.done():
+            self._task = loop.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=settings.AUDIT_FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                while self._buffer:
+                    await self._write_batch()
+                    if len(self._buffer) < settings.AUDIT_BATCH_SIZE:
+                        break
+                if not self._buffer and time.monotonic() >= self._retry_at:
+                    await self._replay_spilled()
+            except Exception as e:
+                logger.error("audit_flush_failed", error=str(e))
+
+    async def _write_batch(self):
+        async with self._write_lock:
+            batch = self._buffer[:settings.AUDIT_BATCH_SIZE]
+            del self._buffer[:len(batch)]
+            if not batch:
+                return
+            await self._resolve_tenants(batch)
+            if time.monotonic() < self._retry_at or not await self._insert(batch):
+                await asyncio.to_thread(self._spill, batch)
+                return
+            self.stats["written"] += len(batch)
+            self.stats["batches"] += 1
+            AUDIT_EVENTS.labels(outcome="written").inc(len(batch))
+
+    async def _insert(self, events: List[Dict[str, Any]]) -> bool:
+        from pymongo.errors import BulkWriteError
+        try:
+            collection = await self._collection()
+            await asyncio.wait_for(collection.insert_many([self._document(e) for e in events], ordered=False),
+                                   timeout=settings.AUDIT_WRITE_TIMEOUT)
+            return True
+        except BulkWriteError as e:
+            if all(error.get("code") == 11000 for error in e.details.get("writeErrors", [])):
+                return True  # already written by an attempt that timed out
+            error = e
+        except Exception as e:
+            error = e
+        self._retry_at = time.monotonic() + settings.AUDIT_RETRY_INTERVAL
+        logger.warning("audit_write_failed", events=len(events), error=str(error) or type(error).__name__)
+        return False
+
+    async def _collection(self):
+        database = await get_db()
+        if database is None:
+            raise RuntimeError("MongoDB is not connected")
+        collection = database[self.COLLECTION]
+        if not self._indexed:
+            await collection.create_index([("session_id", 1), ("created_at", 1)])
+            await collection.create_index([("tenant", 1), ("created_at", -1)])
+            await collection.create_index([("created_at", -1)])
+            self._indexed = True
+        return collection
+
+    def _document(self, event: Dict[str, Any]) -> Dict[str, Any]:
+        document = {k: v for k, v in event.items() if k != "ts"}
+        document["created_at"] = datetime.fromtimestamp(event["ts"], tz=timezone.utc)
+        return document
+
+    def _remember_tenant(self, session_id: str, tenant: str):
+        self._tenants[session_id] = tenant
+        self._tenants.move_to_end(session_id)
+        if len(self._tenants) > 10000:
+            self._tenants.popitem(last=False)
+
+    async def _resolve_tenants(self, events: List[Dict[str, Any]]):
+        """Fill in the tenant for events recorded without one (from the session, once per session)."""
+        from app.core.session import session_manager
+        for event in events:
+            if event["tenant"]:
+                continue
+            session_id = event["session_id"]
+            if session_id not in self._tenants:
+                try:
+                    session = await session_manager.get_session(session_id, step_limit=0) or {}
+                except Exception:
+                    session = {}
+                self._remember_tenant(session_id, session.get("tenant") or "default")
+            event["tenant"] = self._tenants[session_id]
+
+    def _spill(self, events: List[Dict[str, Any]]):
+        os.makedirs(self.spill_dir, exist_ok=True)
+        # Spills run in threads, so the name is unique per write, not only per process
+        path = os.path.join(self.spill_dir, f"{os.getpid()}-{time.time_ns()}-{uuid.uuid4().hex[:8]}.jsonl")
+        # Write-then-rename so a replaying process never reads a partial file
+        with open(f"{path}.tmp", "w") as f:
+            for event in events:
+                f.write(json.dumps(event, default=str) + "\n")
+        os.replace(f"{path}.tmp", path)
+        self.stats["spilled"] += len(events)
+        AUDIT_EVENTS.labels(outcome="spilled").inc(len(events))
+
+    async def _replay_spilled(self):
+        for path in sorted(glob.glob(os.path.join(self.spill_dir, "*.jsonl"))):
+            claimed = f"{path}.{os.getpid()}.replay"
+            try:
+                os.rename(path, claimed)  # several processes may share the directory
+            except OSError:
+                continue
+            with open(claimed) as f:
+                events = [json.loads(line) for line in f if line.strip()]
+            await self._resolve_tenants(events)
+            for i in range(0, len(events), settings.AUDIT_BATCH_SIZE):
+                if not await self._insert(events[i:i + settings.AUDIT_BATCH_SIZE]):
+                    # Mongo is failing again: keep the rest for a later attempt
+                    await asyncio.to_thread(self._spill, events[i:])
+                    os.remove(claimed)
+                    return
+            os.remove(claimed)
+            self.stats["replayed"] += len(events)
+            AUDIT_EVENTS.labels(outcome="replayed").inc(len(events))
+            logger.info("audit_spill_replayed", events=len(events))
+
+audit_log = AuditLog()
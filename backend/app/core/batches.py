@@ -0,0 +1,88 @@
+import uuid
+import json
+import time
+from typing import Any, Dict, List, Optional
+from app.core.config import settings
+from app.core.session import session_manager
+from app.core.scheduler import fair_scheduler
+from app.db.redis import get_redis
+
+# Count a session's outcome once, even if Celery redelivers its task.
+_OUTCOME_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then return 0 end
+if redis.call('SADD', KEYS[2], ARGV[1]) == 0 then return 0 end
+redis.call('HINCRBY', KEYS[1], ARGV[2], 1)
+redis.call('EXPIRE', KEYS[2], ARGV[3])
+return 1
+"""
+
+OUTCOMES = ("completed", "failed", "stopped")
+
+class BatchManager:
+    """
+    Bulk submissions. A batch is a progress hash (`batch:{id}`) with counters that
+    workers increment as sessions finish, so progress is one HGETALL no matter how
+    many sessions it holds, plus the list of its session ids (`batch:{id}:sessions`).
+    """
+
+    PREFIX = "batch:"
+
+    async def create_batch(self, tasks: List[str], tenant: str, priority: str,
+                           options: Optional[Dict[str, Any]] = None) -> str:
+        batch_id = str(uuid.uuid4())
+        session_ids = await session_manager.create_sessions(
+            len(tasks), options, ttl=settings.BATCH_TTL, batch_id=batch_id, tenant=tenant
+        )
+        key = f"{self.PREFIX}{batch_id}"
+        redis = await get_redis()
+        async with redis.pipeline(transaction=False) as pipe:
+            pipe.hset(key, mapping={
+                "batch_id": batch_id, "tenant": tenant, "priority": priority, "created_at": time.time(),
+                "total": len(tasks), "dispatched": 0, **{outcome: 0 for outcome in OUTCOMES},
+            })
+            pipe.expire(key, settings.BATCH_TTL)
+            for i in range(0, len(session_ids), 1000):
+                pipe.rpush(f"{key}:sessions", *session_ids[i:i + 1000])
+            pipe.expire(f"{key}:sessions", settings.BATCH_TTL)
+            fair_scheduler.enqueue(pipe, tenant, priority, [
+                json.dumps({"session_id": session_id, "task": task, "batch_id": batch_id})
+                for session_id, task in zip(session_ids, tasks)
+            ])
+            await pipe.execute()
+        return batch_id
+
+    async def get_batch(self, batch_id: str) -> Optional[Dict[str, Any]]:
+        redis = await get_redis()
+        data = await redis.hgetall(f"{self.PREFIX}{batch_id}")
+        if not data:
+            return None
+        batch = {k: (float(v) if k == "created_at" else int(v) if v.isdigit() else v) for k, v in data.items()}
+        finished = sum(batch[outcome] for outcome in OUTCOMES)
+        batch["queued"] = batch["total"] - batch["dispatched"]
+        batch["running"] = batch["dispatched"] - finished
+        batch["status"] = "done" if finished >= batch["total"] else "running" if batch["dispatched"] else "queued"
+        return batch
+
+    async def list_sessions(self, batch_id: str, offset: int = 0, limit: int = 100) -> List[str]:
+        redis = await get_redis()
+        return await redis.lrange(f"{self.PREFIX}{batch_id}:sessions", offset, offset + limit - 1)
+
+    async def record_outcome(self, batch_id: str, session_id: str, status: str = None):
+        """
+        Called by the worker once a batch session has run to an end. `status` is the
+        worker's outcome for runs that raised, whose stored status may still be `running`.
+        The tenant's in-flight slot is freed even if the outcome cannot be counted.
+        """
+        session = await session_manager.get_session(session_id, step_limit=0) or {}
+        try:
+            stored = session.get("status")
+            outcome = stored if stored in OUTCOMES else status if status in OUTCOMES else "stopped"
+            redis = await get_redis()
+            key = f"{self.PREFIX}{batch_id}"
+            await redis.register_script(_OUTCOME_SCRIPT)(
+                keys=[key, f"{key}:done"], args=[session_id, outcome, settings.BATCH_TTL]
+            )
+        finally:
+            await fair_scheduler.finished(session.get("tenant") or "default", session_id)
+
+batch_manager = BatchManager()
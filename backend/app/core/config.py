@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import Any, Dict, List, Optional
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
@@ -9,17 +9,70 @@ class Settings(BaseSettings):
     MONGODB_URL: str = "mongodb://localhost:27017" # Mongo handles localhost better on Windows usually
     MONGODB_DB_NAME: str = "rpa_platform"
     REDIS_URL: str = "redis://127.0.0.1:6379/0" 
+    SESSION_STORE_BACKEND: str = "hash" # hash (Redis hash + step list) or json (legacy single document)
     
     # WORKER
     CELERY_BROKER_URL: str = "redis://127.0.0.1:6379/0"
     CELERY_RESULT_BACKEND: str = "redis://127.0.0.1:6379/0"
+    WORKER_MODE: str = "prefork" # prefork (one session per process) or async (many sessions per process on a shared loop)
+    WORKER_MAX_SESSIONS: int = 32 # per-process session cap in async mode
+    SESSION_IDLE_TIMEOUT: float = 300 # seconds waiting for input before a session is suspended and its browser released
+    SIDE_EFFECTS_PIPELINED: bool = True # persist steps and publish frames in the background while the next step is planned
+    SIDE_EFFECTS_MAX_PENDING: int = 16 # per-session backlog; when full, the step loop waits (backpressure)
+    CHECKPOINTS_ENABLED: bool = False # checkpoint running sessions (and ack their tasks late) so a redelivered task resumes instead of restarting
+    CHECKPOINT_INTERVAL: int = 1 # steps between checkpoints (the adaptive minimum)
+    CHECKPOINT_MAX_INTERVAL: int = 10 # upper bound when checkpoints exceed the overhead budget
+    CHECKPOINT_OVERHEAD_BUDGET: float = 0.05 # checkpoint time as a fraction of step time
+    SESSION_LEASE_TTL: int = 30 # seconds; a crashed worker's session can be taken over after this
+
+    # BATCHES
+    BATCH_MAX_TASKS: int = 10000 # tasks per POST /batches
+    BATCH_TTL: int = 86400 # batch progress and not-yet-started batch sessions are kept this long
+    SCHEDULER_ENABLED: bool = True # API processes run the batch scheduler (one leader at a time)
+    SCHEDULER_INTERVAL: float = 0.5 # seconds between scheduler ticks
+    SCHEDULER_QUEUE_DEPTH: int = 64 # Celery messages kept waiting across priority queues; ~ total worker slots
+    TENANT_RATE_LIMIT: float = 5.0 # batch sessions started per second per tenant
+    TENANT_BURST: int = 20
+    TENANT_MAX_IN_FLIGHT: int = 100 # dispatched, unfinished batch sessions per tenant
     
     # LLM
-    LLM_PROVIDER: str = "groq" # openai, groq, azure, anthropic, mock
+    LLM_PROVIDER: str = "groq" # openai, groq, azure, anthropic, mock, router
     LLM_API_KEY: Optional[str] = None
     LLM_BASE_URL: Optional[str] = "https://api.groq.com/openai/v1" 
     LLM_MODEL: str = "llama3-70b-8192" 
     OPENAI_API_VERSION: Optional[str] = None # for Azure
+    HISTORY_COMPACTION: bool = True # token-budgeted history in the planner prompt (False = last 5 raw steps)
+    HISTORY_TOKEN_BUDGET: int = 3000
+    HISTORY_RECENT_STEPS: int = 5 # entries kept as steps; older ones are summarized one line each
+    PROMPT_TOKENIZER: str = "cl100k_base" # tiktoken encoding for token counts; empty = ~4 chars per token
+    PLANNER_TIERED: bool = False # ask LLM_FAST_MODEL first, escalate to LLM_MODEL on hard steps
+    LLM_FAST_MODEL: Optional[str] = None # e.g. llama3-8b-8192
+    LLM_FAST_PROVIDER: Optional[str] = None # defaults to LLM_PROVIDER (set it when that is "router")
+    LLM_FAST_BASE_URL: Optional[str] = None # defaults to LLM_BASE_URL
+    LLM_FAST_API_KEY: Optional[str] = None # defaults to LLM_API_KEY
+    PLANNER_ESCALATION_CONFIDENCE: float = 0.7 # fast plans below this confidence go to the large model
+    LLM_BACKENDS: List[Dict[str, Any]] = [] # for LLM_PROVIDER=router, a JSON list (see .env.example)
+    LLM_ROUTER_WINDOW: int = 200 # recent calls per backend used for latency/error-rate routing
+    LLM_HEDGE_ENABLED: bool = True # duplicate slow calls on the next-best backend
+    LLM_HEDGE_QUANTILE: float = 0.9 # hedge once a call runs longer than this latency quantile
+    LLM_HEDGE_MIN_SAMPLES: int = 20 # below this many samples, hedge after LLM_HEDGE_DEFAULT_DELAY
+    LLM_HEDGE_DEFAULT_DELAY: float = 3.0
+    LLM_MIDDLEWARE_ENABLED: bool = True # concurrency cap, rate-limit aware retries and request coalescing
+    LLM_MAX_CONCURRENCY: int = 16 # in-flight completions per model and process
+    LLM_RATE_LIMIT: float = 0 # requests/second per model and process; 0 = follow the provider's rate-limit headers only
+    LLM_MAX_RETRIES: int = 4 # on 429, 5xx and connection errors
+    LLM_RETRY_BASE_DELAY: float = 0.5 # seconds; exponential backoff with full jitter
+    LLM_MAX_CONNECTIONS: int = 32 # pooled keep-alive HTTP connections per provider
+    LLM_KEEPALIVE_EXPIRY: float = 60
+    LLM_TIMEOUT: float = 60
+    RECIPES_ENABLED: bool = False # record successful tasks and replay them without the LLM (sessions can opt out)
+    RECIPE_MAX_FAILURES: int = 3 # a recipe that diverged this often (and more than it succeeded) is no longer used
+    PLANNER_MAX_ACTIONS: int = 10 # actions per multi-action plan; the rest are skipped
+    LLM_STREAMING: bool = False # stream completions; start the tool as soon as action/args are parsed
+    PLAN_CACHE_ENABLED: bool = False # reuse planner responses for identical prompts (sessions can opt out)
+    PLAN_CACHE_SHARED: bool = True # also share cached plans across workers through Redis
+    PLAN_CACHE_MAX_ENTRIES: int = 1024 # per-process LRU size
+    PLAN_CACHE_TTL: int = 3600
     
     # Legacy specific keys (optional, but good for backward compat if needed)
     OPENAI_API_KEY: Optional[str] = None
@@ -27,9 +80,69 @@ class Settings(BaseSettings):
     
     # LOGGING
     LOG_LEVEL: str = "INFO"
+
+    # METRICS
+    WORKER_METRICS_PORT: int = 9100 # Prometheus exporter in each Celery worker; 0 disables
+
+    # TRACING
+    TRACING_ENABLED: bool = False
+    TRACING_EXPORTER: str = "file" # file (OTLP/JSON lines), otlp (OTLP/HTTP JSON) or none
+    TRACING_FILE: str = "traces.jsonl"
+    OTLP_ENDPOINT: str = "http://localhost:4318"
+    TRACING_SERVICE_NAME: str = "rpa-backend"
+    TRACING_SAMPLE_RATE: float = 1.0 # fraction of new traces recorded
+    TRACING_EXPORT_INTERVAL: float = 2.0 # seconds between exporter batches
     
     # BROWSER
     HEADLESS: bool = True # Set to False for local dev/interactive mode
+    BROWSER_RECORD_VIDEO: bool = True # per-session video in videos/ (never for pooled contexts)
+    BROWSER_POOL_ENABLED: bool = False # reuse pre-warmed contexts between sessions
+    BROWSER_POOL_MIN_SIZE: int = 2
+    BROWSER_POOL_MAX_SIZE: int = 16
+    BROWSER_POOL_IDLE_TTL: int = 300 # seconds before idle contexts above min size are closed
+    BROWSER_POOL_MAX_USES: int = 50 # leases before a context is retired
+    OBSERVATION_MODE: str = "url" # url (URL only) or digest (interactive elements + text, diffed per step)
+    OBSERVATION_TOKEN_BUDGET: int = 1200 # approximate tokens per observation
+    OBSERVATION_MAX_ELEMENTS: int = 300 # elements returned by the in-page walk
+    PREFETCH_ENABLED: bool = True # compute page text (and a screenshot) while the planner waits for the LLM
+    PREFETCH_SCREENSHOT: bool = True # include the screenshot; costs a capture per planned step
+    SMART_WAITS_ENABLED: bool = True # after each tool, wait for the outcomes it declares (navigation, network idle, DOM quiet, selector)
+    WAIT_NETWORK_IDLE_MS: int = 300 # network counts as idle after this long at or below WAIT_NETWORK_MAX_INFLIGHT requests
+    WAIT_NETWORK_MAX_INFLIGHT: int = 2 # pending requests tolerated as idle (analytics beacons, long polls)
+    WAIT_DOM_QUIET_MS: int = 200 # DOM counts as settled after this long without mutations
+    NETWORK_ROUTING_ENABLED: bool = False # intercept context requests: block lists, shared static-asset cache, per-session byte counts
+    NETWORK_BLOCK: List[str] = ["tracking", "media"] # categories to abort: image, media, font, tracking (built-in analytics/ads hosts)
+    NETWORK_BLOCK_DOMAINS: List[str] = [] # extra hosts to abort, subdomains included
+    NETWORK_CACHE_ENABLED: bool = True # serve scripts, stylesheets, images and fonts from a disk cache shared by the worker's contexts
+    NETWORK_CACHE_DIR: str = "http_cache/" # may be shared by the worker processes on one host
+    NETWORK_CACHE_MAX_BYTES: int = 512 * 1024 * 1024 # least recently used entries are evicted above this
+    NETWORK_CACHE_MAX_ENTRY_BYTES: int = 10 * 1024 * 1024 # larger responses are passed through uncached
+    TOOL_TIMEOUTS_MS: Dict[str, int] = {} # per-tool action + settle timeouts, e.g. {"open_url": 30000}; defaults are set on each tool
+
+    # AUDIT LOG
+    AUDIT_LOG_ENABLED: bool = True # session lifecycle events and steps in the Mongo `audit_events` collection
+    AUDIT_BATCH_SIZE: int = 500 # events per insert_many
+    AUDIT_FLUSH_INTERVAL: float = 1.0 # seconds; smaller batches are written at least this often
+    AUDIT_BUFFER_SIZE: int = 50000 # buffered events per process before the buffer is spilled to disk
+    AUDIT_WRITE_TIMEOUT: float = 5.0 # seconds before a batch write counts as failed and is spilled
+    AUDIT_RETRY_INTERVAL: float = 30.0 # seconds batches go straight to disk after a failed write
+    AUDIT_SPILL_DIR: str = "audit_spill/" # JSON-lines files replayed into Mongo once writes succeed again
+
+    # SCREENSHOTS
+    SCREENSHOT_STORE: str = "inline" # inline (base64 in sessions and pub/sub), gridfs (Mongo, reachable from API and workers), or file (needs a shared volume)
+    SCREENSHOT_DIR: str = "screenshots/" # file store root; must be shared by API and workers
+    SCREENSHOT_RETENTION_HOURS: float = 72 # frames older than this are pruned; 0 keeps them forever
+
+    # LIVE VIEW
+    LIVE_VIEW_MODE: str = "screenshot" # screenshot (after each action) or screencast (CDP push)
+    LIVE_VIEW_MAX_FPS: float = 5.0
+    LIVE_VIEW_DIFF_THRESHOLD: int = 2 # max differing dHash bits (of 64) to treat a frame as unchanged; 0 = exact match only
+    LIVE_VIEW_JPEG_QUALITY: int = 50
+    LIVE_VIEW_PRESENCE_INTERVAL: float = 1.0 # seconds between viewer-count checks
+    LIVE_VIEW_BINARY_FRAMES: bool = True # binary WebSocket frames; False sends screenshot-store URLs as JSON
+
+    # API
+    WS_QUEUE_SIZE: int = 256 # per-WebSocket buffer; oldest messages are dropped for slow clients
 
     class Config:
         env_file = ".env"
@@ -0,0 +1,49 @@
+from typing import Optional
+from app.db.redis import get_redis
+
+class SessionInbox:
+    """
+    Durable per-session queue of user messages (`session_inbox:{id}`).
+
+    A worker waiting for follow-up input blocks on BLPOP instead of polling, and
+    messages sent while no worker holds the session (it was suspended) stay queued
+    until one resumes it. `session_input:{id}` is still published for observers.
+    """
+
+    PREFIX = "session_inbox:"
+    RESUME_PREFIX = "session_resume:"
+    TTL = 3600
+
+    async def push(self, session_id: str, message: str):
+        redis = await get_redis()
+        key = f"{self.PREFIX}{session_id}"
+        async with redis.pipeline(transaction=True) as pipe:
+            pipe.rpush(key, message)
+            pipe.expire(key, self.TTL)
+            pipe.publish(f"session_input:{session_id}", message)
+            await pipe.execute()
+
+    async def push_front(self, session_id: str, message: str):
+        redis = await get_redis()
+        await redis.lpush(f"{self.PREFIX}{session_id}", message)
+
+    async def pop(self, session_id: str) -> Optional[str]:
+        redis = await get_redis()
+        return await redis.lpop(f"{self.PREFIX}{session_id}")
+
+    async def wait(self, session_id: str, timeout: float) -> Optional[str]:
+        """Block until a message arrives or `timeout` seconds pass (None on timeout)."""
+        redis = await get_redis()
+        item = await redis.blpop([f"{self.PREFIX}{session_id}"], timeout=timeout)
+        return item[1] if item else None
+
+    async def claim_resume(self, session_id: str, ttl: int = 300) -> bool:
+        """Exactly one caller wins the right to bring a suspended session back."""
+        redis = await get_redis()
+        return bool(await redis.set(f"{self.RESUME_PREFIX}{session_id}", "1", nx=True, ex=ttl))
+
+    async def release_resume(self, session_id: str):
+        redis = await get_redis()
+        await redis.delete(f"{self.RESUME_PREFIX}{session_id}")
+
+session_inbox = SessionInbox()
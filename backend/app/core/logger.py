@@ -2,6 +2,7 @@ import structlog
 import logging
 import sys
 from app.core.config import settings
+from app.core.tracing import add_trace_context
 
 def configure_logger():
     logging.basicConfig(
@@ -15,6 +16,7 @@ def configure_logger():
             structlog.stdlib.filter_by_level,
             structlog.stdlib.add_logger_name,
             structlog.stdlib.add_log_level,
+            add_trace_context,
             structlog.stdlib.PositionalArgumentsFormatter(),
             structlog.processors.TimeStamper(fmt="iso"),
             structlog.processors.StackInfoRenderer(),
@@ -27,4 +29,8 @@ def configure_logger():
         cache_logger_on_first_use=True,
     )
 
+# Trace ids on every line written inside a span, with or without configure_logger()
+if add_trace_context not in structlog.get_config()["processors"]:
+    structlog.configure(processors=[add_trace_context, *structlog.get_config()["processors"]])
+
 logger = structlog.get_logger()
@@ -0,0 +1,101 @@
+import os
+from typing import Optional
+from prometheus_client import (CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram,
+                               generate_latest, start_http_server)
+from app.core.config import settings
+
+# With PROMETHEUS_MULTIPROC_DIR set (several uvicorn workers or a prefork Celery pool),
+# every process writes its samples there and the exporter aggregates them at scrape time.
+MULTIPROCESS = bool(os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
+
+# Buckets follow what each operation actually takes: sessions run for minutes,
+# LLM calls for seconds, tool calls from milliseconds (typing) to seconds (page loads).
+SESSION_BUCKETS = (5, 15, 30, 60, 120, 300, 600, 1200, 1800, 3600)
+STEP_BUCKETS = (1, 2, 3, 5, 8, 13, 20, 30, 50)
+LLM_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30, 60)
+TOOL_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30)
+BYTES_BUCKETS = (128, 512, 2048, 8192, 32768, 131072, 524288, 2097152)
+CHECKPOINT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2)
+PAGE_LOAD_BUCKETS = (0.25, 0.5, 1, 2, 3, 5, 8, 13, 20, 30)
+
+SESSION_DURATION = Histogram("rpa_session_duration_seconds", "Wall time of a session run on a worker",
+                             ["status"], buckets=SESSION_BUCKETS)
+SESSION_STEPS = Histogram("rpa_session_steps", "Steps executed per session run", ["status"], buckets=STEP_BUCKETS)
+LLM_LATENCY = Histogram("rpa_llm_request_seconds", "Planner LLM call latency", ["provider", "model", "tier"],
+                        buckets=LLM_BUCKETS)
+LLM_TOKENS = Counter("rpa_llm_tokens_total", "LLM tokens (prompt/completion)", ["provider", "model", "kind"])
+LLM_ERRORS = Counter("rpa_llm_errors_total", "Failed planner LLM calls", ["provider", "model"])
+LLM_BACKEND_COST = Counter("rpa_llm_backend_cost_total", "Estimated spend per router backend", ["backend"])
+LLM_BACKEND_LATENCY = Histogram("rpa_llm_backend_request_seconds", "LLM call latency per router backend",
+                                ["backend", "outcome"], buckets=LLM_BUCKETS)
+LLM_BACKEND_EVENTS = Counter("rpa_llm_backend_events_total", "Router decisions per backend (hedges, wins, cancelled)",
+                             ["backend", "event"])
+TOOL_LATENCY = Histogram("rpa_tool_seconds", "Tool execution latency", ["tool", "success"], buckets=TOOL_BUCKETS)
+BROWSER_CONTEXTS = Gauge("rpa_browser_contexts_open", "Open browser contexts", multiprocess_mode="livesum")
+BROWSER_POOL_ACQUIRES = Counter("rpa_browser_pool_acquires_total", "Context pool leases (hit: warm context, miss: created)",
+                                ["outcome"])
+BROWSER_POOL_CONTEXTS = Gauge("rpa_browser_pool_contexts", "Pooled browser contexts by state (idle, in_use, pending)",
+                              ["state"], multiprocess_mode="livesum")
+NETWORK_REQUESTS = Counter("rpa_browser_requests_total", "Browser requests by routing outcome", ["outcome"])
+NETWORK_BYTES = Counter("rpa_browser_bytes_total", "Response bytes loaded by sessions' browsers", ["source"])
+PAGE_LOAD = Histogram("rpa_page_load_seconds", "Main-frame navigation to load event", buckets=PAGE_LOAD_BUCKETS)
+CHECKPOINT_SECONDS = Histogram("rpa_session_checkpoint_seconds", "Time to capture and store a session checkpoint",
+                               buckets=CHECKPOINT_BUCKETS)
+AUDIT_EVENTS = Counter("rpa_audit_events_total", "Audit events by outcome (written, spilled, replayed)", ["outcome"])
+PUBSUB_MESSAGES = Counter("rpa_pubsub_messages_total", "Session pub/sub messages received by the API", ["kind"])
+PUBSUB_BYTES = Histogram("rpa_pubsub_message_bytes", "Session pub/sub message size", ["kind"], buckets=BYTES_BUCKETS)
+QUEUE_DEPTH = Gauge("rpa_queue_depth", "Tasks waiting in a Celery queue (read at scrape time)", ["queue"],
+                    multiprocess_mode="liveall")
+SCHEDULER_BACKLOG = Gauge("rpa_scheduler_backlog", "Batch sessions waiting in the fair scheduler", ["priority"],
+                          multiprocess_mode="liveall")
+
+def registry() -> Optional[CollectorRegistry]:
+    """Registry to expose: the multiprocess aggregate, or None for the default one."""
+    if not MULTIPROCESS:
+        return None
+    from prometheus_client import multiprocess
+    collector_registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(collector_registry)
+    return collector_registry
+
+def render() -> bytes:
+    collector_registry = registry()
+    return generate_latest(collector_registry) if collector_registry else generate_latest()
+
+async def refresh_queue_depth():
+    """Read Celery queue lengths and the scheduler backlog into their gauges (called per scrape)."""
+    from app.core.scheduler import PRIORITIES, PRIORITY_QUEUES, fair_scheduler
+    from app.db.redis import get_redis
+    broker = await fair_scheduler.broker()
+    async with broker.pipeline(transaction=False) as pipe:
+        for queue in PRIORITY_QUEUES.values():
+            pipe.llen(queue)
+        for queue, depth in zip(PRIORITY_QUEUES.values(), await pipe.execute()):
+            QUEUE_DEPTH.labels(queue=queue).set(depth)
+
+    redis = await get_redis()
+    for priority in PRIORITIES:
+        tenants = await redis.smembers(fair_scheduler.tenants_key(priority))
+        backlog = 0
+        if tenants:
+            async with redis.pipeline(transaction=False) as pipe:
+                for tenant in tenants:
+                    pipe.llen(fair_scheduler.queue_key(priority, tenant))
+                backlog = sum(await pipe.execute())
+        SCHEDULER_BACKLOG.labels(priority=priority).set(backlog)
+
+def start_worker_exporter():
+    """Serve /metrics from a Celery worker on WORKER_METRICS_PORT (once, in the main process)."""
+    if not settings.WORKER_METRICS_PORT:
+        return
+    collector_registry = registry()
+    if collector_registry:
+        start_http_server(settings.WORKER_METRICS_PORT, registry=collector_registry)
+    else:
+        start_http_server(settings.WORKER_METRICS_PORT)
+
+def mark_process_dead(pid: int):
+    """Drop a finished worker child's live gauges from the multiprocess aggregate."""
+    if MULTIPROCESS:
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(pid)
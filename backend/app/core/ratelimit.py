@@ -0,0 +1,30 @@
+import time
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, holding at most `burst`."""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def available(self, n: float = 1) -> bool:
+        self._refill()
+        return self.tokens >= n
+
+    def try_take(self, n: float = 1) -> bool:
+        if not self.available(n):
+            return False
+        self.tokens -= n
+        return True
+
+    def wait_time(self, n: float = 1) -> float:
+        """Seconds until `n` tokens are available."""
+        self._refill()
+        return max(0.0, (n - self.tokens) / self.rate) if self.rate > 0 else float("inf")
@@ -0,0 +1,223 @@
+import json
+import time
+import uuid
+import asyncio
+from typing import Dict, List, Optional, Tuple
+import redis.asyncio as aioredis
+from app.core.config import settings
+from app.core.logger import logger
+from app.core.ratelimit import TokenBucket
+from app.core.tracing import task_kwargs
+from app.db.redis import get_redis
+
+PRIORITIES = ("high", "normal", "low")
+# Celery queue per priority level; workers consume them in this order
+# (-Q high,celery,low with the broker's "priority" queue order strategy).
+PRIORITY_QUEUES = {"high": "high", "normal": "celery", "low": "low"}
+
+class FairScheduler:
+    """
+    Moves queued batch sessions from per-tenant Redis lists into the Celery queues.
+
+    Celery queues are FIFO, so pushing a 10k-task batch straight into them would make
+    every later tenant wait behind it. Instead batch entries wait in
+    `sched:queue:{priority}:{tenant}` and one leader (any API process holding
+    `sched:leader`) tops up the Celery queues to SCHEDULER_QUEUE_DEPTH messages,
+    taking one entry per tenant per round (round robin), higher priorities first.
+    Each tenant is limited by a token bucket (TENANT_RATE_LIMIT/TENANT_BURST) and by
+    TENANT_MAX_IN_FLIGHT dispatched-but-unfinished sessions.
+    """
+
+    LEADER_KEY = "sched:leader"
+    LEADER_TTL_MS = 5000
+    # In-flight entries older than this are assumed lost (e.g. a killed worker).
+    IN_FLIGHT_EXPIRY = 6 * 3600
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        self._token = str(uuid.uuid4())
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._cursor: Dict[str, int] = {priority: 0 for priority in PRIORITIES}
+        self._broker: Optional[aioredis.Redis] = None
+        self.stats = {"ticks": 0, "dispatched": 0, "rate_limited": 0, "concurrency_limited": 0}
+
+    @staticmethod
+    def queue_key(priority: str, tenant: str) -> str:
+        return f"sched:queue:{priority}:{tenant}"
+
+    @staticmethod
+    def tenants_key(priority: str) -> str:
+        return f"sched:tenants:{priority}"
+
+    @staticmethod
+    def in_flight_key(tenant: str) -> str:
+        return f"sched:inflight:{tenant}"
+
+    def enqueue(self, pipe, tenant: str, priority: str, entries: List[str]):
+        """Add queue commands for `entries` to a pipeline the caller executes."""
+        for i in range(0, len(entries), 1000):
+            pipe.rpush(self.queue_key(priority, tenant), *entries[i:i + 1000])
+        pipe.sadd(self.tenants_key(priority), tenant)
+
+    async def finished(self, tenant: str, session_id: str):
+        redis = await get_redis()
+        await redis.zrem(self.in_flight_key(tenant), session_id)
+
+    async def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._task = None
+        try:
+            redis = await get_redis()
+            if await redis.get(self.LEADER_KEY) == self._token:
+                await redis.delete(self.LEADER_KEY)
+        except Exception:
+            pass
+
+    async def _run(self):
+        while True:
+            try:
+                if await self._lead():
+                    await self.tick()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("scheduler_tick_failed", error=str(e))
+            await asyncio.sleep(settings.SCHEDULER_INTERVAL)
+
+    async def _lead(self) -> bool:
+        redis = await get_redis()
+        if await redis.set(self.LEADER_KEY, self._token, nx=True, px=self.LEADER_TTL_MS):
+            logger.info("scheduler_leader_acquired")
+            return True
+        if await redis.get(self.LEADER_KEY) == self._token:
+            await redis.pexpire(self.LEADER_KEY, self.LEADER_TTL_MS)
+            return True
+        return False
+
+    def _bucket(self, tenant: str) -> TokenBucket:
+        if tenant not in self._buckets:
+            self._buckets[tenant] = TokenBucket(settings.TENANT_RATE_LIMIT, settings.TENANT_BURST)
+        return self._buckets[tenant]
+
+    async def broker(self) -> aioredis.Redis:
+        """Client for the Celery broker, which may be a different Redis than REDIS_URL."""
+        if self._broker is None:
+            self._broker = aioredis.from_url(settings.CELERY_BROKER_URL)
+        return self._broker
+
+    async def _queue_depth(self) -> int:
+        broker = await self.broker()
+        async with broker.pipeline(transaction=False) as pipe:
+            for queue in PRIORITY_QUEUES.values():
+                pipe.llen(queue)
+            return sum(await pipe.execute())
+
+    async def tick(self) -> int:
+        """Dispatch as many entries as the Celery queues have room for; returns the count."""
+        self.stats["ticks"] += 1
+        free = settings.SCHEDULER_QUEUE_DEPTH - await self._queue_depth()
+        if free <= 0:
+            return 0
+
+        redis = await get_redis()
+        now = time.time()
+        selected: List[Tuple[str, str, str]] = []  # (priority, tenant, entry)
+        in_flight: Dict[str, int] = {}  # shared across priorities: a tenant's cap covers all of them
+        for priority in PRIORITIES:
+            tenants = sorted(await redis.smembers(self.tenants_key(priority)))
+            if not tenants:
+                continue
+            start = self._cursor[priority] % len(tenants)
+            tenants = tenants[start:] + tenants[:start]
+            self._cursor[priority] += 1
+
+            for tenant in tenants:
+                if tenant in in_flight:
+                    continue
+                key = self.in_flight_key(tenant)
+                await redis.zremrangebyscore(key, 0, now - self.IN_FLIGHT_EXPIRY)
+                in_flight[tenant] = await redis.zcard(key)
+
+            active = list(tenants)
+            while active and free > 0:
+                for tenant in list(active):
+                    if free <= 0:
+                        break
+                    if in_flight[tenant] >= settings.TENANT_MAX_IN_FLIGHT:
+                        self.stats["concurrency_limited"] += 1
+                        active.remove(tenant)
+                        continue
+                    if not self._bucket(tenant).available():
+                        self.stats["rate_limited"] += 1
+                        active.remove(tenant)
+                        continue
+                    entry = await redis.lpop(self.queue_key(priority, tenant))
+                    if entry is None:
+                        active.remove(tenant)
+                        await self._retire(redis, priority, tenant)
+                        continue
+                    self._bucket(tenant).try_take()
+                    in_flight[tenant] += 1
+                    selected.append((priority, tenant, entry))
+                    free -= 1
+
+        if selected:
+            await self._dispatch(redis, selected, now)
+        return len(selected)
+
+    async def _retire(self, redis, priority: str, tenant: str):
+        """Drop a tenant with an empty queue from the round robin (unless a batch just refilled it)."""
+        await redis.srem(self.tenants_key(priority), tenant)
+        if await redis.llen(self.queue_key(priority, tenant)):
+            await redis.sadd(self.tenants_key(priority), tenant)
+
+    async def _dispatch(self, redis, selected: List[Tuple[str, str, str]], now: float):
+        entries = [(priority, tenant, json.loads(entry)) for priority, tenant, entry in selected]
+        async with redis.pipeline(transaction=False) as pipe:
+            for _, tenant, entry in entries:
+                pipe.zadd(self.in_flight_key(tenant), {entry["session_id"]: now})
+                pipe.hincrby(f"batch:{entry['batch_id']}", "dispatched", 1)
+            await pipe.execute()
+        # Publishing to the broker is blocking I/O; keep it off the API's event loop.
+        try:
+            failed = await asyncio.to_thread(self._publish, entries)
+        except Exception as e:
+            logger.error("scheduler_publish_failed", error=str(e))
+            failed = entries
+        if failed:
+            # Put unpublished entries back at the head of their queues for the next tick.
+            async with redis.pipeline(transaction=False) as pipe:
+                for priority, tenant, entry in reversed(failed):
+                    pipe.lpush(self.queue_key(priority, tenant), json.dumps(entry))
+                    pipe.sadd(self.tenants_key(priority), tenant)
+                    pipe.zrem(self.in_flight_key(tenant), entry["session_id"])
+                    pipe.hincrby(f"batch:{entry['batch_id']}", "dispatched", -1)
+                await pipe.execute()
+        self.stats["dispatched"] += len(entries) - len(failed)
+        logger.info("scheduler_dispatched", count=len(entries) - len(failed), failed=len(failed),
+                    tenants=len({tenant for _, tenant, _ in entries}))
+
+    def _publish(self, entries):
+        from app.worker.tasks import run_agent_task
+        for i, (priority, _, entry) in enumerate(entries):
+            try:
+                run_agent_task.apply_async(
+                    args=[entry["session_id"], entry["task"]],
+                    kwargs={"batch_id": entry["batch_id"], **task_kwargs()},
+                    queue=PRIORITY_QUEUES[priority],
+                )
+            except Exception as e:
+                logger.error("scheduler_publish_failed", error=str(e))
+                return entries[i:]
+        return []
+
+fair_scheduler = FairScheduler()
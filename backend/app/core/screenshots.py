@@ -0,0 +1,208 @@
+import os
+import re
+import base64
+import asyncio
+import time
+import hashlib
+import uuid
+from collections import OrderedDict
+from typing import Optional
+from app.core.config import settings
+from app.core.logger import logger
+from app.db.mongo import get_db
+
+REF_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+def screenshot_ref(data: bytes) -> str:
+    """Content address of a screenshot: identical frames share one ref."""
+    return hashlib.sha256(data).hexdigest()
+
+def screenshot_url(ref: str) -> str:
+    return f"/api/v1/screenshots/{ref}"
+
+class ScreenshotStore:
+    """
+    Content-addressed frame storage. Frames not stored or referenced again for
+    SCREENSHOT_RETENTION_HOURS are pruned from `put()` in the background, at most
+    once per PRUNE_INTERVAL seconds per process; refs in sessions past that age then
+    return 404. A `put()` of a frame that is already stored refreshes its age (at
+    most once per TOUCH_INTERVAL seconds per process), so frames that new sessions
+    still produce are kept.
+    """
+
+    PRUNE_INTERVAL = 3600
+    TOUCH_INTERVAL = 600
+
+    _last_prune = 0.0
+    _pruning: Optional[asyncio.Task] = None
+
+    async def put(self, data: bytes) -> str:
+        raise NotImplementedError
+
+    async def get(self, ref: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    async def prune(self, cutoff: float) -> int:
+        """Delete frames last stored or referenced before `cutoff` (epoch seconds); returns how many."""
+        raise NotImplementedError
+
+    def _recently_seen(self, ref: str) -> bool:
+        seen = self._known.get(ref)
+        return seen is not None and time.monotonic() - seen < self.TOUCH_INTERVAL
+
+    def _remember(self, ref: str):
+        self._known[ref] = time.monotonic()
+        self._known.move_to_end(ref)
+        if len(self._known) > 4096:
+            self._known.popitem(last=False)
+
+    def _maybe_prune(self):
+        if not settings.SCREENSHOT_RETENTION_HOURS or time.monotonic() - self._last_prune < self.PRUNE_INTERVAL:
+            return
+        self._last_prune = time.monotonic()
+        self._pruning = asyncio.create_task(self._prune())
+
+    async def _prune(self):
+        try:
+            removed = await self.prune(time.time() - settings.SCREENSHOT_RETENTION_HOURS * 3600)
+            self._known.clear()  # pruned refs must be written again if they come back
+            if removed:
+                logger.info("screenshots_pruned", store=type(self).__name__, removed=removed)
+        except Exception as e:
+            logger.error("screenshot_prune_failed", error=str(e))
+
+class FileScreenshotStore(ScreenshotStore):
+    """Screenshots as `<root>/<ref[:2]>/<ref>.jpg`. API and workers must share `root` (a volume)."""
+
+    def __init__(self, root: str = None):
+        self.root = root or settings.SCREENSHOT_DIR
+        # Refs known to be on disk (and when their mtime was last refreshed), so repeated
+        # frames skip the filesystem.
+        self._known = OrderedDict()
+
+    def _path(self, ref: str) -> str:
+        return os.path.join(self.root, ref[:2], f"{ref}.jpg")
+
+    def _write(self, ref: str, data: bytes):
+        path = self._path(ref)
+        try:
+            os.utime(path)  # already stored: referenced again, so it is not pruned yet
+            return
+        except FileNotFoundError:
+            pass
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write-then-rename so readers never see a partial file; the temp name is unique
+        # per write because threads of one process may store the same frame at once.
+        tmp = f"{path}.{os.getpid()}.{uuid.uuid4().hex}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def _read(self, ref: str) -> Optional[bytes]:
+        try:
+            with open(self._path(ref), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def _prune_files(self, cutoff: float) -> int:
+        removed = 0
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                try:
+                    if os.path.getmtime(path) < cutoff:
+                        os.remove(path)
+                        removed += 1
+                except FileNotFoundError:
+                    pass  # pruned by another process sharing the volume
+        return removed
+
+    async def put(self, data: bytes) -> str:
+        ref = screenshot_ref(data)
+        if not self._recently_seen(ref):
+            await asyncio.to_thread(self._write, ref, data)
+            self._remember(ref)
+        self._maybe_prune()
+        return ref
+
+    async def get(self, ref: str) -> Optional[bytes]:
+        return await asyncio.to_thread(self._read, ref)
+
+    async def prune(self, cutoff: float) -> int:
+        return await asyncio.to_thread(self._prune_files, cutoff)
+
+class GridFSScreenshotStore(ScreenshotStore):
+    """Screenshots in the `screenshots` GridFS bucket of the app database, one file per ref."""
+
+    BUCKET = "screenshots"
+
+    def __init__(self):
+        self._known = OrderedDict()
+
+    async def _bucket(self):
+        from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+        return AsyncIOMotorGridFSBucket(await get_db(), bucket_name=self.BUCKET)
+
+    async def put(self, data: bytes) -> str:
+        from datetime import datetime, timezone
+        ref = screenshot_ref(data)
+        self._maybe_prune()
+        if self._recently_seen(ref):
+            return ref
+        now = datetime.now(timezone.utc)
+        # Already stored: mark it as referenced again (prune goes by `metadata.last_used`)
+        files = (await get_db())[f"{self.BUCKET}.files"]
+        touched = await files.update_one({"filename": ref}, {"$set": {"metadata.last_used": now}})
+        if not touched.matched_count:
+            bucket = await self._bucket()
+            await bucket.upload_from_stream(ref, data, metadata={"content_type": "image/jpeg", "last_used": now})
+        self._remember(ref)
+        return ref
+
+    async def get(self, ref: str) -> Optional[bytes]:
+        from gridfs.errors import NoFile
+        bucket = await self._bucket()
+        try:
+            stream = await bucket.open_download_stream_by_name(ref)
+            return await stream.read()
+        except NoFile:
+            return None
+
+    async def prune(self, cutoff: float) -> int:
+        from datetime import datetime, timezone
+        bucket = await self._bucket()
+        removed = 0
+        before = {"$lt": datetime.fromtimestamp(cutoff, tz=timezone.utc)}
+        query = {"$or": [{"metadata.last_used": before},
+                         {"metadata.last_used": {"$exists": False}, "uploadDate": before}]}
+        async for grid_out in bucket.find(query):
+            await bucket.delete(grid_out._id)  # files document and chunks
+            removed += 1
+        return removed
+
+def get_screenshot_store() -> Optional[ScreenshotStore]:
+    backend = settings.SCREENSHOT_STORE.lower()
+    if backend == "gridfs":
+        return GridFSScreenshotStore()
+    if backend == "file":
+        return FileScreenshotStore()
+    # "inline": keep screenshots as base64 inside ToolResult / pub-sub messages
+    return None
+
+screenshot_store = get_screenshot_store()
+
+async def attach_screenshot(result, data: bytes):
+    """Store `data` out of band and put its ref on the ToolResult (base64 inline only if no store)."""
+    if screenshot_store is None:
+        result.screenshot_base64 = base64.b64encode(data).decode("utf-8")
+    else:
+        result.screenshot_ref = await screenshot_store.put(data)
+    return result
+
+async def image_message(data: bytes) -> dict:
+    """Pub/sub payload announcing a new frame: a short ref + URL, or a data URI without a store."""
+    if screenshot_store is None:
+        return {"type": "image", "data": f"data:image/jpeg;base64,{base64.b64encode(data).decode('utf-8')}"}
+    ref = await screenshot_store.put(data)
+    return {"type": "image", "ref": ref, "url": screenshot_url(ref)}
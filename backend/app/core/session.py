@@ -1,62 +1,310 @@
 import uuid
 import json
 import time
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
+from app.core.audit import audit_log
+from app.core.config import settings
+from app.core.tracing import tracer
+from redis.exceptions import ResponseError, WatchError
 from app.db.redis import get_redis
 
-class SessionManager:
-    PREFIX = "session:"
-    TTL = 3600  # 1 hour expiration
+# Session fields kept in the audit log along with a status change
+AUDITED_FIELDS = ("status", "task", "result", "error")
+
+def _audited_step(step_data: Dict[str, Any]) -> Dict[str, Any]:
+    """The step as written to the audit log: inline screenshots are left out (refs are kept)."""
+    result = step_data.get("result")
+    if isinstance(result, dict) and result.get("screenshot_base64"):
+        return {**step_data, "result": {**result, "screenshot_base64": None}}
+    return step_data
+
+class JsonSessionStore:
+    """
+    Original format: the whole session (steps included) is one JSON string.
+    Every write is a GET + SETEX of the full document, so step appends cost
+    O(session size) and concurrent writers can overwrite each other.
+    """
 
-    async def create_session(self) -> str:
-        session_id = str(uuid.uuid4())
+    def __init__(self, prefix: str, ttl: int):
+        self.prefix = prefix
+        self.ttl = ttl
+
+    async def create(self, session_id: str, initial_state: Dict[str, Any]):
         redis = await get_redis()
-        initial_state = {
-            "session_id": session_id,
-            "created_at": time.time(),
-            "status": "ready",
-            "steps": [],
-            "memory": {}
-        }
-        await redis.setex(
-            f"{self.PREFIX}{session_id}",
-            self.TTL,
-            json.dumps(initial_state)
-        )
-        return session_id
+        await redis.setex(f"{self.prefix}{session_id}", self.ttl, json.dumps(initial_state))
 
-    async def get_session(self, session_id: str) -> Optional[Dict[str, Any]]:
+    async def create_many(self, states: List[Dict[str, Any]], ttl: int):
         redis = await get_redis()
-        data = await redis.get(f"{self.PREFIX}{session_id}")
-        if data:
-            return json.loads(data)
-        return None
+        async with redis.pipeline(transaction=False) as pipe:
+            for state in states:
+                pipe.setex(f"{self.prefix}{state['session_id']}", ttl, json.dumps(state))
+            await pipe.execute()
 
-    async def update_session(self, session_id: str, updates: Dict[str, Any]):
+    async def get(self, session_id: str, step_offset: int = 0, step_limit: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        redis = await get_redis()
+        data = await redis.get(f"{self.prefix}{session_id}")
+        if not data:
+            return None
+        session = json.loads(data)
+        steps = session.get("steps", [])
+        session["step_count"] = len(steps)
+        end = None if step_limit is None else step_offset + step_limit
+        session["steps"] = steps[step_offset:end]
+        return session
+
+    async def update(self, session_id: str, updates: Dict[str, Any]):
         redis = await get_redis()
         # Optimistic locking or simple update? For now, simple get-set
         # In prod, use Lua script or watch for atomicity
-        current = await self.get_session(session_id)
+        current = await self.get(session_id)
         if current:
+            current.pop("step_count", None)
             current.update(updates)
             current["updated_at"] = time.time()
-            await redis.setex(
-                f"{self.PREFIX}{session_id}",
-                self.TTL,
-                json.dumps(current)
-            )
+            await redis.setex(f"{self.prefix}{session_id}", self.ttl, json.dumps(current))
 
     async def add_step(self, session_id: str, step_data: Dict[str, Any]):
         redis = await get_redis()
-        current = await self.get_session(session_id)
+        current = await self.get(session_id)
         if current:
+            current.pop("step_count", None)
             if "steps" not in current:
                 current["steps"] = []
             current["steps"].append(step_data)
-            await redis.setex(
-                f"{self.PREFIX}{session_id}",
-                self.TTL,
-                json.dumps(current)
-            )
+            await redis.setex(f"{self.prefix}{session_id}", self.ttl, json.dumps(current))
+
+# Scalar fields are JSON-encoded per hash field so types survive the round trip.
+# Both scripts are no-ops for unknown (expired) sessions, matching the JSON store.
+_UPDATE_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then return 0 end
+redis.call('HSET', KEYS[1], unpack(ARGV, 2))
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+redis.call('EXPIRE', KEYS[2], ARGV[1])
+return 1
+"""
+
+_APPEND_STEP_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then return -1 end
+local n = redis.call('RPUSH', KEYS[2], ARGV[2])
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+redis.call('EXPIRE', KEYS[2], ARGV[1])
+return n
+"""
+
+class HashSessionStore:
+    """
+    Scalar fields live in a Redis hash (`session:{id}`) and steps in a list
+    (`session:{id}:steps`). Updates touch only the changed fields and a step
+    append is a single RPUSH, both done atomically in a Lua script, so write
+    cost no longer grows with the session and concurrent writers cannot lose
+    each other's updates. Step reads are paginated with LRANGE.
+
+    Sessions still stored as a JSON string (JsonSessionStore) are converted in
+    place the first time a command hits WRONGTYPE on them.
+    """
+
+    def __init__(self, prefix: str, ttl: int):
+        self.prefix = prefix
+        self.ttl = ttl
+        self._client = None
+        self._scripts = {}
+
+    def _keys(self, session_id: str) -> List[str]:
+        return [f"{self.prefix}{session_id}", f"{self.prefix}{session_id}:steps"]
+
+    def _script(self, redis, source: str):
+        """The script registered once per client; calls then go out as EVALSHA."""
+        if redis is not self._client:
+            self._client = redis
+            self._scripts = {script: redis.register_script(script) for script in (_UPDATE_SCRIPT, _APPEND_STEP_SCRIPT)}
+        return self._scripts[source]
+
+    async def create(self, session_id: str, initial_state: Dict[str, Any]):
+        redis = await get_redis()
+        fields = {k: json.dumps(v) for k, v in initial_state.items() if k != "steps"}
+        key, steps_key = self._keys(session_id)
+        async with redis.pipeline(transaction=True) as pipe:
+            pipe.hset(key, mapping=fields)
+            pipe.expire(key, self.ttl)
+            for step in initial_state.get("steps", []):
+                pipe.rpush(steps_key, json.dumps(step))
+            pipe.expire(steps_key, self.ttl)
+            await pipe.execute()
+
+    async def create_many(self, states: List[Dict[str, Any]], ttl: int):
+        redis = await get_redis()
+        async with redis.pipeline(transaction=False) as pipe:
+            for state in states:
+                key = self._keys(state["session_id"])[0]
+                pipe.hset(key, mapping={k: json.dumps(v) for k, v in state.items() if k != "steps"})
+                pipe.expire(key, ttl)
+            await pipe.execute()
+
+    async def get(self, session_id: str, step_offset: int = 0, step_limit: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        return await self._converting_legacy(session_id, self._get, session_id, step_offset, step_limit)
+
+    async def _get(self, session_id: str, step_offset: int, step_limit: Optional[int]) -> Optional[Dict[str, Any]]:
+        redis = await get_redis()
+        key, steps_key = self._keys(session_id)
+        end = -1 if step_limit is None else step_offset + step_limit - 1
+        async with redis.pipeline(transaction=True) as pipe:
+            pipe.hgetall(key)
+            pipe.llen(steps_key)
+            if step_limit != 0:  # metadata-only reads skip the step list
+                pipe.lrange(steps_key, step_offset, end)
+            fields, step_count, *steps = await pipe.execute()
+        if not fields:
+            return None
+        session = {k: json.loads(v) for k, v in fields.items()}
+        session["steps"] = [json.loads(s) for s in steps[0]] if steps else []
+        session["step_count"] = step_count
+        return session
+
+    async def update(self, session_id: str, updates: Dict[str, Any]):
+        redis = await get_redis()
+        updates = {**updates, "updated_at": time.time()}
+        args = [self.ttl]
+        for k, v in updates.items():
+            if k == "steps":
+                continue
+            args += [k, json.dumps(v)]
+        await self._converting_legacy(session_id, self._script(redis, _UPDATE_SCRIPT),
+                                      keys=self._keys(session_id), args=args)
+
+    async def add_step(self, session_id: str, step_data: Dict[str, Any]):
+        redis = await get_redis()
+        await self._converting_legacy(session_id, self._script(redis, _APPEND_STEP_SCRIPT),
+                                      keys=self._keys(session_id), args=[self.ttl, json.dumps(step_data)])
+
+    async def _converting_legacy(self, session_id: str, call, *args, **kwargs):
+        try:
+            return await call(*args, **kwargs)
+        except ResponseError as e:
+            if "WRONGTYPE" not in str(e):
+                raise
+        await self._convert_legacy(session_id)
+        return await call(*args, **kwargs)
+
+    async def _convert_legacy(self, session_id: str):
+        """Rewrite a JSON-string session as hash + step list, keeping its remaining TTL."""
+        redis = await get_redis()
+        key, steps_key = self._keys(session_id)
+        async with redis.pipeline(transaction=True) as pipe:
+            try:
+                await pipe.watch(key)
+                if await pipe.type(key) != "string":
+                    return  # converted by another process meanwhile
+                session = json.loads(await pipe.get(key))
+                ttl = await pipe.ttl(key)
+                pipe.multi()
+                pipe.delete(key, steps_key)
+                pipe.hset(key, mapping={k: json.dumps(v) for k, v in session.items() if k not in ("steps", "step_count")})
+                for step in session.get("steps", []):
+                    pipe.rpush(steps_key, json.dumps(step))
+                pipe.expire(key, ttl if ttl > 0 else self.ttl)
+                pipe.expire(steps_key, ttl if ttl > 0 else self.ttl)
+                await pipe.execute()
+            except WatchError:
+                return  # someone else wrote the key; the retry sees their version
+
+class SessionManager:
+    PREFIX = "session:"
+    SNAPSHOT_PREFIX = "session_snapshot:"
+    CHECKPOINT_PREFIX = "session_checkpoint:"
+    TTL = 3600  # 1 hour expiration
+
+    STORES = {"json": JsonSessionStore, "hash": HashSessionStore}
+
+    def __init__(self, backend: str = None):
+        # All API and worker processes must use the same backend (SESSION_STORE_BACKEND).
+        self.backend = backend
+        self._stores = {}
+
+    @property
+    def store(self):
+        backend = (self.backend or settings.SESSION_STORE_BACKEND).lower()
+        if backend not in self._stores:
+            self._stores[backend] = self.STORES[backend](self.PREFIX, self.TTL)
+        return self._stores[backend]
+
+    def _initial_state(self, options: Optional[Dict[str, Any]] = None, **fields) -> Dict[str, Any]:
+        return {
+            "session_id": str(uuid.uuid4()),
+            "created_at": time.time(),
+            "status": "ready",
+            "steps": [],
+            "memory": {},
+            "options": options or {},
+            **fields
+        }
+
+    async def create_session(self, options: Optional[Dict[str, Any]] = None) -> str:
+        initial_state = self._initial_state(options)
+        await self.store.create(initial_state["session_id"], initial_state)
+        audit_log.record(initial_state["session_id"], "created", tenant="default", options=initial_state["options"])
+        return initial_state["session_id"]
+
+    async def create_sessions(self, count: int, options: Optional[Dict[str, Any]] = None, ttl: int = None,
+                              chunk_size: int = 1000, **fields) -> List[str]:
+        """Create `count` sessions in pipelined round trips; `ttl` covers time spent queued."""
+        states = [self._initial_state(options, **fields) for _ in range(count)]
+        for i in range(0, count, chunk_size):
+            await self.store.create_many(states[i:i + chunk_size], ttl or self.TTL)
+        for state in states:
+            audit_log.record(state["session_id"], "created", tenant=state.get("tenant") or "default",
+                             options=state["options"], batch_id=state.get("batch_id"))
+        return [state["session_id"] for state in states]
+
+    async def get_session(self, session_id: str, step_offset: int = 0, step_limit: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """Session state with `steps[step_offset:step_offset + step_limit]` and the total `step_count`."""
+        return await self.store.get(session_id, step_offset, step_limit)
+
+    async def update_session(self, session_id: str, updates: Dict[str, Any]):
+        with tracer.span("session.update", session_id=session_id, fields=",".join(updates)):
+            await self.store.update(session_id, updates)
+        if "status" in updates:
+            audit_log.record(session_id, "status", **{k: v for k, v in updates.items() if k in AUDITED_FIELDS})
+
+    async def add_step(self, session_id: str, step_data: Dict[str, Any]):
+        with tracer.span("session.add_step", session_id=session_id):
+            await self.store.add_step(session_id, step_data)
+        audit_log.record(session_id, "step", step=_audited_step(step_data))
+
+    # Snapshots hold what a worker needs to rebuild a released session:
+    # browser storage state, URL and planner history.
+    async def save_snapshot(self, session_id: str, snapshot: Dict[str, Any]):
+        await self._save_state(self.SNAPSHOT_PREFIX, session_id, snapshot)
+
+    async def load_snapshot(self, session_id: str) -> Optional[Dict[str, Any]]:
+        return await self._load_state(self.SNAPSHOT_PREFIX, session_id)
+
+    async def delete_snapshot(self, session_id: str):
+        await self._delete_state(self.SNAPSHOT_PREFIX, session_id)
+
+    # Checkpoints are the same kind of state (plus the step counter), written while a
+    # session runs so that another worker can continue it if this one dies.
+    async def save_checkpoint(self, session_id: str, checkpoint: Dict[str, Any]) -> int:
+        return await self._save_state(self.CHECKPOINT_PREFIX, session_id, checkpoint)
+
+    async def load_checkpoint(self, session_id: str) -> Optional[Dict[str, Any]]:
+        return await self._load_state(self.CHECKPOINT_PREFIX, session_id)
+
+    async def delete_checkpoint(self, session_id: str):
+        await self._delete_state(self.CHECKPOINT_PREFIX, session_id)
+
+    async def _save_state(self, prefix: str, session_id: str, state: Dict[str, Any]) -> int:
+        redis = await get_redis()
+        data = json.dumps(state)
+        await redis.setex(f"{prefix}{session_id}", self.TTL, data)
+        return len(data)
+
+    async def _load_state(self, prefix: str, session_id: str) -> Optional[Dict[str, Any]]:
+        redis = await get_redis()
+        data = await redis.get(f"{prefix}{session_id}")
+        return json.loads(data) if data else None
+
+    async def _delete_state(self, prefix: str, session_id: str):
+        redis = await get_redis()
+        await redis.delete(f"{prefix}{session_id}")
 
 session_manager = SessionManager()
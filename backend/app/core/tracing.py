@@ -0,0 +1,247 @@
+import os
+import re
+import json
+import time
+import queue
+import atexit
+import random
+import threading
+import contextlib
+import contextvars
+from typing import Any, Dict, Iterator, List, Optional
+from app.core.config import settings
+
+# W3C trace context: version-traceid-spanid-flags
+_TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+class Span:
+    """One timed operation. Field names and ids follow the OpenTelemetry data model."""
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], attributes: Dict[str, Any],
+                 start_time: Optional[float] = None, sampled: bool = True):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.attributes = dict(attributes)
+        self.start_ns = int((start_time or time.time()) * 1e9)
+        self.end_ns: Optional[int] = None
+        self.error: Optional[str] = None
+        self.sampled = sampled
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def record_exception(self, e: BaseException):
+        self.error = f"{type(e).__name__}: {e}"
+
+    def to_otlp(self) -> Dict[str, Any]:
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 1,  # INTERNAL
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns or time.time_ns()),
+            "attributes": [_otlp_attribute(k, v) for k, v in self.attributes.items() if v is not None],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+def _otlp_attribute(key: str, value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+def parse_traceparent(value: Optional[str]) -> Optional[Dict[str, Any]]:
+    match = _TRACEPARENT.match(value or "")
+    if not match:
+        return None
+    return {"trace_id": match.group(1), "span_id": match.group(2), "sampled": match.group(3) == "01"}
+
+def otlp_payload(spans: List[Span]) -> Dict[str, Any]:
+    return {"resourceSpans": [{
+        "resource": {"attributes": [_otlp_attribute("service.name", settings.TRACING_SERVICE_NAME),
+                                    _otlp_attribute("process.pid", os.getpid())]},
+        "scopeSpans": [{"scope": {"name": "app.core.tracing"}, "spans": [span.to_otlp() for span in spans]}],
+    }]}
+
+class FileExporter:
+    """One OTLP/JSON document per line (readable by the collector's otlpjsonfile receiver)."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def export(self, spans: List[Span]):
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(otlp_payload(spans)) + "\n")
+
+class OTLPHttpExporter:
+    """OTLP over HTTP with JSON encoding, e.g. http://collector:4318/v1/traces."""
+
+    def __init__(self, endpoint: str):
+        self.endpoint = endpoint.rstrip("/")
+        if not self.endpoint.endswith("/v1/traces"):
+            self.endpoint += "/v1/traces"
+
+    def export(self, spans: List[Span]):
+        import httpx
+        httpx.post(self.endpoint, json=otlp_payload(spans), timeout=5.0).raise_for_status()
+
+class Tracer:
+    """
+    Spans for the session path (API -> Celery -> planner/LLM -> tools -> Redis).
+
+    The current span lives in a contextvar, so nested `span()` blocks, including
+    ones in awaited coroutines, become children. Across processes the parent travels
+    as a W3C `traceparent` string (Celery task kwargs). Finished spans are queued and
+    exported in batches from a background thread every TRACING_EXPORT_INTERVAL
+    seconds, so exporting never blocks a step.
+    """
+
+    MAX_QUEUE = 10000
+    BATCH_SIZE = 256
+
+    def __init__(self):
+        self._current: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("current_span", default=None)
+        self._queue: "queue.Queue[Span]" = queue.Queue(maxsize=self.MAX_QUEUE)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._export_lock = threading.Lock()
+        self.exporter = None
+        self.dropped = 0
+
+    @property
+    def enabled(self) -> bool:
+        return settings.TRACING_ENABLED
+
+    def current(self) -> Optional[Span]:
+        return self._current.get()
+
+    def traceparent(self) -> Optional[str]:
+        span = self._current.get()
+        return span.traceparent if span else None
+
+    @contextlib.contextmanager
+    def span(self, name: str, traceparent: Optional[str] = None, start_time: Optional[float] = None,
+             **attributes) -> Iterator[Optional[Span]]:
+        """Time a block as a child of the current span (or of `traceparent`). Yields None when tracing is off."""
+        if not self.enabled:
+            yield None
+            return
+        span = self.start_span(name, traceparent=traceparent, start_time=start_time, **attributes)
+        token = self._current.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.record_exception(e)
+            raise
+        finally:
+            self._current.reset(token)
+            self.end_span(span)
+
+    def start_span(self, name: str, traceparent: Optional[str] = None, start_time: Optional[float] = None,
+                   **attributes) -> Span:
+        parent = self._current.get()
+        remote = parse_traceparent(traceparent) if traceparent else None
+        if remote:
+            trace_id, parent_id, sampled = remote["trace_id"], remote["span_id"], remote["sampled"]
+        elif parent:
+            trace_id, parent_id, sampled = parent.trace_id, parent.span_id, parent.sampled
+        else:
+            trace_id, parent_id = f"{random.getrandbits(128):032x}", None
+            sampled = random.random() < settings.TRACING_SAMPLE_RATE
+        return Span(name, trace_id, parent_id, attributes, start_time=start_time, sampled=sampled)
+
+    def end_span(self, span: Span, end_time: Optional[float] = None):
+        span.end_ns = int(end_time * 1e9) if end_time else time.time_ns()
+        if not span.sampled:
+            return
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            self.dropped += 1
+
+    def record(self, name: str, start_time: float, end_time: float, traceparent: Optional[str] = None, **attributes):
+        """Add a span for an interval that already passed (e.g. time spent in the Celery queue)."""
+        if not self.enabled:
+            return
+        span = self.start_span(name, traceparent=traceparent, start_time=start_time, **attributes)
+        self.end_span(span, end_time=end_time)
+
+    def _build_exporter(self):
+        if settings.TRACING_EXPORTER == "otlp":
+            return OTLPHttpExporter(settings.OTLP_ENDPOINT)
+        if settings.TRACING_EXPORTER == "file":
+            return FileExporter(settings.TRACING_FILE)
+        return None
+
+    def _ensure_worker(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                if self.exporter is None:
+                    self.exporter = self._build_exporter()
+                self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+                self._thread.start()
+                atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            time.sleep(settings.TRACING_EXPORT_INTERVAL)
+            self.flush()
+
+    def flush(self):
+        """Export everything queued so far; returns once it has been handed to the exporter."""
+        with self._export_lock:
+            while True:
+                batch = []
+                while len(batch) < self.BATCH_SIZE:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                if not batch:
+                    return
+                if self.exporter is None:
+                    self.exporter = self._build_exporter()
+                self._export(batch)
+
+    def _export(self, batch: List[Span]):
+        if self.exporter is None:
+            return
+        try:
+            self.exporter.export(batch)
+        except Exception as e:
+            from app.core.logger import logger
+            logger.warning("trace_export_failed", spans=len(batch), error=str(e))
+
+def task_kwargs() -> Dict[str, Any]:
+    """Trace context for a Celery task: the caller's traceparent and the enqueue time (for the queue-wait span)."""
+    return {"traceparent": tracer.traceparent(), "enqueued_at": time.time()}
+
+def add_trace_context(logger, method_name: str, event_dict: Dict[str, Any]) -> Dict[str, Any]:
+    """structlog processor: tag log lines written inside a span with its trace and span ids."""
+    span = tracer.current()
+    if span is not None:
+        event_dict.setdefault("trace_id", span.trace_id)
+        event_dict.setdefault("span_id", span.span_id)
+    return event_dict
+
+tracer = Tracer()
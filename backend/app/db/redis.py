@@ -3,17 +3,23 @@ from app.core.config import settings
 
 class RedisClient:
     redis: aioredis.Redis = None
+    binary: aioredis.Redis = None # no response decoding, for raw payloads like live-view frames
 
     def connect(self):
         self.redis = aioredis.from_url(settings.REDIS_URL, decode_responses=True)
+        self.binary = aioredis.from_url(settings.REDIS_URL, decode_responses=False)
         print(f"Connected to Redis at {settings.REDIS_URL}")
 
     async def close(self):
         if self.redis:
             await self.redis.close()
+            await self.binary.close()
             print("Redis connection closed")
 
 redis_client = RedisClient()
 
 async def get_redis():
     return redis_client.redis
+
+async def get_redis_binary():
+    return redis_client.binary
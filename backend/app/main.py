@@ -1,8 +1,13 @@
 from contextlib import asynccontextmanager
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from app.core.config import settings
 from app.db.mongo import db
 from app.db.redis import redis_client
+from app.api.broadcast import broadcaster
+from app.core.scheduler import fair_scheduler
+from app.core import metrics
+from app.core.audit import audit_log
+from app.core.logger import logger
 from app.worker.celery_app import celery_app # Ensure Celery config is loaded
 
 @asynccontextmanager
@@ -10,8 +15,14 @@ async def lifespan(app: FastAPI):
     # Startup
     db.connect()
     redis_client.connect()
+    await broadcaster.start()
+    if settings.SCHEDULER_ENABLED:
+        await fair_scheduler.start()
     yield
     # Shutdown
+    await fair_scheduler.stop()
+    await broadcaster.stop()
+    await audit_log.stop()
     db.close()
     await redis_client.close()
 
@@ -35,6 +46,14 @@ app.add_middleware(
 async def root():
     return {"message": "Enterprise Agentic RPA Platform API", "status": "active"}
 
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    try:
+        await metrics.refresh_queue_depth()
+    except Exception as e:
+        logger.warning("metrics_queue_depth_failed", error=str(e))
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE_LATEST)
+
 # Import and include routers here later
 from app.api.endpoints import router as api_router
 app.include_router(api_router, prefix="/api/v1")
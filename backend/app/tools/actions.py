@@ -1,18 +1,23 @@
 from pydantic import BaseModel, Field
 from typing import Any, Dict, Optional
 from playwright.async_api import Page
-import base64
+from app.core.screenshots import attach_screenshot
+from app.tools.waits import WaitSpec
 
 class ToolResult(BaseModel):
     success: bool
     output: Any
     error: Optional[str] = None
     screenshot_base64: Optional[str] = None
+    screenshot_ref: Optional[str] = None # content hash in the screenshot store
     execution_time: float = 0.0
+    wait_time: float = 0.0 # part of execution_time spent waiting for the page to settle
+    settled: Optional[bool] = None # False when the wait timed out before the page was ready
 
 class BaseTool:
     name: str
     description: str
+    wait: WaitSpec = WaitSpec(navigation=False, timeout_ms=10000) # what to wait for after the action
 
     async def execute(self, page: Page, **kwargs) -> ToolResult:
         raise NotImplementedError
@@ -20,6 +25,8 @@ class BaseTool:
 class OpenUrlTool(BaseTool):
     name = "open_url"
     description = "Navigate to a specific URL"
+    # goto already waits for the document; SPAs then fetch and render their content
+    wait = WaitSpec(navigation=False, network_idle=True, dom_quiet=True, timeout_ms=15000)
 
     async def execute(self, page: Page, url: str) -> ToolResult:
         try:
@@ -31,6 +38,7 @@ class OpenUrlTool(BaseTool):
 class ClickTool(BaseTool):
     name = "click"
     description = "Click an element by selector"
+    wait = WaitSpec(network_idle=True, dom_quiet=True, timeout_ms=5000)
 
     async def execute(self, page: Page, selector: str) -> ToolResult:
         try:
@@ -42,6 +50,8 @@ class ClickTool(BaseTool):
 class TypeTextTool(BaseTool):
     name = "type_text"
     description = "Type text into an element"
+    # autocomplete and validation messages render without a request
+    wait = WaitSpec(navigation=False, dom_quiet=True, timeout_ms=3000)
 
     async def execute(self, page: Page, selector: str, text: str) -> ToolResult:
         try:
@@ -69,8 +79,7 @@ class GetScreenshotTool(BaseTool):
     async def execute(self, page: Page) -> ToolResult:
         try:
             screenshot_bytes = await page.screenshot(type="jpeg", quality=50)
-            b64 = base64.b64encode(screenshot_bytes).decode("utf-8")
-            return ToolResult(success=True, output="Screenshot taken", screenshot_base64=b64)
+            return await attach_screenshot(ToolResult(success=True, output="Screenshot taken"), screenshot_bytes)
         except Exception as e:
             return ToolResult(success=False, output=None, error=str(e))
 
@@ -1,10 +1,35 @@
 import time
+from typing import Any, Dict, List, Optional
 from app.tools.actions import TOOLS, ToolResult
+from app.tools.waits import settle_engine
+from app.tools.prefetch import observation_prefetcher
+from app.core.config import settings
+from app.core.screenshots import attach_screenshot
 from app.core.logger import logger
+from app.core.tracing import tracer
+from app.core.metrics import TOOL_LATENCY
 from playwright.async_api import Page
 
+# How long a batched action's "expect" postconditions may take to hold.
+EXPECT_TIMEOUT_MS = 2000
+
+def _without_fragment(url: str) -> str:
+    return url.split("#", 1)[0]
+
+# Tools that may start while the rest of a streamed plan is still arriving.
+EARLY_DISPATCH_TOOLS = {"open_url", "click", "type_text", "get_page_text", "get_screenshot"}
+
 class ToolExecutor:
     async def execute(self, tool_name: str, page: Page, **kwargs) -> ToolResult:
+        with tracer.span("tool.execute", tool=tool_name) as span:
+            result = await self._execute(tool_name, page, **kwargs)
+            if span:
+                span.set_attribute("success", result.success)
+        TOOL_LATENCY.labels(tool=tool_name if tool_name in TOOLS else "unknown",
+                            success="true" if result.success else "false").observe(result.execution_time)
+        return result
+
+    async def _execute(self, tool_name: str, page: Page, wait: Optional[Dict[str, Any]] = None, **kwargs) -> ToolResult:
         start_time = time.time()
         tool = TOOLS.get(tool_name)
         
@@ -13,15 +38,27 @@ class ToolExecutor:
 
         try:
             logger.info("executing_tool", tool=tool_name, args=kwargs)
-            result = await tool.execute(page, **kwargs)
+            result = await observation_prefetcher.result(tool_name, page, kwargs) if wait is None else None
+            if result is not None:
+                spec = None  # computed while the planner was thinking, for the page as it is now
+            else:
+                spec = settle_engine.spec_for(tool_name, tool.wait, wait) if settings.SMART_WAITS_ENABLED else None
+                mark = settle_engine.mark(page, spec) if spec else None
+                with settle_engine.action_timeout(page, spec):
+                    result = await tool.execute(page, **kwargs)
+            if spec and result.success:
+                outcome = await settle_engine.settle(page, spec, mark)
+                result.wait_time, result.settled = outcome.wait_time, outcome.settled
+                if outcome.error:
+                    result.success, result.error = False, outcome.error
             
             # Auto-screenshot on failure or significant action could be added here
-            if not result.screenshot_base64 and not result.success:
+            if not result.screenshot_base64 and not result.screenshot_ref and not result.success:
                  # Try to take a screenshot on failure
                  try:
-                     import base64
-                     screenshot_bytes = await page.screenshot(type="jpeg", quality=50)
-                     result.screenshot_base64 = base64.b64encode(screenshot_bytes).decode("utf-8")
+                     with tracer.span("screenshot.capture", reason="tool_failure"):
+                         screenshot_bytes = await page.screenshot(type="jpeg", quality=50)
+                         await attach_screenshot(result, screenshot_bytes)
                  except:
                      pass
 
@@ -30,7 +67,93 @@ class ToolExecutor:
             result = ToolResult(success=False, output=None, error=str(e))
         
         result.execution_time = time.time() - start_time
-        logger.info("tool_executed", tool=tool_name, success=result.success, duration=result.execution_time)
+        logger.info("tool_executed", tool=tool_name, success=result.success, duration=result.execution_time,
+                    wait_time=result.wait_time, settled=result.settled)
         return result
 
+    async def execute_batch(self, actions: List[Dict[str, Any]], page: Page) -> ToolResult:
+        """
+        Run a planned list of actions in order as a single step. Stops at the first
+        failed action, unmet `expect` postcondition, or navigation the action did not
+        declare (selectors planned for the old page would no longer apply).
+        `output` lists each executed action's outcome; the rest are counted as skipped.
+        Malformed items and `finish` (which must be a step of its own) stop the batch
+        like a failed action.
+        """
+        start_time = time.time()
+        if not isinstance(actions, list):
+            return ToolResult(success=False, output=None, error=f"actions must be a list, got {type(actions).__name__}",
+                              execution_time=time.time() - start_time)
+        outcomes = []
+        stop_reason = None
+        screenshot_ref = screenshot_base64 = None
+        planned = actions[:settings.PLANNER_MAX_ACTIONS]
+
+        for i, item in enumerate(planned):
+            invalid = _invalid_batch_item(item)
+            if invalid:
+                name = item.get("action") if isinstance(item, dict) else None
+                outcomes.append({"action": name, "success": False, "output": None, "error": invalid})
+                stop_reason = f"action {i + 1} ({name}) failed: {invalid}"
+                break
+            name = item.get("action")
+            expect = item.get("expect") or {}
+            url_before = _without_fragment(page.url)
+
+            result = await self.execute(name, page, **(item.get("args") or {}))
+            outcome = {"action": name, "success": result.success, "output": result.output, "error": result.error}
+            if result.success and expect:
+                unmet = await self._check_expectations(page, expect)
+                if unmet:
+                    outcome.update(success=False, error=unmet)
+            outcomes.append(outcome)
+
+            if not outcome["success"]:
+                stop_reason = f"action {i + 1} ({name}) failed: {outcome['error']}"
+                screenshot_ref, screenshot_base64 = result.screenshot_ref, result.screenshot_base64
+                break
+            navigation_expected = name == "open_url" or expect.get("navigation") or "url_contains" in expect
+            if i < len(planned) - 1 and not navigation_expected and _without_fragment(page.url) != url_before:
+                stop_reason = f"action {i + 1} ({name}) navigated to {page.url}"
+                break
+
+        skipped = len(actions) - len(outcomes)
+        if stop_reason is None and len(actions) > len(planned):
+            stop_reason = f"batch limited to {len(planned)} actions"
+        error = f"Stopped after {stop_reason}; {skipped} action(s) skipped" if stop_reason else None
+        logger.info("batch_executed", actions=len(actions), executed=len(outcomes), skipped=skipped, error=error)
+        return ToolResult(
+            success=all(o["success"] for o in outcomes) and skipped == 0,
+            output=outcomes,
+            error=error,
+            screenshot_ref=screenshot_ref,
+            screenshot_base64=screenshot_base64,
+            execution_time=time.time() - start_time,
+        )
+
+    async def _check_expectations(self, page: Page, expect: Dict[str, Any]) -> Optional[str]:
+        """Returns a description of the first unmet postcondition, or None."""
+        try:
+            if "url_contains" in expect:
+                await page.wait_for_url(lambda url: expect["url_contains"] in url, timeout=EXPECT_TIMEOUT_MS)
+            if "selector" in expect:
+                await page.wait_for_selector(expect["selector"], state="visible", timeout=EXPECT_TIMEOUT_MS)
+            if "text" in expect:
+                await page.get_by_text(expect["text"]).first.wait_for(state="visible", timeout=EXPECT_TIMEOUT_MS)
+        except Exception as e:
+            return f"Expectation {expect} not met: {str(e).splitlines()[0]}"
+        return None
+
+def _invalid_batch_item(item: Any) -> Optional[str]:
+    """Why a planned batch item cannot run, or None."""
+    if not isinstance(item, dict):
+        return f"expected an object with action and args, got {type(item).__name__}"
+    if not isinstance(item.get("action"), str):
+        return "missing action name"
+    if item["action"] == "finish":
+        return "finish cannot be part of a batch"
+    if not isinstance(item.get("args") or {}, dict) or not isinstance(item.get("expect") or {}, dict):
+        return "args and expect must be objects"
+    return None
+
 tool_executor = ToolExecutor()
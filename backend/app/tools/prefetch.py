@@ -0,0 +1,105 @@
+import time
+import asyncio
+import weakref
+from typing import Any, Dict, Optional
+from playwright.async_api import Page
+from app.browser.observation import VERSION_SCRIPT
+from app.core.config import settings
+from app.core.logger import logger
+from app.core.screenshots import attach_screenshot
+from app.tools.actions import TOOLS, ToolResult
+
+# Read-only tools whose results can be computed ahead of time.
+PREFETCH_TOOLS = {"get_page_text", "get_screenshot"}
+
+class Prefetched:
+    def __init__(self, version: str, text: Optional[ToolResult], screenshot: Optional[bytes]):
+        self.version = version
+        self.text = text
+        self.screenshot = screenshot
+        self.created_at = time.monotonic()
+
+class ObservationPrefetcher:
+    """
+    Computes read-only tool results while the planner waits for the LLM, so a
+    following get_page_text or get_screenshot returns without touching the page.
+
+    Results are tagged with the page version: URL, document id, DOM epoch (the
+    PageObserver's MutationObserver counter, bumped by mutations and input events)
+    and readyState. A lookup re-reads the version, one small evaluate, and misses if
+    anything changed. Captures whose version moved while they ran are discarded.
+    """
+
+    def __init__(self):
+        self._entries: "weakref.WeakKeyDictionary[Page, Prefetched]" = weakref.WeakKeyDictionary()
+        self._tasks: "weakref.WeakKeyDictionary[Page, asyncio.Task]" = weakref.WeakKeyDictionary()
+        self.stats = {"prefetched": 0, "discarded": 0, "hits": 0, "misses": 0}
+
+    async def version(self, page: Page) -> Optional[str]:
+        try:
+            state = await page.evaluate(VERSION_SCRIPT)
+        except Exception:
+            return None
+        if not isinstance(state, dict):
+            return None
+        return f"{page.url}|{state.get('doc')}|{state.get('epoch')}|{state.get('ready')}"
+
+    def start(self, page: Page):
+        """Begin prefetching for the page as it is now (call right before planning)."""
+        if not settings.PREFETCH_ENABLED:
+            return
+        self.cancel(page)
+        self._tasks[page] = asyncio.create_task(self._prefetch(page))
+
+    def cancel(self, page: Page):
+        """Stop an unfinished prefetch, e.g. because the planned action changes the page."""
+        task = self._tasks.pop(page, None)
+        if task is not None and not task.done():
+            task.cancel()
+
+    async def _prefetch(self, page: Page):
+        version = await self.version(page)
+        if version is None:
+            return
+        entry = self._entries.get(page)
+        if entry is not None and entry.version == version:
+            return  # still current from an earlier step
+        try:
+            text = await TOOLS["get_page_text"].execute(page)
+            screenshot = None
+            if settings.PREFETCH_SCREENSHOT:
+                screenshot = await page.screenshot(type="jpeg", quality=50)
+        except Exception as e:
+            logger.debug("prefetch_failed", error=str(e))
+            return
+        if await self.version(page) != version:
+            self.stats["discarded"] += 1
+            return
+        self._entries[page] = Prefetched(version, text if text.success else None, screenshot)
+        self.stats["prefetched"] += 1
+
+    async def result(self, tool_name: str, page: Page, args: Dict[str, Any]) -> Optional[ToolResult]:
+        """The prefetched result for this call if the page has not changed since, else None."""
+        if tool_name not in PREFETCH_TOOLS or args or not settings.PREFETCH_ENABLED:
+            return None
+        task = self._tasks.get(page)
+        if task is not None and not task.done():
+            # Already running against the current page: finishing it beats starting over
+            await asyncio.wait([task])
+        entry = self._entries.get(page)
+        if entry is None or await self.version(page) != entry.version:
+            self.stats["misses"] += 1
+            return None
+
+        if tool_name == "get_page_text" and entry.text is not None:
+            result = entry.text.model_copy()
+        elif tool_name == "get_screenshot" and entry.screenshot is not None:
+            result = await attach_screenshot(ToolResult(success=True, output="Screenshot taken"), entry.screenshot)
+        else:
+            self.stats["misses"] += 1
+            return None
+        self.stats["hits"] += 1
+        logger.info("prefetch_hit", tool=tool_name, age=round(time.monotonic() - entry.created_at, 3))
+        return result
+
+observation_prefetcher = ObservationPrefetcher()
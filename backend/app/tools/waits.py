@@ -0,0 +1,229 @@
+import time
+import asyncio
+import weakref
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+from pydantic import BaseModel
+from playwright.async_api import Page
+from app.core.config import settings
+from app.core.logger import logger
+from app.core.tracing import tracer
+
+# Resolves once no DOM mutation has been seen for quietMs (or after timeoutMs).
+DOM_QUIET_SCRIPT = """
+({quietMs, timeoutMs}) => new Promise(resolve => {
+  const start = performance.now();
+  let last = start, mutations = 0;
+  const observer = new MutationObserver(records => { mutations += records.length; last = performance.now(); });
+  observer.observe(document, {subtree: true, childList: true, attributes: true, characterData: true});
+  const check = () => {
+    const now = performance.now();
+    if (now - last >= quietMs || now - start >= timeoutMs) {
+      observer.disconnect();
+      resolve({settled: now - last >= quietMs, mutations});
+    } else {
+      setTimeout(check, Math.max(10, Math.min(quietMs - (now - last), timeoutMs - (now - start))));
+    }
+  };
+  setTimeout(check, quietMs);
+})
+"""
+
+# Long-lived connections never finish and would keep the page from ever going idle.
+LONG_LIVED_RESOURCES = {"websocket", "eventsource"}
+POLL_INTERVAL = 0.05
+# Playwright's implicit timeout for page calls, which nothing else in the app changes.
+PLAYWRIGHT_DEFAULT_TIMEOUT_MS = 30000
+
+class WaitSpec(BaseModel):
+    """
+    What a tool expects to happen after it runs. `navigation`: True waits for one,
+    None waits for the new document only if one started, False ignores it. A
+    `selector` that never becomes visible fails the tool; the other conditions are
+    best effort and give up at the timeout.
+    """
+    navigation: Optional[bool] = None
+    network_idle: bool = False
+    dom_quiet: bool = False
+    selector: Optional[str] = None
+    max_inflight: Optional[int] = None  # defaults to WAIT_NETWORK_MAX_INFLIGHT
+    timeout_ms: int = 5000  # for the action itself and for settling after it
+
+class NetworkMonitor:
+    """Counts a page's in-flight requests and main-frame navigations from Playwright events."""
+
+    def __init__(self, page: Page):
+        self.page = page
+        self.inflight = set()
+        self.navigations = 0
+        self._changes = deque(maxlen=512)  # (time, in-flight count after the change)
+        page.on("request", self._started)
+        page.on("requestfinished", self._finished)
+        page.on("requestfailed", self._finished)
+        page.on("framenavigated", self._navigated)
+
+    def _started(self, request):
+        if request.resource_type not in LONG_LIVED_RESOURCES:
+            self.inflight.add(request)
+            self._changes.append((time.monotonic(), len(self.inflight)))
+
+    def _finished(self, request):
+        if request in self.inflight:
+            self.inflight.discard(request)
+            self._changes.append((time.monotonic(), len(self.inflight)))
+
+    def _navigated(self, frame):
+        if frame == self.page.main_frame:
+            self.navigations += 1
+
+    def idle_for(self, max_inflight: int, since: float) -> float:
+        """Seconds, counted from `since`, that at most `max_inflight` requests have been pending."""
+        now = time.monotonic()
+        if len(self.inflight) > max_inflight:
+            return 0.0
+        idle_since, later = since, now
+        for changed_at, count in reversed(self._changes):
+            if changed_at <= since:
+                break
+            if count > max_inflight:
+                idle_since = later  # the next change brought the count back down
+                break
+            later = changed_at
+        return now - idle_since
+
+class Mark:
+    """Page state just before a tool runs; settling compares against it."""
+
+    def __init__(self, page: Page, monitor: NetworkMonitor):
+        self.url = page.url.split("#", 1)[0]
+        self.navigations = monitor.navigations
+        self.started = time.monotonic()
+
+    def navigated(self, page: Page, monitor: NetworkMonitor) -> bool:
+        return monitor.navigations != self.navigations or page.url.split("#", 1)[0] != self.url
+
+class WaitOutcome(BaseModel):
+    settled: bool = True
+    wait_time: float = 0.0
+    error: Optional[str] = None
+
+class SettleEngine:
+    """
+    Replaces fixed load-state waits and Playwright's implicit timeouts: after an
+    action, wait for exactly the outcomes its WaitSpec declares and return as soon
+    as they hold. Conditions run concurrently within one deadline.
+    """
+
+    def __init__(self):
+        self._monitors: "weakref.WeakKeyDictionary[Page, NetworkMonitor]" = weakref.WeakKeyDictionary()
+
+    def monitor(self, page: Page) -> NetworkMonitor:
+        monitor = self._monitors.get(page)
+        if monitor is None:
+            monitor = self._monitors[page] = NetworkMonitor(page)
+        return monitor
+
+    def spec_for(self, tool_name: str, default: WaitSpec, override: Optional[Dict[str, Any]] = None) -> WaitSpec:
+        """The tool's declared spec, with the TOOL_TIMEOUTS_MS entry and per-call `wait` overrides applied."""
+        values = default.model_dump()
+        if tool_name in settings.TOOL_TIMEOUTS_MS:
+            values["timeout_ms"] = settings.TOOL_TIMEOUTS_MS[tool_name]
+        values.update(override or {})
+        return WaitSpec.model_validate(values)
+
+    def mark(self, page: Page, spec: WaitSpec) -> Mark:
+        return Mark(page, self.monitor(page))
+
+    @contextmanager
+    def action_timeout(self, page: Page, spec: Optional[WaitSpec]):
+        """
+        The spec's timeout for the tool's own Playwright calls, which use the page
+        default. The default is put back afterwards so later calls on the page
+        (observations, screenshots, other tools) are not bound by this tool's timeout.
+        """
+        if spec is None:
+            yield
+            return
+        page.set_default_timeout(spec.timeout_ms)
+        try:
+            yield
+        finally:
+            page.set_default_timeout(PLAYWRIGHT_DEFAULT_TIMEOUT_MS)
+
+    async def settle(self, page: Page, spec: WaitSpec, mark: Mark) -> WaitOutcome:
+        start = time.monotonic()
+        deadline = mark.started + spec.timeout_ms / 1000
+        monitor = self.monitor(page)
+        with tracer.span("tool.settle") as span:
+            settled, error = True, None
+            if spec.navigation or (spec.navigation is None and mark.navigated(page, monitor)):
+                settled = await self._navigation(page, mark, monitor, deadline)
+            if spec.selector:
+                error = await self._selector(page, spec.selector, deadline)
+            conditions = []
+            if spec.network_idle and error is None:
+                conditions.append(self._network_idle(monitor, spec, mark, deadline))
+            if spec.dom_quiet and error is None:
+                conditions.append(self._dom_quiet(page, deadline))
+            if conditions:
+                settled = all(await asyncio.gather(*conditions)) and settled
+            outcome = WaitOutcome(settled=settled and error is None, wait_time=time.monotonic() - start, error=error)
+            if span:
+                span.set_attribute("settled", outcome.settled)
+        return outcome
+
+    async def _navigation(self, page: Page, mark: Mark, monitor: NetworkMonitor, deadline: float) -> bool:
+        while not mark.navigated(page, monitor):
+            if time.monotonic() >= deadline:
+                return False
+            await asyncio.sleep(POLL_INTERVAL)
+        try:
+            await page.wait_for_load_state("domcontentloaded", timeout=_remaining_ms(deadline))
+            return True
+        except Exception as e:
+            logger.debug("settle_navigation_incomplete", error=str(e))
+            return False
+
+    async def _selector(self, page: Page, selector: str, deadline: float) -> Optional[str]:
+        try:
+            await page.wait_for_selector(selector, state="visible", timeout=_remaining_ms(deadline))
+            return None
+        except Exception as e:
+            return f"Waited for {selector} but it did not become visible: {str(e).splitlines()[0]}"
+
+    async def _network_idle(self, monitor: NetworkMonitor, spec: WaitSpec, mark: Mark, deadline: float) -> bool:
+        max_inflight = settings.WAIT_NETWORK_MAX_INFLIGHT if spec.max_inflight is None else spec.max_inflight
+        window = settings.WAIT_NETWORK_IDLE_MS / 1000
+        while True:
+            idle = monitor.idle_for(max_inflight, since=mark.started)
+            if idle >= window:
+                return True
+            now = time.monotonic()
+            if now >= deadline:
+                return False
+            await asyncio.sleep(min(max(window - idle, POLL_INTERVAL), deadline - now))
+
+    async def _dom_quiet(self, page: Page, deadline: float) -> bool:
+        while True:
+            if time.monotonic() >= deadline:
+                return False
+            timeout_ms = _remaining_ms(deadline)
+            try:
+                result = await page.evaluate(DOM_QUIET_SCRIPT, {"quietMs": settings.WAIT_DOM_QUIET_MS,
+                                                                "timeoutMs": timeout_ms})
+                return not isinstance(result, dict) or bool(result.get("settled"))
+            except Exception as e:
+                # The document was replaced mid-wait; watch the new one once it has parsed.
+                logger.debug("settle_dom_context_lost", error=str(e))
+                try:
+                    await page.wait_for_load_state("domcontentloaded", timeout=_remaining_ms(deadline))
+                except Exception:
+                    return False
+
+def _remaining_ms(deadline: float) -> int:
+    # At least 1 ms once the budget is spent: Playwright reads timeout=0 as "wait forever",
+    # and 1 ms still checks a condition that already holds.
+    return max(1, int(1000 * (deadline - time.monotonic())))
+
+settle_engine = SettleEngine()
@@ -14,13 +14,27 @@ celery_app.conf.update(
     result_serializer="json",
     timezone="UTC",
     enable_utc=True,
+    # Batch priorities map to the high/celery/low queues (app/core/scheduler.py); with
+    # the "priority" strategy a worker consuming several always drains them in -Q order.
+    broker_transport_options={"queue_order_strategy": "priority"},
 )
 
-# Auto-discover tasks in the worker module
+if settings.WORKER_MODE == "async":
+    # Many sessions per process: Celery threads only park on the shared event loop
+    # (app/worker/runtime.py), so the pool size is the per-process session cap.
+    # Late acks + prefetch of 1 keep unstarted tasks in the broker, where another
+    # worker with free slots can pick them up.
+    celery_app.conf.update(
+        worker_pool="threads",
+        worker_concurrency=settings.WORKER_MAX_SESSIONS,
+        worker_prefetch_multiplier=1,
+        task_acks_late=True,
+    )
+
 # Auto-discover tasks in the worker module
 celery_app.autodiscover_tasks(["app.worker"])
 
-from celery.signals import worker_process_init
+from celery.signals import worker_process_init, worker_process_shutdown, worker_init, worker_shutdown
 from app.db.mongo import db
 from app.db.redis import redis_client
 import asyncio
@@ -38,3 +52,32 @@ def init_worker_process(**kwargs):
     # The actual connection is lazy, so creating the object is enough.
     redis_client.connect()
     print("Worker database connections initialized.")
+
+@worker_process_shutdown.connect
+def shutdown_worker_process(**kwargs):
+    from app.worker.runtime import worker_runtime
+    from app.core.metrics import mark_process_dead
+    from app.core.audit import audit_log
+    worker_runtime.stop()
+    # Unwritten audit events go to the spill directory; the next process writes them
+    audit_log.spill_buffer()
+    mark_process_dead(os.getpid())
+
+@worker_init.connect
+def init_async_worker(**kwargs):
+    # Prometheus exporter in the main process; prefork children report through PROMETHEUS_MULTIPROC_DIR.
+    from app.core.metrics import start_worker_exporter
+    start_worker_exporter()
+    # The threads pool runs in the main process, so worker_process_init never fires.
+    if settings.WORKER_MODE == "async":
+        init_worker_process()
+        from app.worker.runtime import worker_runtime
+        from app.browser.context import browser_manager
+        worker_runtime.start()
+        # Launch Chromium (and pre-warm the context pool) before the first task arrives.
+        worker_runtime.submit(browser_manager.warm_up())
+
+@worker_shutdown.connect
+def shutdown_async_worker(**kwargs):
+    if settings.WORKER_MODE == "async":
+        shutdown_worker_process()
@@ -0,0 +1,78 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, Coroutine, Optional
+from app.core.config import settings
+from app.core.logger import logger
+
+class AsyncWorkerRuntime:
+    """
+    One long-lived event loop per worker process, running in a daemon thread.
+
+    Celery threads hand their sessions to this loop instead of creating a loop each,
+    so every session in the process shares the same Playwright driver and Chromium.
+    At most `max_sessions` sessions run at once; callers beyond that block in
+    `run()` until a slot frees up, which keeps the Celery pool from reserving more
+    tasks than the process can actually drive (see `worker_prefetch_multiplier`).
+    """
+
+    def __init__(self, max_sessions: int = None):
+        self.max_sessions = max_sessions or settings.WORKER_MAX_SESSIONS
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._slots = threading.BoundedSemaphore(self.max_sessions)
+        self._lock = threading.Lock()
+        self.active_sessions = 0
+
+    def start(self):
+        with self._lock:
+            if self.loop and self.loop.is_running():
+                return
+            self.loop = asyncio.new_event_loop()
+            ready = threading.Event()
+
+            def _run():
+                asyncio.set_event_loop(self.loop)
+                self.loop.call_soon(ready.set)
+                self.loop.run_forever()
+
+            self._thread = threading.Thread(target=_run, name="rpa-session-loop", daemon=True)
+            self._thread.start()
+            ready.wait()
+            logger.info("worker_runtime_started", max_sessions=self.max_sessions)
+
+    def submit(self, coro: Coroutine) -> Future:
+        """Schedule a coroutine on the shared loop without waiting for a session slot."""
+        if not self.loop or not self.loop.is_running():
+            self.start()
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro: Coroutine, timeout: float = None) -> Any:
+        """Block the calling (Celery) thread until a session slot is free and the coroutine finishes."""
+        if not self._slots.acquire(timeout=timeout):
+            coro.close()
+            raise TimeoutError("No free session slot in worker runtime")
+        with self._lock:
+            self.active_sessions += 1
+        try:
+            return self.submit(coro).result()
+        finally:
+            with self._lock:
+                self.active_sessions -= 1
+            self._slots.release()
+
+    def stop(self, timeout: float = 10.0):
+        if not self.loop:
+            return
+        from app.browser.context import browser_manager
+        try:
+            self.submit(browser_manager.close()).result(timeout=timeout)
+        except Exception as e:
+            logger.error("worker_runtime_browser_close_failed", error=str(e))
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        if self._thread:
+            self._thread.join(timeout=timeout)
+        self.loop = None
+        logger.info("worker_runtime_stopped")
+
+worker_runtime = AsyncWorkerRuntime()
@@ -1,11 +1,58 @@
+import time
 import asyncio
 from celery import shared_task
 from app.agents.orchestrator import agent_orchestrator
+from app.core.audit import audit_log
+from app.core.batches import batch_manager
+from app.core.config import settings
 from app.core.logger import logger
+from app.core.tracing import tracer, task_kwargs
+from app.worker.runtime import worker_runtime
 
-@shared_task(bind=True, name="app.worker.run_agent_task")
-def run_agent_task(self, session_id: str, task_description: str):
-    logger.info("worker_received_task", session_id=session_id)
+async def _run_session(session_id: str, task_description: str, resume: bool, batch_id: str,
+                       traceparent: str = None, enqueued_at: float = None):
+    if enqueued_at:
+        # From .delay() to a free session slot: broker queue plus any wait for the worker runtime
+        tracer.record("celery.queue_wait", enqueued_at, time.time(), traceparent=traceparent, session_id=session_id)
+    with tracer.span("worker.run_session", traceparent=traceparent, session_id=session_id, resume=resume,
+                     batch_id=batch_id):
+        status = "failed"
+        try:
+            # Batch sessions are unattended: they end with their task instead of waiting for input.
+            status = await agent_orchestrator.run_session(session_id, task_description,
+                                                          wait_for_input=batch_id is None, resume=resume)
+        except asyncio.CancelledError:
+            status = "interrupted"
+            raise
+        finally:
+            if status == "migrated":
+                # Checkpointed for rebalancing: whichever worker takes this continues from the checkpoint
+                run_agent_task.delay(session_id, batch_id=batch_id, **task_kwargs())
+            elif batch_id and status not in ("duplicate", "lease_lost") and not (
+                    status == "interrupted" and settings.CHECKPOINTS_ENABLED):
+                # Runs that raised or were cancelled count as well; an interrupted one is
+                # redelivered with checkpoints and records its outcome when it ends
+                try:
+                    await batch_manager.record_outcome(batch_id, session_id, status=status)
+                except Exception as e:
+                    logger.error("batch_outcome_failed", session_id=session_id, batch_id=batch_id, error=str(e))
+        return status
+
+# With checkpoints, the session task is acked after it ends and requeued if its worker
+# process dies, so a crashed session is redelivered and continues from its checkpoint.
+@shared_task(bind=True, name="app.worker.run_agent_task", acks_late=settings.CHECKPOINTS_ENABLED or None,
+             reject_on_worker_lost=settings.CHECKPOINTS_ENABLED or None)
+def run_agent_task(self, session_id: str, task_description: str = None, resume: bool = False, batch_id: str = None,
+                   traceparent: str = None, enqueued_at: float = None):
+    # resume=True rebuilds a suspended session from its snapshot; the new task is in its inbox.
+    # traceparent/enqueued_at carry the caller's trace (see app.core.tracing.task_kwargs).
+    logger.info("worker_received_task", session_id=session_id, mode=settings.WORKER_MODE, resume=resume, batch_id=batch_id)
+    args = (session_id, task_description, resume, batch_id, traceparent, enqueued_at)
+
+    if settings.WORKER_MODE == "async":
+        # Hand the session to the process-wide loop; this thread only holds a slot.
+        status = worker_runtime.run(_run_session(*args))
+        return {"status": status, "session_id": session_id}
     
     # Run async function in sync Celery worker
     try:
@@ -13,7 +60,16 @@ def run_agent_task(self, session_id: str, task_description: str):
     except RuntimeError:
         loop = asyncio.new_event_loop()
         asyncio.set_event_loop(loop)
+    if loop.is_running():
+        # An eager task called from async code: the session coroutine is never created,
+        # rather than created and dropped unawaited
+        raise RuntimeError("run_agent_task cannot run the session inside a running event loop")
         
-    loop.run_until_complete(agent_orchestrator.run_session(session_id, task_description))
+    try:
+        status = loop.run_until_complete(_run_session(*args))
+    finally:
+        # The loop only runs during tasks here, so the audit events are written before
+        # returning, including those of a session that failed
+        loop.run_until_complete(audit_log.flush())
     
-    return {"status": "completed", "session_id": session_id}
+    return {"status": status, "session_id": session_id}
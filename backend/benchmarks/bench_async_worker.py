@@ -0,0 +1,78 @@
+"""
+Sessions/second per worker process: one session per process (prefork mode)
+vs many sessions on the shared loop of AsyncWorkerRuntime (async mode).
+
+Runs the real AgentOrchestrator + Chromium against a local mock page, with
+MockLLMProvider standing in for the model (use --llm-latency to simulate think time).
+
+    python -m benchmarks.bench_async_worker --sessions 64 --concurrency 16 --fake-redis
+"""
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.fixtures import mock_page_server, use_redis, quiet, report, percentile
+
+def run_benchmark(sessions: int, concurrency: int, llm_latency: float, fake_redis: bool):
+    from app.agents import planner as planner_module
+    from app.agents.mock_llm import MockLLMProvider
+    from app.agents.orchestrator import agent_orchestrator
+    from app.core.session import session_manager
+    from app.worker.runtime import AsyncWorkerRuntime
+
+    results = {}
+    with mock_page_server() as base_url, quiet():
+        planner_module.llm_service = MockLLMProvider(start_url=base_url, latency=llm_latency)
+
+        for label, slots in (("prefork (1 session/process)", 1), (f"async ({concurrency} sessions/process)", concurrency)):
+            runtime = AsyncWorkerRuntime(max_sessions=slots)
+            runtime.start()
+            runtime.submit(_connect(fake_redis)).result()
+            # Launch Chromium up front so both modes measure steady-state throughput.
+            runtime.submit(_warm_browser()).result()
+
+            durations = []
+
+            def one_session(i):
+                session_id = runtime.submit(session_manager.create_session()).result()
+                start = time.perf_counter()
+                runtime.run(agent_orchestrator.run_session(session_id, f"bench task {i}", wait_for_input=False))
+                durations.append(time.perf_counter() - start)
+
+            cpu_start = time.process_time()
+            wall_start = time.perf_counter()
+            # The thread pool plays the role of Celery's threads pool.
+            with ThreadPoolExecutor(max_workers=slots) as pool:
+                list(pool.map(one_session, range(sessions)))
+            wall = time.perf_counter() - wall_start
+            cpu = time.process_time() - cpu_start
+
+            runtime.stop()
+            results[label] = [
+                ("sessions", sessions),
+                ("wall_s", wall),
+                ("sessions_per_s_per_process", sessions / wall),
+                ("python_cpu_s", cpu),
+                ("session_p50_s", percentile(durations, 50)),
+                ("session_p99_s", percentile(durations, 99)),
+            ]
+
+    for label, rows in results.items():
+        report(label, rows)
+
+async def _connect(fake_redis: bool):
+    use_redis(fake_redis)
+
+async def _warm_browser():
+    from app.browser.context import browser_manager
+    context = await browser_manager.create_context()
+    await context.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=32)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="simulated seconds per LLM call")
+    parser.add_argument("--fake-redis", action="store_true", help="use in-process fakeredis instead of REDIS_URL")
+    args = parser.parse_args()
+    run_benchmark(args.sessions, args.concurrency, args.llm_latency, args.fake_redis)
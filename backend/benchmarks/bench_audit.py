@@ -0,0 +1,102 @@
+"""
+Audit log throughput against a local mongod: one insert_one per event (what a
+direct write from the step loop would do) versus the batched AuditLog sink at a
+few batch sizes.
+
+Events look like the step records SessionManager.add_step sends. For the sink the
+report separates the caller's cost (record(), which is all the agent loop pays)
+from the time until everything is in Mongo (flush). Each run writes to a scratch
+database that is dropped afterwards.
+
+    python -m benchmarks.bench_audit --events 20000 --mongo mongodb://localhost:27017
+"""
+import time
+import asyncio
+import argparse
+import tempfile
+
+from benchmarks.fixtures import quiet, report, percentile
+
+def make_step(i: int) -> dict:
+    return {
+        "step": i % 20,
+        "plan": {"thought_summary": "Fill in the next field of the form.", "action": "type_text",
+                 "args": {"selector": f"#field-{i}", "text": "value"}, "confidence": 0.9, "done": False},
+        "result": {"success": True, "output": f"Typed text into #field-{i}", "error": None,
+                   "screenshot_ref": "ab" * 32, "execution_time": 0.05},
+        "url": "https://example.com/form",
+    }
+
+async def run_direct(database, events: int):
+    collection = database["audit_direct"]
+    timings = []
+    start = time.perf_counter()
+    for i in range(events):
+        t0 = time.perf_counter()
+        await collection.insert_one({"session_id": f"s{i % 100}", "tenant": "bench", "kind": "step",
+                                     "step": make_step(i)})
+        timings.append(time.perf_counter() - t0)
+    elapsed = time.perf_counter() - start
+    return [
+        ("events_per_sec", events / elapsed),
+        ("caller_p50_us", 1e6 * percentile(timings, 50)),
+        ("caller_p99_us", 1e6 * percentile(timings, 99)),
+    ]
+
+async def run_sink(database, events: int, batch_size: int, spill_dir: str):
+    from app.core import audit
+    from app.core.config import settings
+
+    settings.AUDIT_LOG_ENABLED = True
+    settings.AUDIT_BATCH_SIZE = batch_size
+    settings.AUDIT_BUFFER_SIZE = max(settings.AUDIT_BUFFER_SIZE, events + 1)
+    audit.AuditLog.COLLECTION = f"audit_batch_{batch_size}"
+    log = audit.AuditLog(spill_dir=spill_dir)
+
+    timings = []
+    start = time.perf_counter()
+    for i in range(events):
+        t0 = time.perf_counter()
+        log.record(f"s{i % 100}", "step", tenant="bench", step=make_step(i))
+        timings.append(time.perf_counter() - t0)
+        if i % batch_size == 0:
+            await asyncio.sleep(0)  # let the flusher run, as the agent loop's own awaits would
+    recorded = time.perf_counter() - start
+    await log.stop()
+    elapsed = time.perf_counter() - start
+    stored = await database[audit.AuditLog.COLLECTION].count_documents({})
+    return [
+        ("events_per_sec", events / elapsed),
+        ("caller_p50_us", 1e6 * percentile(timings, 50)),
+        ("caller_p99_us", 1e6 * percentile(timings, 99)),
+        ("record_total_s", recorded),
+        ("batches", log.stats["batches"]),
+        ("spilled", log.stats["spilled"]),
+        ("stored", stored),
+    ]
+
+async def run_benchmark(events: int, batch_sizes, mongo_url: str):
+    from motor.motor_asyncio import AsyncIOMotorClient
+    from app.db import mongo
+
+    client = AsyncIOMotorClient(mongo_url)
+    database = client["rpa_bench_audit"]
+    mongo.db.client, mongo.db.db = client, database
+    try:
+        with quiet(), tempfile.TemporaryDirectory() as spill_dir:
+            results = {"insert_one per event": await run_direct(database, events)}
+            for batch_size in batch_sizes:
+                results[f"AuditLog, batch size {batch_size}"] = await run_sink(database, events, batch_size, spill_dir)
+    finally:
+        await client.drop_database("rpa_bench_audit")
+        client.close()
+    for label, rows in results.items():
+        report(label, rows)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=20000)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[100, 500, 2000])
+    parser.add_argument("--mongo", default="mongodb://localhost:27017")
+    args = parser.parse_args()
+    asyncio.run(run_benchmark(args.events, args.batch_sizes, args.mongo))
@@ -0,0 +1,70 @@
+"""
+Session start latency: fresh context per session (cold) vs ContextPool (pooled).
+
+"Session start" is what run_session pays before its first step: get a context and
+page, then load the first page. Each mode runs bursts of --burst concurrent starts.
+
+    python -m benchmarks.bench_context_pool --sessions 60 --burst 10
+"""
+import time
+import asyncio
+import argparse
+
+from benchmarks.fixtures import mock_page_server, quiet, report, percentile
+
+async def _session_start(browser_manager, url, durations, acquire_times):
+    start = time.perf_counter()
+    context, page = await browser_manager.acquire_page()
+    acquire_times.append(time.perf_counter() - start)
+    await page.goto(url, wait_until="domcontentloaded")
+    durations.append(time.perf_counter() - start)
+    await browser_manager.release_page(context, page)
+
+async def run_benchmark(sessions: int, burst: int, pool_min: int, pool_max: int):
+    from app.core.config import settings
+    from app.browser.context import BrowserManager
+    from app.browser.pool import ContextPool
+
+    with mock_page_server() as base_url, quiet():
+        results = {}
+        for label, pooled in (("cold (new_context per session)", False), ("pooled (reset + reuse)", True)):
+            settings.BROWSER_POOL_ENABLED = pooled
+            manager = BrowserManager()
+            manager.pool = ContextPool(lambda: manager.create_context(record_video=False),
+                                       min_size=pool_min, max_size=pool_max)
+            await manager.warm_up()
+
+            durations, acquire_times = [], []
+            wall_start = time.perf_counter()
+            for offset in range(0, sessions, burst):
+                await asyncio.gather(*[
+                    _session_start(manager, base_url, durations, acquire_times)
+                    for _ in range(min(burst, sessions - offset))
+                ])
+            wall = time.perf_counter() - wall_start
+
+            rows = [
+                ("sessions", sessions),
+                ("wall_s", wall),
+                ("acquire_p50_s", percentile(acquire_times, 50)),
+                ("acquire_p99_s", percentile(acquire_times, 99)),
+                ("start_to_first_page_p50_s", percentile(durations, 50)),
+                ("start_to_first_page_p99_s", percentile(durations, 99)),
+            ]
+            if pooled:
+                stats = manager.pool.stats()
+                rows += [("pool_hits", stats["hits"]), ("pool_created", stats["created"])]
+            results[label] = rows
+            await manager.close()
+
+    for label, rows in results.items():
+        report(label, rows)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=60)
+    parser.add_argument("--burst", type=int, default=10)
+    parser.add_argument("--pool-min", type=int, default=10)
+    parser.add_argument("--pool-max", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(run_benchmark(args.sessions, args.burst, args.pool_min, args.pool_max))
@@ -0,0 +1,94 @@
+"""
+LLM round trips and wall time to complete a multi-field form, one action per
+plan vs multi-action plans.
+
+Runs the real AgentOrchestrator + Chromium against a local form with --fields
+inputs. A scripted provider stands in for the model and emits the same
+workflow either as one tool call per step or as a single batch, with
+--llm-latency seconds of simulated think time per call.
+
+    python -m benchmarks.bench_multi_action --fields 10 --llm-latency 0.8 --fake-redis
+"""
+import json
+import time
+import asyncio
+import argparse
+
+from benchmarks.fixtures import mock_page_server, use_redis, quiet, report
+
+def form_page(fields: int) -> bytes:
+    inputs = "\n".join(f'<label for="f{i}">Field {i}</label><input id="f{i}" name="f{i}">' for i in range(fields))
+    return f"""<!doctype html>
+<html><head><title>Mock Form</title></head>
+<body>
+  <form action="/done">
+    {inputs}
+    <button type="submit" id="submit">Submit</button>
+  </form>
+</body></html>
+""".encode()
+
+DONE_PAGE = b"<!doctype html><html><head><title>Done</title></head><body><h1>Thanks</h1></body></html>"
+
+class ScriptedFormLLM:
+    """Replays a fixed form-filling workflow, one plan per generate() call."""
+
+    def __init__(self, url: str, fields: int, batch: bool, latency: float):
+        fill = [{"action": "type_text", "args": {"selector": f"#f{i}", "text": f"value {i}"}} for i in range(fields)]
+        submit = {"action": "click", "args": {"selector": "#submit"}, "expect": {"url_contains": "/done"}}
+        finish = {"action": "finish", "args": {"final_answer": "Form submitted"}, "done": True}
+        opening = {"action": "open_url", "args": {"url": f"{url}/form"}}
+        if batch:
+            self.script = [opening, {"actions": fill + [submit]}, finish]
+        else:
+            self.script = [opening] + fill + [{k: v for k, v in submit.items() if k != "expect"}, finish]
+        self.latency = latency
+        self.calls = 0
+
+    async def generate(self, messages, json_mode: bool = True) -> str:
+        await asyncio.sleep(self.latency)
+        plan = self.script[min(self.calls, len(self.script) - 1)]
+        self.calls += 1
+        return json.dumps({"thought_summary": "Scripted step", "confidence": 1.0, "done": False, **plan})
+
+async def run_once(base_url: str, fields: int, batch: bool, latency: float):
+    from app.agents import planner as planner_module
+    from app.agents.orchestrator import agent_orchestrator
+    from app.core.config import settings
+    from app.core.session import session_manager
+
+    settings.PLANNER_MAX_ACTIONS = max(settings.PLANNER_MAX_ACTIONS, fields + 1)
+    planner_module.llm_service = llm = ScriptedFormLLM(base_url, fields, batch, latency)
+    session_id = await session_manager.create_session()
+    start = time.perf_counter()
+    await agent_orchestrator.run_session(session_id, "Fill in and submit the form", wait_for_input=False)
+    wall = time.perf_counter() - start
+    session = await session_manager.get_session(session_id)
+    return llm.calls, session["step_count"], wall, session.get("status")
+
+async def run_benchmark(fields: int, latency: float, fake_redis: bool):
+    from app.browser.context import browser_manager
+    use_redis(fake_redis)
+    with mock_page_server({"/form": form_page(fields), "/done": DONE_PAGE}) as base_url:
+        # Launch Chromium up front so neither mode pays for it.
+        context = await browser_manager.create_context()
+        await context.close()
+        for label, batch in (("one action per plan", False), ("multi-action plans", True)):
+            with quiet():
+                calls, steps, wall, status = await run_once(base_url, fields, batch, latency)
+            report(label, [
+                ("fields", fields),
+                ("llm_calls", calls),
+                ("history_steps", steps),
+                ("wall_s", wall),
+                ("status", status),
+            ])
+        await browser_manager.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fields", type=int, default=10)
+    parser.add_argument("--llm-latency", type=float, default=0.8, help="simulated seconds per LLM call")
+    parser.add_argument("--fake-redis", action="store_true", help="use in-process fakeredis instead of REDIS_URL")
+    args = parser.parse_args()
+    asyncio.run(run_benchmark(args.fields, args.llm_latency, args.fake_redis))
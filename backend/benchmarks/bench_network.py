@@ -0,0 +1,120 @@
+"""
+Bytes transferred and page-load time per session with request routing off,
+with blocking only, and with blocking plus the shared static-asset cache.
+
+Each session gets a fresh browser context (a cold Chromium cache, as without the
+pool) and loads a local static site: a stylesheet, two scripts, a web font, a
+large image, a video and a "tracking" script served from another host name
+(localhost, blocked through NETWORK_BLOCK_DOMAINS). Static files are delayed by
+--asset-delay seconds to stand in for network latency and sent with
+Cache-Control: max-age. The first session of the cached run fills the cache.
+
+    python -m benchmarks.bench_network --sessions 20 --asset-delay 0.05
+"""
+import os
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+
+from benchmarks.fixtures import mock_page_server, quiet, report, percentile
+
+SHOP_PAGE = b"""<!doctype html>
+<html><head><title>Mock Shop</title>
+  <link rel="stylesheet" href="/static/site.css">
+  <script src="/static/vendor.js"></script>
+  <script src="/static/app.js"></script>
+  <script>document.write('<script src="http://localhost:' + location.port + '/static/track.js"><\\/script>');</script>
+</head>
+<body>
+  <h1>Cart</h1>
+  <img src="/static/hero.jpg" width="640" height="320">
+  <video src="/static/promo.mp4" autoplay muted></video>
+  <button id="checkout">Checkout</button>
+</body></html>
+"""
+
+ASSETS = {
+    "site.css": 60_000,
+    "vendor.js": 300_000,
+    "app.js": 80_000,
+    "brand.woff2": 90_000,
+    "hero.jpg": 400_000,
+    "promo.mp4": 1_500_000,
+    "track.js": 40_000,
+}
+
+def build_site(root: str):
+    os.makedirs(os.path.join(root, "static"))
+    for name, size in ASSETS.items():
+        with open(os.path.join(root, "static", name), "wb") as f:
+            if name.endswith((".css", ".js")):
+                f.write(b"/*" + b"x" * (size - 4) + b"*/")
+            else:
+                f.write(random.randbytes(size))
+    with open(os.path.join(root, "static", "site.css"), "ab") as f:
+        f.write(b"\n@font-face { font-family: brand; src: url(/static/brand.woff2); }\nh1 { font-family: brand; }\n")
+
+async def run_mode(base_url: str, sessions: int, block, cache: bool, cache_dir: str):
+    from app.core.config import settings
+    from app.browser import network
+    from app.browser.context import BrowserManager
+
+    settings.BROWSER_POOL_ENABLED = False
+    settings.NETWORK_ROUTING_ENABLED = True
+    settings.NETWORK_BLOCK = block
+    settings.NETWORK_BLOCK_DOMAINS = ["localhost"] if block else []
+    settings.NETWORK_CACHE_ENABLED = cache
+    network.network_router.cache = network.DiskCache(root=cache_dir) if cache else None
+
+    manager = BrowserManager()
+    await manager.start()
+    load_times, transferred, from_cache, blocked = [], [], [], []
+    for i in range(sessions):
+        context = await manager.create_context(record_video=False)
+        page = await context.new_page()
+        start = time.perf_counter()
+        await page.goto(f"{base_url}/shop", wait_until="load")
+        load_times.append(time.perf_counter() - start)
+        await asyncio.sleep(0.1)  # let requestfinished size lookups land
+        stats = network.network_router.report(f"bench-{i}", context)
+        transferred.append(stats["bytes_transferred"])
+        from_cache.append(stats["bytes_from_cache"])
+        blocked.append(stats["blocked"])
+        await context.close()
+    await manager.close()
+    return [
+        ("sessions", sessions),
+        ("load_p50_ms", 1000 * percentile(load_times, 50)),
+        ("load_p99_ms", 1000 * percentile(load_times, 99)),
+        ("kb_transferred_per_session", sum(transferred) / len(transferred) / 1024),
+        ("kb_transferred_after_first", sum(transferred[1:]) / max(1, len(transferred) - 1) / 1024),
+        ("kb_from_cache_per_session", sum(from_cache) / len(from_cache) / 1024),
+        ("blocked_per_session", sum(blocked) / len(blocked)),
+    ]
+
+async def run_benchmark(sessions: int, asset_delay: float):
+    with tempfile.TemporaryDirectory() as site, tempfile.TemporaryDirectory() as cache_dir:
+        build_site(site)
+        modes = (
+            # Routing with nothing blocked or cached: stock behavior, but bytes are counted
+            ("stock (pass-through routing)", False, False),
+            ("blocking (tracking, media, font)", True, False),
+            ("blocking + shared cache", True, True),
+        )
+        with mock_page_server(pages={"/shop": SHOP_PAGE}, static_dir=site, asset_delay=asset_delay,
+                              cache_max_age=3600) as base_url, quiet():
+            results = {}
+            for label, block, cache in modes:
+                results[label] = await run_mode(base_url, sessions, ["tracking", "media", "font"] if block else [],
+                                                cache, cache_dir)
+    for label, rows in results.items():
+        report(label, rows)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--asset-delay", type=float, default=0.05, help="seconds added to each static file response")
+    args = parser.parse_args()
+    asyncio.run(run_benchmark(args.sessions, args.asset_delay))
@@ -0,0 +1,77 @@
+"""
+Planner latency and LLM token use when a recurring workflow is replayed with
+and without the plan cache.
+
+Each replay drives the scripted MockLLMProvider flow (open_url, type_text,
+finish) through Planner.plan with fresh tool timings, as the orchestrator
+would. --latency simulates model think time; tokens are estimated at
+4 characters per token for prompt and completion.
+
+    python -m benchmarks.bench_plan_cache --fake-redis --replays 50 --latency 0.4
+"""
+import time
+import random
+import asyncio
+import argparse
+
+from benchmarks.fixtures import use_redis, quiet, report, percentile
+
+class CountingProvider:
+    def __init__(self, inner):
+        self.inner = inner
+        self.calls = 0
+        self.tokens = 0
+
+    async def generate(self, messages, json_mode: bool = True) -> str:
+        response = await self.inner.generate(messages, json_mode)
+        self.calls += 1
+        self.tokens += (sum(len(m["content"]) for m in messages) + len(response)) // 4
+        return response
+
+async def replay(planner, replays: int):
+    timings = []
+    for _ in range(replays):
+        history = []
+        for step in range(10):
+            start = time.perf_counter()
+            plan = await planner.plan("Search for Agentic RPA", history, "Current URL: https://google.com")
+            timings.append(time.perf_counter() - start)
+            if plan.get("action") == "finish":
+                break
+            history.append({"step": step, "plan": plan, "result": {
+                "success": True, "output": f"Executed {plan['action']}", "error": None,
+                "screenshot_base64": None, "execution_time": random.uniform(0.05, 0.5)}})
+    return timings
+
+async def run_benchmark(replays: int, latency: float, fake_redis: bool):
+    from app.agents import planner as planner_module
+    from app.agents.mock_llm import MockLLMProvider
+    from app.agents.plan_cache import PlanCache
+    from app.core.config import settings
+    use_redis(fake_redis)
+
+    for enabled in (False, True):
+        settings.PLAN_CACHE_ENABLED = enabled
+        planner_module.plan_cache = cache = PlanCache()
+        planner_module.llm_service = provider = CountingProvider(MockLLMProvider(latency=latency))
+        with quiet():
+            timings = await replay(planner_module.Planner(), replays)
+        rows = [
+            ("plan_calls", len(timings)),
+            ("llm_calls", provider.calls),
+            ("llm_tokens_est", provider.tokens),
+            ("plan_mean_ms", 1000 * sum(timings) / len(timings)),
+            ("plan_p50_ms", 1000 * percentile(timings, 50)),
+            ("plan_p99_ms", 1000 * percentile(timings, 99)),
+        ]
+        if enabled:
+            rows.append(("hit_rate", cache.hit_rate))
+        report(f"plan cache {'on' if enabled else 'off'}", rows)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--replays", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.4, help="simulated LLM latency in seconds")
+    parser.add_argument("--fake-redis", action="store_true", help="use in-process fakeredis instead of REDIS_URL")
+    args = parser.parse_args()
+    asyncio.run(run_benchmark(args.replays, args.latency, args.fake_redis))
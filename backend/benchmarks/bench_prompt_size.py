@@ -0,0 +1,92 @@
+"""
+Planner prompt size and latency over a long session, with and without history
+compaction.
+
+The synthetic session alternates get_page_text (10k characters of page text),
+get_screenshot (inline base64, as without a screenshot store) and click steps,
+each with a 1200-token observation. The model is simulated: --latency seconds per
+call plus --prefill-ms per 1k prompt tokens, since prompt processing time grows
+with prompt length. Tokens are counted with history.count_tokens (tiktoken when
+its encoding is available, ~4 characters per token otherwise).
+
+    python -m benchmarks.bench_prompt_size --steps 40 --latency 0.3 --prefill-ms 60
+"""
+import time
+import base64
+import random
+import asyncio
+import argparse
+
+from benchmarks.fixtures import quiet, report, percentile
+
+class PrefillProvider:
+    """Answers `wait` after a delay that grows with the prompt's token count."""
+
+    def __init__(self, latency: float, prefill_ms: float, count_tokens):
+        self.latency = latency
+        self.prefill_ms = prefill_ms
+        self.count_tokens = count_tokens
+        self.prompt_tokens = []
+
+    async def generate(self, messages, json_mode: bool = True) -> str:
+        tokens = sum(self.count_tokens(m["content"]) for m in messages)
+        self.prompt_tokens.append(tokens)
+        await asyncio.sleep(self.latency + self.prefill_ms * tokens / 1000 / 1000)
+        return '{"action": "wait", "args": {}, "thought_summary": "", "confidence": 1.0, "done": false}'
+
+def synthetic_step(i: int) -> dict:
+    action = ("get_page_text", "get_screenshot", "click")[i % 3]
+    output = {"get_page_text": " ".join(random.choice(("price", "total", "item", "cart", "$19.99")) for _ in range(1700))[:10000],
+              "get_screenshot": "Screenshot taken", "click": f"Clicked #item-{i}"}[action]
+    return {
+        "step": i,
+        "observation": "Current URL: https://shop.test/cart\n" + "".join(
+            f'[{n}] button "Add item {n}" -> #item-{n}\n' for n in range(120)),
+        "plan": {"action": action, "args": {"selector": f"#item-{i}"}, "thought_summary": "Checking the cart total",
+                 "confidence": 0.9, "done": False},
+        "result": {"success": True, "output": output, "error": None,
+                   "screenshot_base64": base64.b64encode(random.randbytes(60000)).decode() if action == "get_screenshot" else None,
+                   "execution_time": random.uniform(0.05, 0.5)},
+        "url": "https://shop.test/cart",
+    }
+
+async def run_benchmark(steps: int, latency: float, prefill_ms: float):
+    from app.agents import planner as planner_module
+    from app.agents.history import count_tokens
+    from app.core.config import settings
+    settings.PLAN_CACHE_ENABLED = False
+    settings.PLANNER_TIERED = False
+    history = [{"role": "user", "content": "What is the cart total?"}] + [synthetic_step(i) for i in range(steps)]
+
+    for enabled in (False, True):
+        settings.HISTORY_COMPACTION = enabled
+        planner_module.llm_service = provider = PrefillProvider(latency, prefill_ms, count_tokens)
+        planner = planner_module.Planner()
+        timings, render = [], []
+        with quiet():
+            for n in range(1, len(history) + 1):
+                start = time.perf_counter()
+                planner._messages("What is the cart total?", history[:n], "Current URL: https://shop.test/cart")
+                render.append(time.perf_counter() - start)
+                start = time.perf_counter()
+                await planner.plan("What is the cart total?", history[:n], "Current URL: https://shop.test/cart")
+                timings.append(time.perf_counter() - start)
+        tokens = provider.prompt_tokens
+        report(f"history compaction {'on' if enabled else 'off'}", [
+            ("plan_calls", len(timings)),
+            ("prompt_tokens_mean", sum(tokens) / len(tokens)),
+            ("prompt_tokens_p99", percentile(tokens, 99)),
+            ("prompt_tokens_max", max(tokens)),
+            ("render_mean_ms", 1000 * sum(render) / len(render)),
+            ("plan_mean_ms", 1000 * sum(timings) / len(timings)),
+            ("plan_p50_ms", 1000 * percentile(timings, 50)),
+            ("plan_p99_ms", 1000 * percentile(timings, 99)),
+        ])
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--steps", type=int, default=40)
+    parser.add_argument("--latency", type=float, default=0.3, help="simulated per-call LLM latency in seconds")
+    parser.add_argument("--prefill-ms", type=float, default=60.0, help="simulated latency per 1k prompt tokens")
+    args = parser.parse_args()
+    asyncio.run(run_benchmark(args.steps, args.latency, args.prefill_ms))
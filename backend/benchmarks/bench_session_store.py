@@ -0,0 +1,57 @@
+"""
+Per-step write cost of the session store backends at 10/100/1000 steps.
+
+Each step looks like what the orchestrator writes (plan + ToolResult dict);
+--screenshot-kb embeds a base64 payload of that size in every step, as
+GetScreenshotTool results do.
+
+    python -m benchmarks.bench_session_store --fake-redis
+"""
+import time
+import asyncio
+import argparse
+
+from benchmarks.fixtures import use_redis, report, percentile
+
+def make_step(i: int, screenshot_kb: int) -> dict:
+    return {
+        "step": i,
+        "plan": {"thought_summary": "Fill in the next field of the form.", "action": "type_text",
+                 "args": {"selector": f"#field-{i}", "text": "value"}, "confidence": 0.9, "done": False},
+        "result": {"success": True, "output": f"Typed text into #field-{i}", "error": None,
+                   "screenshot_base64": "A" * (screenshot_kb * 1024) if screenshot_kb else None,
+                   "execution_time": 0.05},
+    }
+
+async def run_benchmark(step_counts, screenshot_kb: int, fake_redis: bool):
+    from app.core.session import SessionManager
+    use_redis(fake_redis)
+
+    for backend in ("json", "hash"):
+        manager = SessionManager(backend=backend)
+        rows = []
+        for steps in step_counts:
+            session_id = await manager.create_session()
+            timings = []
+            for i in range(steps):
+                start = time.perf_counter()
+                await manager.add_step(session_id, make_step(i, screenshot_kb))
+                timings.append(time.perf_counter() - start)
+            tail = timings[-max(1, steps // 10):]
+            rows += [
+                (f"{steps}_steps_mean_ms", 1000 * sum(timings) / steps),
+                (f"{steps}_steps_last10pct_mean_ms", 1000 * sum(tail) / len(tail)),
+                (f"{steps}_steps_p99_ms", 1000 * percentile(timings, 99)),
+            ]
+            start = time.perf_counter()
+            await manager.get_session(session_id, step_offset=0, step_limit=50)
+            rows.append((f"{steps}_steps_read_first_page_ms", 1000 * (time.perf_counter() - start)))
+        report(f"{backend} backend", rows)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--steps", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--screenshot-kb", type=int, default=0)
+    parser.add_argument("--fake-redis", action="store_true", help="use in-process fakeredis instead of REDIS_URL")
+    args = parser.parse_args()
+    asyncio.run(run_benchmark(args.steps, args.screenshot_kb, args.fake_redis))
@@ -0,0 +1,104 @@
+"""
+Shared helpers for the benchmark scripts in this directory.
+
+Benchmarks are run from the `backend` directory, e.g.:
+    python -m benchmarks.bench_async_worker --fake-redis
+"""
+import os
+import sys
+import io
+import logging
+import time
+import threading
+import functools
+import contextlib
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+
+# Never talk to a real LLM from a benchmark.
+os.environ.setdefault("USE_MOCK_LLM", "true")
+
+SEARCH_PAGE = b"""<!doctype html>
+<html><head><title>Mock Search</title></head>
+<body>
+  <form action="/results">
+    <textarea name="q" rows="1"></textarea>
+    <button type="submit" id="search">Search</button>
+  </form>
+</body></html>
+"""
+
+class _Handler(SimpleHTTPRequestHandler):
+    pages = {"/": SEARCH_PAGE}
+    asset_delay = 0.0  # seconds added to every static file, standing in for network latency
+    cache_max_age = None  # Cache-Control max-age sent with static files
+
+    def __init__(self, *args, directory=None, **kwargs):
+        self.static = directory is not None
+        super().__init__(*args, directory=directory, **kwargs)
+
+    def do_GET(self):
+        path = self.path.split("?")[0]
+        if path in self.pages:
+            body = self.pages[path]
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        if self.static and path.startswith("/static/"):
+            time.sleep(self.asset_delay)
+            return super().do_GET()
+        self.send_error(404)
+
+    def end_headers(self):
+        if self.static and self.cache_max_age is not None and self.path.startswith("/static/"):
+            self.send_header("Cache-Control", f"public, max-age={self.cache_max_age}")
+        super().end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+@contextlib.contextmanager
+def mock_page_server(pages=None, static_dir=None, asset_delay=0.0, cache_max_age=None):
+    """Serve `pages` ({path: bytes}) and optionally a static directory on a random local port."""
+    handler = type("Handler", (_Handler,), {"pages": {**_Handler.pages, **(pages or {})},
+                                            "asset_delay": asset_delay, "cache_max_age": cache_max_age})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(handler, directory=static_dir))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}"
+    finally:
+        server.shutdown()
+
+def use_redis(fake: bool):
+    """Point the app's shared Redis client at fakeredis or at settings.REDIS_URL."""
+    from app.db.redis import redis_client
+    if fake:
+        import fakeredis.aioredis
+        redis_client.redis = fakeredis.aioredis.FakeRedis(decode_responses=True)
+    else:
+        redis_client.connect()
+    return redis_client
+
+def quiet():
+    """Silence structlog and DEBUG prints so the benchmark report stays readable."""
+    import structlog
+    structlog.configure(wrapper_class=structlog.make_filtering_bound_logger(logging.WARNING))
+    return contextlib.redirect_stdout(io.StringIO())
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * (len(ordered) - 1)))))
+    return ordered[idx]
+
+def report(title, rows):
+    print(f"\n{title}", file=sys.__stdout__)
+    width = max(len(k) for k, _ in rows)
+    for key, value in rows:
+        if isinstance(value, float):
+            value = f"{value:.4f}"
+        print(f"  {key.ljust(width)}  {value}", file=sys.__stdout__)
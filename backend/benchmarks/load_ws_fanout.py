@@ -0,0 +1,106 @@
+"""
+WebSocket fan-out load test against a running API process.
+
+Opens --connections idle WebSockets spread over --sessions sessions, optionally
+samples the API process's CPU while they sit idle (--api-pid), then publishes
+timestamped probes to session_updates:{id} in Redis and reports the
+publish-to-client delivery latency.
+
+    uvicorn app.main:app --port 8000 &
+    python -m benchmarks.load_ws_fanout --connections 5000 --sessions 500 --api-pid $!
+"""
+import os
+import json
+import time
+import uuid
+import random
+import asyncio
+import argparse
+import resource
+
+import websockets
+import redis.asyncio as aioredis
+
+from benchmarks.fixtures import report, percentile
+
+def _cpu_seconds(pid: int) -> float:
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+async def _client(url: str, latencies: list, connected: asyncio.Event, counter: list, target: int):
+    async with websockets.connect(url, max_queue=None, ping_interval=None) as ws:
+        counter[0] += 1
+        if counter[0] == target:
+            connected.set()
+        async for message in ws:
+            if isinstance(message, bytes):
+                continue
+            data = json.loads(message)
+            if data.get("type") == "latency_probe":
+                latencies.append(time.time() - data["sent_at"])
+
+async def run(base_url: str, redis_url: str, connections: int, sessions: int, probes: int,
+              rate: float, idle_seconds: float, api_pid: int):
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (min(hard, max(soft, connections * 2 + 256)), hard))
+
+    session_ids = [str(uuid.uuid4()) for _ in range(sessions)]
+    latencies, counter, connected = [], [0], asyncio.Event()
+    clients = []
+    start = time.perf_counter()
+    for i in range(connections):
+        url = f"{base_url}/api/v1/sessions/{session_ids[i % sessions]}/ws"
+        clients.append(asyncio.create_task(_client(url, latencies, connected, counter, connections)))
+        if i % 200 == 199:
+            await asyncio.sleep(0.05)  # don't overflow the listen backlog
+    await asyncio.wait_for(connected.wait(), timeout=300)
+    connect_time = time.perf_counter() - start
+
+    idle_cpu = None
+    if api_pid:
+        cpu_start = _cpu_seconds(api_pid)
+        await asyncio.sleep(idle_seconds)
+        idle_cpu = (_cpu_seconds(api_pid) - cpu_start) / idle_seconds
+
+    redis = aioredis.from_url(redis_url)
+    for _ in range(probes):
+        session_id = random.choice(session_ids)
+        payload = json.dumps({"type": "latency_probe", "sent_at": time.time()})
+        await redis.publish(f"session_updates:{session_id}", payload)
+        await asyncio.sleep(1.0 / rate)
+    await asyncio.sleep(2)
+    await redis.aclose()
+
+    expected = probes * (connections // sessions)
+    rows = [
+        ("connections", connections),
+        ("sessions", sessions),
+        ("connect_all_s", connect_time),
+        ("probes_published", probes),
+        ("deliveries", f"{len(latencies)}/{expected}"),
+        ("latency_p50_ms", 1000 * percentile(latencies, 50)),
+        ("latency_p99_ms", 1000 * percentile(latencies, 99)),
+        ("latency_max_ms", 1000 * max(latencies, default=0.0)),
+    ]
+    if idle_cpu is not None:
+        rows.append(("api_idle_cpu_cores", idle_cpu))
+    report("WebSocket fan-out", rows)
+
+    for task in clients:
+        task.cancel()
+    await asyncio.gather(*clients, return_exceptions=True)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="ws://127.0.0.1:8000")
+    parser.add_argument("--redis-url", default=os.getenv("REDIS_URL", "redis://127.0.0.1:6379/0"))
+    parser.add_argument("--connections", type=int, default=5000)
+    parser.add_argument("--sessions", type=int, default=500)
+    parser.add_argument("--probes", type=int, default=500)
+    parser.add_argument("--rate", type=float, default=50.0, help="probes per second")
+    parser.add_argument("--idle-seconds", type=float, default=10.0)
+    parser.add_argument("--api-pid", type=int, default=0, help="sample this process's CPU while idle")
+    args = parser.parse_args()
+    asyncio.run(run(args.url, args.redis_url, args.connections, args.sessions, args.probes,
+                    args.rate, args.idle_seconds, args.api_pid))
@@ -8,6 +8,10 @@ import os
 
 # Set environment to use Mock LLM
 os.environ["USE_MOCK_LLM"] = "true"
+# No Mongo here: audit events are only recorded by the tests that enable it
+os.environ["AUDIT_LOG_ENABLED"] = "false"
+# Screenshots go to a temp directory (see screenshot_dir) instead of GridFS
+os.environ["SCREENSHOT_STORE"] = "file"
 
 from app.main import app
 from app.core.config import settings
@@ -18,6 +22,16 @@ def celery_eager():
     celery_app.conf.update(task_always_eager=True)
     yield
 
+@pytest.fixture(scope="session", autouse=True)
+def screenshot_dir(tmp_path_factory):
+    # The file store writes under SCREENSHOT_DIR; keep test frames out of the tree
+    from app.core import screenshots
+    root = str(tmp_path_factory.mktemp("screenshots"))
+    settings.SCREENSHOT_DIR = root
+    if isinstance(screenshots.screenshot_store, screenshots.FileScreenshotStore):
+        screenshots.screenshot_store.root = root
+    yield root
+
 @pytest.fixture(scope="session")
 def event_loop():
     loop = asyncio.get_event_loop_policy().new_event_loop()
@@ -34,7 +48,12 @@ def mock_dbs():
     
     with patch("app.db.redis.get_redis", return_value=fake_redis), \
          patch("app.db.mongo.get_db", return_value=fake_mongo), \
-         patch("app.core.session.get_redis", return_value=fake_redis):
+         patch("app.core.session.get_redis", return_value=fake_redis), \
+         patch("app.core.inbox.get_redis", return_value=fake_redis), \
+         patch("app.agents.plan_cache.get_redis", return_value=fake_redis), \
+         patch("app.core.batches.get_redis", return_value=fake_redis), \
+         patch("app.core.scheduler.get_redis", return_value=fake_redis), \
+         patch("app.agents.checkpoints.get_redis", return_value=fake_redis):
         # Also patch db.connect/close in main
         with patch("app.db.mongo.db.connect"), patch("app.db.mongo.db.close"):
              yield
@@ -54,6 +73,7 @@ def mock_browser():
         # Configure new_page to be async and return the mock_page
         mock_context.new_page = AsyncMock(return_value=mock_page)
         mock_context.close = AsyncMock(return_value=None)
+        mock_context.storage_state = AsyncMock(return_value={"cookies": [], "origins": []})
         mock_create.return_value = mock_context
         
         # Setup page methods to be async
@@ -0,0 +1,78 @@
+import json
+import asyncio
+import contextlib
+from typing import Dict, List, Optional
+
+def _sse(delta: str) -> bytes:
+    chunk = {"id": "chatcmpl-stub", "object": "chat.completion.chunk", "created": 0, "model": "stub",
+             "choices": [{"index": 0, "delta": {"content": delta}, "finish_reason": None}]}
+    return f"data: {json.dumps(chunk)}\n\n".encode()
+
+class StubServer:
+    def __init__(self):
+        self.url = ""
+        self.requests = 0
+        self.active = 0
+        self.max_active = 0
+
+@contextlib.asynccontextmanager
+async def stub_openai_server(chunks: List[str], delay: float = 0.0, fail_first: int = 0,
+                             fail_status: int = 429, headers: Optional[Dict[str, str]] = None):
+    """
+    Minimal OpenAI-compatible `/chat/completions` server on a random local port.
+
+    Streaming requests get `chunks` as SSE deltas, `delay` seconds apart; other
+    requests get them joined in a single completion. The first `fail_first`
+    requests are answered with `fail_status` (429s carry `retry-after-ms: 10`),
+    and `headers` are added to successful responses. Yields a `StubServer`
+    with the base URL and request counters.
+    """
+    stub = StubServer()
+    extra = "".join(f"{name}: {value}\r\n" for name, value in (headers or {}).items()).encode()
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        head = await reader.readuntil(b"\r\n\r\n")
+        length = 0
+        for line in head.decode().split("\r\n"):
+            if line.lower().startswith("content-length:"):
+                length = int(line.split(":", 1)[1])
+        body = json.loads(await reader.readexactly(length)) if length else {}
+        stub.requests += 1
+        stub.active += 1
+        stub.max_active = max(stub.max_active, stub.active)
+        try:
+            await respond(body, writer)
+        finally:
+            stub.active -= 1
+
+    async def respond(body, writer: asyncio.StreamWriter):
+        if stub.requests <= fail_first:
+            payload = json.dumps({"error": {"message": "stub failure", "type": "rate_limit_error"}}).encode()
+            retry = b"retry-after-ms: 10\r\n" if fail_status == 429 else b""
+            writer.write(f"HTTP/1.1 {fail_status} Error\r\nContent-Type: application/json\r\n".encode() + retry
+                         + f"Connection: close\r\nContent-Length: {len(payload)}\r\n\r\n".encode() + payload)
+        elif body.get("stream"):
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nConnection: close\r\n\r\n")
+            for delta in chunks:
+                writer.write(_sse(delta))
+                await writer.drain()
+                await asyncio.sleep(delay)
+            writer.write(b"data: [DONE]\n\n")
+        else:
+            await asyncio.sleep(delay * len(chunks))
+            payload = json.dumps({"id": "chatcmpl-stub", "object": "chat.completion", "created": 0, "model": "stub",
+                                  "choices": [{"index": 0, "finish_reason": "stop",
+                                               "message": {"role": "assistant", "content": "".join(chunks)}}],
+                                  "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}}).encode()
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nConnection: close\r\n" + extra
+                         + f"Content-Length: {len(payload)}\r\n\r\n".encode() + payload)
+        await writer.drain()
+        writer.close()
+
+    server = await asyncio.start_server(handle, "127.0.0.1", 0)
+    try:
+        stub.url = f"http://127.0.0.1:{server.sockets[0].getsockname()[1]}/v1"
+        yield stub
+    finally:
+        server.close()
+        await server.wait_closed()
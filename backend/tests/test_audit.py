@@ -0,0 +1,72 @@
+import os
+import asyncio
+import pytest
+from datetime import datetime
+from unittest.mock import AsyncMock, MagicMock
+from app.core.audit import AuditLog
+from app.core.config import settings
+from app.core.session import session_manager
+
+@pytest.fixture
+def audit(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "AUDIT_LOG_ENABLED", True)
+    monkeypatch.setattr(settings, "AUDIT_BATCH_SIZE", 2)
+    collection = MagicMock()
+    collection.insert_many = AsyncMock()
+    collection.create_index = AsyncMock()
+    monkeypatch.setattr("app.core.audit.get_db", AsyncMock(return_value={"audit_events": collection}))
+    log = AuditLog(spill_dir=str(tmp_path))
+    monkeypatch.setattr("app.core.session.audit_log", log)
+    return log, collection
+
+@pytest.mark.asyncio
+async def test_session_history_is_written_in_batches(audit):
+    log, collection = audit
+    [session_id] = await session_manager.create_sessions(1, tenant="acme")
+    await session_manager.update_session(session_id, {"status": "running", "task": "t", "memory": {}})
+    await session_manager.add_step(session_id, {"step": 0, "plan": {"action": "get_screenshot"},
+                                                "result": {"success": True, "screenshot_base64": "A" * 1000}})
+    await session_manager.update_session(session_id, {"memory": {"k": 1}})  # not a lifecycle event
+
+    await log.flush()
+    batches = [call.args[0] for call in collection.insert_many.await_args_list]
+    assert [len(batch) for batch in batches] == [2, 1]
+    events = [event for batch in batches for event in batch]
+    assert [event["kind"] for event in events] == ["created", "status", "step"]
+    assert {event["tenant"] for event in events} == {"acme"}
+    assert events[1]["task"] == "t" and "memory" not in events[1]
+    assert events[2]["step"]["result"]["screenshot_base64"] is None
+    assert isinstance(events[0]["created_at"], datetime)
+    assert collection.create_index.await_count == 3
+    await log.stop()
+
+@pytest.mark.asyncio
+async def test_slow_mongo_spills_to_disk_and_is_replayed(audit, monkeypatch):
+    log, collection = audit
+    monkeypatch.setattr(settings, "AUDIT_WRITE_TIMEOUT", 0.05)
+    monkeypatch.setattr(settings, "AUDIT_RETRY_INTERVAL", 0)
+
+    async def slow_insert(documents, ordered):
+        await asyncio.sleep(1)
+
+    collection.insert_many.side_effect = slow_insert
+    log.record("s1", "status", tenant="acme", status="running")
+    log.record("s1", "status", tenant="acme", status="completed")
+    await log.flush()
+    assert len(os.listdir(log.spill_dir)) == 1 and log.stats["spilled"] == 2
+
+    # A full buffer goes to disk as well instead of growing, off the event loop
+    monkeypatch.setattr(settings, "AUDIT_BUFFER_SIZE", 2)
+    log.record("s2", "created", tenant="acme")
+    log.record("s2", "status", tenant="acme", status="running")
+    assert not log._buffer and len(log._spilling) == 1
+    await log.flush()
+    assert len(os.listdir(log.spill_dir)) == 2
+
+    collection.insert_many.side_effect = None
+    await log._replay_spilled()
+    assert os.listdir(log.spill_dir) == []
+    written = [event for call in collection.insert_many.await_args_list[1:] for event in call.args[0]]
+    assert [(event["session_id"], event.get("status")) for event in written] == [
+        ("s1", "running"), ("s1", "completed"), ("s2", None), ("s2", "running")]
+    await log.stop()
@@ -0,0 +1,62 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from app.tools.executor import ToolExecutor
+
+def _page():
+    page = MagicMock()
+    page.url = "https://example.com/form"
+    page.fill = AsyncMock(return_value=None)
+    page.click = AsyncMock(return_value=None)
+    page.screenshot = AsyncMock(side_effect=RuntimeError("no screenshots in tests"))
+    page.wait_for_selector = AsyncMock(return_value=None)
+    return page
+
+FORM = [
+    {"action": "type_text", "args": {"selector": "#name", "text": "Ada"}},
+    {"action": "type_text", "args": {"selector": "#email", "text": "ada@example.com"}, "expect": {"selector": "#submit"}},
+    {"action": "click", "args": {"selector": "#submit"}, "expect": {"navigation": True}},
+]
+
+@pytest.mark.asyncio
+async def test_batch_runs_all_actions_as_one_result():
+    page = _page()
+    result = await ToolExecutor().execute_batch(FORM, page)
+    assert result.success and result.error is None
+    assert [o["action"] for o in result.output] == ["type_text", "type_text", "click"]
+    page.wait_for_selector.assert_awaited_once_with("#submit", state="visible", timeout=2000)
+
+@pytest.mark.asyncio
+async def test_batch_stops_on_failed_postcondition():
+    page = _page()
+    page.wait_for_selector = AsyncMock(side_effect=TimeoutError("Timeout 2000ms exceeded."))
+    result = await ToolExecutor().execute_batch(FORM, page)
+    assert not result.success
+    assert len(result.output) == 2 and not result.output[1]["success"]
+    assert "action 2 (type_text) failed" in result.error and "1 action(s) skipped" in result.error
+    assert page.click.await_count == 0
+
+@pytest.mark.asyncio
+async def test_batch_stops_on_unexpected_navigation():
+    page = _page()
+
+    async def navigate(selector):
+        page.url = "https://example.com/other"
+    page.click = AsyncMock(side_effect=navigate)
+
+    actions = [{"action": "click", "args": {"selector": "#link"}}] + FORM[:2]
+    result = await ToolExecutor().execute_batch(actions, page)
+    assert not result.success
+    assert len(result.output) == 1 and result.output[0]["success"]
+    assert "navigated to https://example.com/other" in result.error
+    assert page.fill.await_count == 0
+
+@pytest.mark.asyncio
+async def test_malformed_batches_fail_without_raising():
+    page = _page()
+    result = await ToolExecutor().execute_batch("click #submit", page)
+    assert not result.success and "must be a list" in result.error
+
+    for bad in ("click", {"action": "click", "args": "#submit"}, {"action": "finish", "args": {}}):
+        result = await ToolExecutor().execute_batch([FORM[0], bad, FORM[2]], page)
+        assert not result.success and "action 2" in result.error and "1 action(s) skipped" in result.error
+    assert page.click.await_count == 0
@@ -0,0 +1,107 @@
+import pytest
+from httpx import AsyncClient, ASGITransport
+from unittest.mock import AsyncMock, MagicMock, patch
+from app.main import app
+from app.core.batches import batch_manager
+from app.core.config import settings
+from app.core.scheduler import FairScheduler
+from app.core.session import session_manager
+from app.worker.tasks import _run_session
+
+async def _clear_queues():
+    from app.core import scheduler as scheduler_module  # get_redis is patched there
+    redis = await scheduler_module.get_redis()
+    for key in await redis.keys("sched:*"):
+        await redis.delete(key)
+
+@pytest.fixture
+def scheduler(monkeypatch):
+    monkeypatch.setattr(settings, "SCHEDULER_QUEUE_DEPTH", 10)
+    monkeypatch.setattr(settings, "TENANT_BURST", 100)
+    scheduler = FairScheduler()
+    scheduler._queue_depth = AsyncMock(return_value=0)
+    scheduler.published = []
+    scheduler._publish = lambda entries: scheduler.published.extend(entries) or []
+    return scheduler
+
+@pytest.mark.asyncio
+async def test_create_batch_and_progress():
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        response = await ac.post("/api/v1/batches", json={"tasks": [f"task {i}" for i in range(25)], "tenant": "acme"})
+        assert response.status_code == 200
+        batch_id = response.json()["batch_id"]
+
+        progress = (await ac.get(f"/api/v1/batches/{batch_id}")).json()
+        assert progress["total"] == 25 and progress["queued"] == 25 and progress["status"] == "queued"
+
+        sessions = (await ac.get(f"/api/v1/batches/{batch_id}/sessions", params={"limit": 10})).json()["session_ids"]
+    assert len(sessions) == 10
+    session = await session_manager.get_session(sessions[0])
+    assert session["batch_id"] == batch_id and session["tenant"] == "acme"
+
+@pytest.mark.asyncio
+async def test_scheduler_round_robins_tenants_and_priorities(scheduler):
+    await _clear_queues()
+    big = await batch_manager.create_batch([f"big {i}" for i in range(50)], "big-tenant", "normal")
+    await batch_manager.create_batch([f"small {i}" for i in range(3)], "small-tenant", "normal")
+    await batch_manager.create_batch(["urgent"], "urgent-tenant", "high")
+
+    assert await scheduler.tick() == 10
+    tenants = [tenant for _, tenant, _ in scheduler.published]
+    assert tenants[0] == "urgent-tenant"
+    assert tenants.count("small-tenant") == 3  # not stuck behind the 50-task batch
+    assert tenants.count("big-tenant") == 6
+    assert (await batch_manager.get_batch(big))["dispatched"] == 6
+
+@pytest.mark.asyncio
+async def test_scheduler_limits_tenant_in_flight_and_counts_outcomes_once(scheduler, monkeypatch):
+    monkeypatch.setattr(settings, "TENANT_MAX_IN_FLIGHT", 2)
+    await _clear_queues()
+    batch_id = await batch_manager.create_batch(["a", "b", "c"], "capped-tenant", "low")
+    assert await scheduler.tick() == 2
+    assert await scheduler.tick() == 0
+
+    session_id = scheduler.published[0][2]["session_id"]
+    await session_manager.update_session(session_id, {"status": "completed"})
+    with patch("app.core.batches.fair_scheduler", scheduler):
+        await batch_manager.record_outcome(batch_id, session_id)
+        await batch_manager.record_outcome(batch_id, session_id)  # redelivered task
+    progress = await batch_manager.get_batch(batch_id)
+    assert progress["completed"] == 1 and progress["running"] == 1 and progress["queued"] == 1
+
+    assert await scheduler.tick() == 1
+
+@pytest.mark.asyncio
+async def test_session_that_raises_is_counted_and_frees_its_slot(scheduler, monkeypatch):
+    monkeypatch.setattr(settings, "TENANT_MAX_IN_FLIGHT", 1)
+    await _clear_queues()
+    batch_id = await batch_manager.create_batch(["a", "b"], "crashing-tenant", "low")
+    assert await scheduler.tick() == 1
+    session_id = scheduler.published[0][2]["session_id"]
+
+    with patch("app.core.batches.fair_scheduler", scheduler), \
+         patch("app.worker.tasks.agent_orchestrator.run_session", AsyncMock(side_effect=RuntimeError("no browser"))):
+        with pytest.raises(RuntimeError):
+            await _run_session(session_id, "a", False, batch_id)
+    assert (await batch_manager.get_batch(batch_id))["failed"] == 1
+    assert await scheduler.tick() == 1
+
+@pytest.mark.asyncio
+async def test_in_flight_slots_are_freed_when_counting_or_publishing_fails(scheduler, monkeypatch):
+    monkeypatch.setattr(settings, "TENANT_MAX_IN_FLIGHT", 1)
+    await _clear_queues()
+    batch_id = await batch_manager.create_batch(["a", "b"], "flaky-tenant", "low")
+    assert await scheduler.tick() == 1
+    session_id = scheduler.published[0][2]["session_id"]
+
+    with patch("app.core.batches.fair_scheduler", scheduler), \
+         patch("app.core.batches.get_redis", AsyncMock(side_effect=ConnectionError("redis gone"))):
+        with pytest.raises(ConnectionError):
+            await batch_manager.record_outcome(batch_id, session_id, status="completed")
+
+    # The broker cannot be reached: the entry goes back to its queue without holding a slot
+    scheduler._publish = MagicMock(side_effect=ImportError("celery app not configured"))
+    assert await scheduler.tick() == 1
+    assert (await batch_manager.get_batch(batch_id))["dispatched"] == 1
+    scheduler._publish = lambda entries: scheduler.published.extend(entries) or []
+    assert await scheduler.tick() == 1
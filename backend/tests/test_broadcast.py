@@ -0,0 +1,66 @@
+import pytest
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, patch
+import fakeredis.aioredis
+from app.api.broadcast import SessionBroadcaster, Subscription
+
+@pytest.mark.asyncio
+async def test_broadcaster_fans_out_one_subscription_to_session_queues():
+    redis = fakeredis.aioredis.FakeRedis()
+    broadcaster = SessionBroadcaster(queue_size=8)
+    with patch("app.api.broadcast.get_redis_binary", AsyncMock(return_value=redis)):
+        await broadcaster.start()
+        a1, a2, b = broadcaster.subscribe("a"), broadcaster.subscribe("a"), broadcaster.subscribe("b")
+        # Wait until the pattern subscription is live.
+        for _ in range(100):
+            if (await redis.pubsub_numpat()) > 0:
+                break
+            await asyncio.sleep(0.01)
+
+        await redis.publish("session_updates:a", '{"type": "chat"}')
+        await redis.publish("session_frames:b", b"\xff\xd8frame")
+
+        assert await asyncio.wait_for(a1.get(), 1) == ("text", '{"type": "chat"}')
+        assert await asyncio.wait_for(a2.get(), 1) == ("text", '{"type": "chat"}')
+        assert await asyncio.wait_for(b.get(), 1) == ("bytes", b"\xff\xd8frame")
+
+        broadcaster.unsubscribe(a1)
+        broadcaster.unsubscribe(a2)
+        broadcaster.unsubscribe(b)
+        assert broadcaster.connections == 0
+        await broadcaster.stop()
+
+@pytest.mark.asyncio
+async def test_broadcaster_closes_a_failed_pubsub_before_reconnecting():
+    pubsubs = []
+
+    def pubsub():
+        broken = MagicMock()
+        broken.psubscribe = AsyncMock(side_effect=ConnectionError("connection reset"))
+        broken.close = AsyncMock()
+        pubsubs.append(broken)
+        return broken
+
+    redis = MagicMock()
+    redis.pubsub.side_effect = pubsub
+    broadcaster = SessionBroadcaster(queue_size=8)
+    sleep = asyncio.sleep
+    with patch("app.api.broadcast.get_redis_binary", AsyncMock(return_value=redis)), \
+            patch("asyncio.sleep", lambda delay: sleep(0)):  # skip the reconnect backoff
+        await broadcaster.start()
+        for _ in range(100):
+            if len(pubsubs) > 2:
+                break
+            await sleep(0)
+        await broadcaster.stop()
+    assert len(pubsubs) > 2
+    for broken in pubsubs:
+        broken.close.assert_awaited()
+
+@pytest.mark.asyncio
+async def test_subscription_drops_oldest_when_full():
+    sub = Subscription("s", maxsize=3)
+    for i in range(5):
+        sub.push(("text", str(i)))
+    assert sub.dropped == 2
+    assert [await sub.get() for _ in range(3)] == [("text", "2"), ("text", "3"), ("text", "4")]
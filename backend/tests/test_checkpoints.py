@@ -0,0 +1,134 @@
+import time
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from app.agents.checkpoints import Checkpointer
+from app.agents.orchestrator import AgentOrchestrator
+from app.core.config import settings
+from app.core.session import session_manager
+from app.worker.tasks import _run_session
+
+@pytest.fixture(autouse=True)
+def checkpoints_enabled(monkeypatch):
+    monkeypatch.setattr(settings, "CHECKPOINTS_ENABLED", True)
+
+class MigratingCheckpointer(Checkpointer):
+    """Behaves as if a migration was requested during the first step."""
+
+    def step_done(self) -> bool:
+        self.migration_requested = True
+        return super().step_done()
+
+@pytest.mark.asyncio
+async def test_migrated_session_continues_from_its_checkpoint(mock_browser, monkeypatch):
+    monkeypatch.setattr(settings, "SESSION_IDLE_TIMEOUT", 0.1)
+    context = mock_browser.return_value
+    context.storage_state = AsyncMock(return_value={"cookies": [{"name": "sid"}], "origins": []})
+    session_id = await session_manager.create_session()
+
+    with patch("app.agents.orchestrator.Checkpointer", MigratingCheckpointer), \
+         patch("app.worker.tasks.run_agent_task.delay") as delay:
+        assert await _run_session(session_id, 'Search for "Agentic RPA"', resume=False, batch_id=None) == "migrated"
+
+    delay.assert_called_once()
+    assert delay.call_args.args == (session_id,)
+    assert (await session_manager.get_session(session_id))["status"] == "migrating"
+    checkpoint = await session_manager.load_checkpoint(session_id)
+    assert checkpoint["step_count"] == 1 and checkpoint["history"][0]["plan"]["action"] == "open_url"
+
+    # The re-queued task (no task argument) picks up at step 1 with the saved browser state
+    page = await context.new_page()
+    page.goto.reset_mock()
+    await _run_session(session_id, None, resume=False, batch_id=None)
+
+    assert mock_browser.await_args.kwargs["storage_state"] == {"cookies": [{"name": "sid"}], "origins": []}
+    page.goto.assert_any_await("https://google.com", wait_until="domcontentloaded")
+    session = await session_manager.get_session(session_id)
+    assert session["result"] == "Searched for Agentic RPA"
+    assert [(s["step"], s["plan"]["action"]) for s in session["steps"]] == [(0, "open_url"), (1, "type_text")]
+    assert await session_manager.load_checkpoint(session_id) is None
+
+@pytest.mark.asyncio
+async def test_interval_grows_when_checkpoints_exceed_the_budget(monkeypatch):
+    async def slow_save(session_id, checkpoint):
+        await asyncio.sleep(0.02)
+        return 100
+
+    monkeypatch.setattr(session_manager, "save_checkpoint", slow_save)
+    context, page = MagicMock(), MagicMock(url="https://example.com")
+    context.storage_state = AsyncMock(return_value={})
+    checkpoints = Checkpointer("s1")
+
+    await asyncio.sleep(0.01)  # a step shorter than the checkpoint itself
+    assert checkpoints.step_done()
+    await checkpoints.save(context, page, [], "task", 1)
+    assert checkpoints.interval == 2
+    assert not checkpoints.step_done() and checkpoints.step_done()
+
+    # Long steps make the same checkpoint cheap again: back toward every step
+    checkpoints._window_start = time.monotonic() - 10
+    await checkpoints.save(context, page, [], "task", 3)
+    assert checkpoints.interval == 1
+    assert checkpoints.stats["checkpoints"] == 2 and checkpoints.stats["bytes"] == 200
+
+@pytest.mark.asyncio
+async def test_lease_keeps_a_redelivered_task_from_running_the_session_twice():
+    first, second = Checkpointer("s1"), Checkpointer("s1")
+    assert await first.acquire()
+    assert not await second.acquire(wait=0)
+
+    await first.close()
+    assert await second.acquire(wait=0)
+    await second.close()
+
+@pytest.mark.asyncio
+async def test_session_stops_when_its_lease_is_lost(mock_browser, monkeypatch):
+    monkeypatch.setattr(settings, "SESSION_LEASE_TTL", 1)  # heartbeat every ~0.33s
+    session_id = await session_manager.create_session()
+    await session_manager.save_checkpoint(session_id, {"url": "", "storage_state": None, "history": [],
+                                                       "task": "t", "step_count": 0})
+
+    async def slow_plan(*args, **kwargs):
+        await asyncio.sleep(5)
+
+    with patch("app.agents.checkpoints.session_lease.renew", AsyncMock(return_value=False)), \
+         patch("app.agents.orchestrator.planner.plan", slow_plan):
+        start = time.monotonic()
+        status = await AgentOrchestrator().run_session(session_id, None, wait_for_input=False)
+
+    assert status == "lease_lost" and time.monotonic() - start < 2
+    # The worker that took over owns the session status and the checkpoint
+    assert (await session_manager.get_session(session_id))["status"] == "running"
+    assert await session_manager.load_checkpoint(session_id) is not None
+
+@pytest.mark.asyncio
+async def test_failed_setup_releases_the_lease(monkeypatch):
+    session_id = await session_manager.create_session()
+    with patch("app.agents.orchestrator.browser_manager.acquire_page", AsyncMock(side_effect=RuntimeError("no browser"))):
+        with pytest.raises(RuntimeError):
+            await AgentOrchestrator().run_session(session_id, "t", wait_for_input=False)
+    other = Checkpointer(session_id)
+    assert await other.acquire(wait=0)
+    await other.close()
+
+@pytest.mark.asyncio
+async def test_finished_task_is_not_run_again_after_a_restore(mock_browser, monkeypatch):
+    monkeypatch.setattr(settings, "SESSION_IDLE_TIMEOUT", 0.1)
+    session_id = await session_manager.create_session()
+    waiting = []
+
+    async def wait(session_id, timeout):
+        waiting.append(await session_manager.load_checkpoint(session_id))
+
+    with patch("app.agents.orchestrator.session_inbox.wait", wait):
+        await AgentOrchestrator().run_session(session_id, 'Search for "Agentic RPA"')
+    # While waiting for input, the checkpoint says the task is over
+    [checkpoint] = waiting
+    assert checkpoint["task"] is None and checkpoint["history"][-1]["plan"]["action"] == "type_text"
+
+    # A worker that dies while waiting hands the next one a session with nothing left to do
+    await session_manager.save_checkpoint(session_id, checkpoint)
+    with patch("app.agents.orchestrator.planner.plan", AsyncMock()) as plan:
+        status = await AgentOrchestrator().run_session(session_id, 'Search for "Agentic RPA"', wait_for_input=False)
+    plan.assert_not_awaited()
+    assert status == "stopped"
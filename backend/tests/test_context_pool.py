@@ -0,0 +1,81 @@
+import pytest
+import asyncio
+from unittest.mock import MagicMock, AsyncMock
+from prometheus_client import REGISTRY
+from app.browser.pool import ContextPool
+
+def make_context():
+    context = MagicMock()
+    pages = []
+
+    async def new_page():
+        page = MagicMock()
+        page.is_closed.return_value = False
+        page.evaluate = AsyncMock(return_value=1)
+        page.close = AsyncMock()
+        pages.append(page)
+        return page
+
+    cdp = MagicMock()
+    cdp.send = AsyncMock()
+    cdp.detach = AsyncMock()
+    context.pages = pages
+    context.new_page = AsyncMock(side_effect=new_page)
+    context.new_cdp_session = AsyncMock(return_value=cdp)
+    context.clear_cookies = AsyncMock()
+    context.clear_permissions = AsyncMock()
+    context.close = AsyncMock()
+    context.browser = None
+    return context
+
+@pytest.mark.asyncio
+async def test_pool_reuses_reset_contexts():
+    created = []
+
+    async def create():
+        created.append(make_context())
+        return created[-1]
+
+    hits_before = REGISTRY.get_sample_value("rpa_browser_pool_acquires_total", {"outcome": "hit"}) or 0
+    pool = ContextPool(create, min_size=1, max_size=2, idle_ttl=60, max_uses=10)
+    await pool.start()
+    assert len(created) == 1
+
+    entry = await pool.acquire()
+    entry.origins.add("https://tenant-a.example")
+    await pool.release(entry)
+
+    # The same context comes back, wiped and with a fresh page.
+    again = await pool.acquire()
+    assert again.context is created[0]
+    again.context.clear_cookies.assert_awaited()
+    cdp = await again.context.new_cdp_session()
+    cdp.send.assert_any_await("Storage.clearDataForOrigin", {"origin": "https://tenant-a.example", "storageTypes": "all"})
+    assert not again.origins
+
+    stats = pool.stats()
+    assert stats["hits"] == 2 and stats["created"] == 1 and stats["in_use"] == 1
+    assert REGISTRY.get_sample_value("rpa_browser_pool_acquires_total", {"outcome": "hit"}) == hits_before + 2
+    assert REGISTRY.get_sample_value("rpa_browser_pool_contexts", {"state": "in_use"}) == 1
+    await pool.close()
+
+@pytest.mark.asyncio
+async def test_pool_blocks_at_max_size_and_discards_failed_resets():
+    async def create():
+        return make_context()
+
+    pool = ContextPool(create, min_size=0, max_size=1, idle_ttl=60, max_uses=10)
+    first = await pool.acquire()
+
+    waiter = asyncio.create_task(pool.acquire())
+    await asyncio.sleep(0.01)
+    assert not waiter.done()
+
+    first.context.clear_cookies.side_effect = Exception("browser gone")
+    await pool.release(first)
+    second = await asyncio.wait_for(waiter, 1)
+
+    assert second.context is not first.context
+    first.context.close.assert_awaited()
+    assert pool.stats()["reset_failures"] == 1
+    await pool.close()
@@ -0,0 +1,41 @@
+import json
+from app.agents.history import HistoryCompactor, compact_step, count_tokens
+
+def _step(i, action="get_page_text", output="x" * 10000, success=True):
+    return {"step": i, "observation": "Current URL: https://a.test\n" + "[1] button \"Go\" -> #go\n" * 40,
+            "plan": {"action": action, "args": {"selector": f"#s{i}"}, "thought_summary": "t" * 500, "confidence": 0.9},
+            "result": {"success": success, "output": output, "error": None if success else "timeout",
+                       "screenshot_base64": "A" * 50000, "execution_time": 0.3},
+            "url": "https://a.test"}
+
+def test_compact_step_drops_payloads_and_truncates_per_tool():
+    page = compact_step(_step(0))
+    click = compact_step(_step(1, action="click", output="Clicked #go" * 100))
+    assert "screenshot_base64" not in json.dumps(page) and "execution_time" not in json.dumps(page)
+    assert len(page["result"]["output"]) < 1600
+    assert len(click["result"]["output"]) < 350
+    assert len(page["plan"]["thought_summary"]) < 250
+
+def test_history_stays_within_budget_and_summarizes_older_steps():
+    compactor = HistoryCompactor(token_budget=1500, recent=3)
+    history = [{"role": "user", "content": "Find the price"}] + [_step(i) for i in range(100)]
+    rendered = compactor.render(history)
+    assert count_tokens(rendered) <= 1500
+    data = json.loads(rendered)
+    assert data["steps"][-1]["step"] == 99
+    assert "observation" in data["steps"][-1]
+    assert "step 90: get_page_text(selector=#s90) -> ok" in data["summary"]
+    assert "earlier steps omitted" in data["summary"]
+
+def test_short_history_is_unchanged_apart_from_payloads():
+    compactor = HistoryCompactor(token_budget=3000, recent=5)
+    history = [_step(0, action="click", output="Clicked #s0")]
+    data = json.loads(compactor.render(history))
+    assert data[0]["result"]["output"] == "Clicked #s0"
+    assert data[0]["observation"].startswith("Current URL")
+
+def test_tiny_budget_drops_whole_entries():
+    compactor = HistoryCompactor(token_budget=12, recent=3)
+    rendered = compactor.render([{"role": "user", "content": "Find the price"}] + [_step(i) for i in range(5)])
+    assert count_tokens(rendered) <= 12
+    json.loads(rendered)  # never cut mid-entry
@@ -0,0 +1,86 @@
+import io
+import pytest
+import asyncio
+from unittest.mock import MagicMock, AsyncMock, patch
+import fakeredis.aioredis
+from PIL import Image
+from app.browser.live_view import LiveView, add_viewer, count_viewers, remove_viewer
+
+def jpeg(color, box=None):
+    img = Image.new("RGB", (320, 180), color)
+    if box:
+        img.paste((255, 255, 255), box)
+    buf = io.BytesIO()
+    img.save(buf, format="JPEG", quality=80)
+    return buf.getvalue()
+
+@pytest.fixture
+def redis_pair():
+    server = fakeredis.FakeServer()
+    text = fakeredis.aioredis.FakeRedis(server=server, decode_responses=True)
+    binary = fakeredis.aioredis.FakeRedis(server=server)
+    with patch("app.browser.live_view.get_redis", AsyncMock(return_value=text)), \
+         patch("app.browser.live_view.get_redis_binary", AsyncMock(return_value=binary)):
+        yield text, binary
+
+@pytest.mark.asyncio
+async def test_live_view_only_publishes_changed_frames_to_viewers(redis_pair):
+    text, binary = redis_pair
+    page = MagicMock()
+    frames = [jpeg((10, 10, 10)), jpeg((10, 10, 10)), jpeg((10, 10, 10), box=(0, 0, 200, 180))]
+    page.screenshot = AsyncMock(side_effect=frames)
+
+    view = LiveView("s1", page)
+    view.min_interval = 0
+
+    # Nobody watching: no screenshot at all.
+    await view.capture()
+    page.screenshot.assert_not_awaited()
+
+    await add_viewer(text, "s1", "viewer-1")
+    view._viewers_checked = 0
+    pubsub = binary.pubsub()
+    await pubsub.subscribe("session_frames:s1")
+    for _ in range(3):
+        await view.capture()
+
+    assert view.stats["published"] == 2
+    assert view.stats["skipped_unchanged"] == 1
+    received = []
+    for _ in range(10):
+        message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=0.05)
+        if message:
+            received.append(message["data"])
+    assert received == [frames[0], frames[2]]
+
+@pytest.mark.asyncio
+async def test_live_view_rate_limit_sends_trailing_frame(redis_pair):
+    text, _ = redis_pair
+    await add_viewer(text, "s2", "viewer-1")
+    view = LiveView("s2", MagicMock())
+    view.min_interval = 0.05
+    view.threshold = 0
+
+    await view.offer(jpeg((0, 0, 0)))
+    await view.offer(jpeg((0, 0, 255)))
+    await view.offer(jpeg((255, 0, 0)))
+    assert view.stats["published"] == 1
+
+    await asyncio.sleep(0.1)
+    # Only the newest deferred frame goes out once the interval has passed.
+    assert view.stats["published"] == 2
+    assert view._last_digest is not None
+
+@pytest.mark.asyncio
+async def test_viewer_presence_expires_per_viewer(redis_pair):
+    text, _ = redis_pair
+    await add_viewer(text, "s3", "crashed")
+    await add_viewer(text, "s3", "live")
+    assert await count_viewers(text, "s3") == 2
+
+    # A viewer whose process stopped refreshing drops out on its own
+    await text.zadd("session_viewers:s3", {"crashed": 1})
+    assert await count_viewers(text, "s3") == 1
+    await remove_viewer(text, "s3", "live")
+    await remove_viewer(text, "s3", "live")
+    assert await count_viewers(text, "s3") == 0
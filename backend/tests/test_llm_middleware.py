@@ -0,0 +1,78 @@
+import time
+import asyncio
+import pytest
+from unittest.mock import patch
+from app.core.config import settings
+from app.agents.llm import OpenAICompatibleProvider
+from app.agents.llm_middleware import ManagedLLMProvider, parse_duration
+from tests.llm_stub import stub_openai_server
+
+MESSAGES = [{"role": "user", "content": "plan"}]
+
+def _managed(server, model: str, **kwargs) -> ManagedLLMProvider:
+    with patch.object(settings, "LLM_BASE_URL", server.url), patch.object(settings, "LLM_API_KEY", "test"), \
+         patch.object(settings, "LLM_MODEL", model):
+        provider = OpenAICompatibleProvider()
+    return ManagedLLMProvider(provider, base_delay=0.01, **kwargs)
+
+def test_parse_duration():
+    assert parse_duration("20ms") == pytest.approx(0.02)
+    assert parse_duration("7.66s") == pytest.approx(7.66)
+    assert parse_duration("6m0s") == pytest.approx(360)
+    assert parse_duration("2") == 2
+    assert parse_duration("soon") is None
+
+@pytest.mark.asyncio
+async def test_retries_rate_limited_requests():
+    async with stub_openai_server(['{"action": "finish"}'], fail_first=2) as server:
+        llm = _managed(server, "mw-retry")
+        assert await llm.generate(MESSAGES) == '{"action": "finish"}'
+    assert server.requests == 3
+    assert llm.stats["retries"] == 2
+
+@pytest.mark.asyncio
+async def test_gives_up_after_max_retries():
+    async with stub_openai_server(["{}"], fail_first=10, fail_status=503) as server:
+        llm = _managed(server, "mw-give-up", max_retries=1)
+        with pytest.raises(Exception):
+            await llm.generate(MESSAGES)
+    assert server.requests == 2
+
+@pytest.mark.asyncio
+async def test_caps_concurrency_per_model():
+    async with stub_openai_server(["{}"], delay=0.05) as server:
+        llm = _managed(server, "mw-concurrency", max_concurrency=2)
+        await asyncio.gather(*[llm.generate([{"role": "user", "content": str(i)}]) for i in range(6)])
+    assert server.requests == 6
+    assert server.max_active == 2
+
+@pytest.mark.asyncio
+async def test_coalesces_identical_concurrent_prompts():
+    async with stub_openai_server(['{"action": "wait"}'], delay=0.05) as server:
+        llm = _managed(server, "mw-coalesce")
+        results = await asyncio.gather(*[llm.generate(MESSAGES) for _ in range(5)])
+    assert results == ['{"action": "wait"}'] * 5
+    assert server.requests == 1
+    assert llm.stats["coalesced"] == 4
+
+@pytest.mark.asyncio
+async def test_exhausted_rate_limit_headers_pause_next_request():
+    headers = {"x-ratelimit-remaining-requests": "0", "x-ratelimit-reset-requests": "200ms"}
+    async with stub_openai_server(["{}"], headers=headers) as server:
+        llm = _managed(server, "mw-headers")
+        await llm.generate([{"role": "user", "content": "a"}])
+        started = time.monotonic()
+        await llm.generate([{"role": "user", "content": "b"}])
+    assert time.monotonic() - started >= 0.15
+    assert llm.stats["throttled"] == 1
+
+@pytest.mark.asyncio
+async def test_same_model_on_another_endpoint_has_its_own_limits():
+    headers = {"x-ratelimit-remaining-requests": "0", "x-ratelimit-reset-requests": "500ms"}
+    async with stub_openai_server(["{}"], headers=headers) as first, stub_openai_server(["{}"]) as second:
+        exhausted, other = _managed(first, "mw-endpoints"), _managed(second, "mw-endpoints")
+        await exhausted.generate(MESSAGES)
+        started = time.monotonic()
+        await other.generate(MESSAGES)
+    assert time.monotonic() - started < 0.3
+    assert other.stats["throttled"] == 0
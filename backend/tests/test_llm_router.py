@@ -0,0 +1,82 @@
+import time
+import asyncio
+import pytest
+from unittest.mock import patch
+from prometheus_client import REGISTRY
+from app.agents.llm import LLMProvider
+from app.agents.llm_router import Backend, RouterLLMProvider
+from app.agents.planner import Planner
+from app.core.config import settings
+
+MESSAGES = [{"role": "user", "content": "plan"}]
+
+class FakeProvider(LLMProvider):
+    def __init__(self, delay: float, response: str = '{"action": "wait"}', fail: bool = False):
+        self.delay, self.response, self.fail = delay, response, fail
+        self.calls = 0
+
+    async def generate(self, messages, json_mode=True):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise ConnectionError("backend down")
+        return self.response
+
+def _router(*providers, hedge=False):
+    return RouterLLMProvider([Backend(f"b{i}", p, cost_per_1k_input=1.0) for i, p in enumerate(providers)], hedge=hedge)
+
+@pytest.mark.asyncio
+async def test_routes_to_the_faster_backend():
+    slow, fast = FakeProvider(0.05), FakeProvider(0.01)
+    router = _router(slow, fast)
+    for _ in range(6):
+        await router.generate(MESSAGES)
+    # Each backend is sampled once, then the fast one takes the traffic
+    assert slow.calls == 1 and fast.calls == 5
+    snapshot = router.snapshot()
+    assert snapshot["b1"]["wins"] == 5 and snapshot["b1"]["cost"] > 0
+
+@pytest.mark.asyncio
+async def test_hedges_a_slow_call():
+    stuck, quick = FakeProvider(2.0, '{"action": "slow"}'), FakeProvider(0.01, '{"action": "hedged"}')
+    router = _router(stuck, quick, hedge=True)
+    router.backends[0].latencies.extend([0.01] * 30)
+    router.backends[1].latencies.extend([0.5] * 30)
+
+    started = time.monotonic()
+    assert await router.generate(MESSAGES) == '{"action": "hedged"}'
+    assert time.monotonic() - started < 0.5
+    await asyncio.sleep(0)
+    assert router.backends[0].stats["hedges"] == 1
+    assert router.backends[0].stats["cancelled"] == 1
+
+def _sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+@pytest.mark.asyncio
+async def test_backend_latency_and_decisions_are_exported():
+    router = RouterLLMProvider([Backend("metrics-ok", FakeProvider(0.01)),
+                                Backend("metrics-down", FakeProvider(0.01, fail=True))])
+    router.backends[0].latencies.append(10.0)  # the failing backend is ranked first
+    await router.generate(MESSAGES)
+    assert _sample("rpa_llm_backend_request_seconds_count", backend="metrics-down", outcome="error") == 1
+    assert _sample("rpa_llm_backend_request_seconds_count", backend="metrics-ok", outcome="success") == 1
+    assert _sample("rpa_llm_backend_events_total", backend="metrics-ok", event="wins") == 1
+
+@pytest.mark.asyncio
+async def test_fails_over_on_errors_and_invalid_json():
+    down, garbled, healthy = FakeProvider(0, fail=True), FakeProvider(0, "not json"), FakeProvider(0)
+    router = _router(down, garbled, healthy)
+    assert await router.generate(MESSAGES) == '{"action": "wait"}'
+    assert (down.calls, garbled.calls, healthy.calls) == (1, 1, 1)
+    # The failing backend is ranked last from now on
+    assert router.ranked()[-1].name == "b0"
+
+@pytest.mark.asyncio
+async def test_planner_metrics_name_the_backend_that_answered():
+    provider = FakeProvider(0.01, '{"action": "finish", "args": {}}')
+    provider.model = "served-model"
+    router = RouterLLMProvider([Backend("served", provider)])
+    with patch("app.agents.planner.llm_service", router), patch.object(settings, "PLAN_CACHE_ENABLED", False):
+        await Planner().plan("task", [], "Current URL: a")
+    assert _sample("rpa_llm_request_seconds_count", provider="FakeProvider", model="served-model", tier="default") == 1
@@ -0,0 +1,42 @@
+import pytest
+from unittest.mock import AsyncMock, patch
+from httpx import AsyncClient, ASGITransport
+from app.main import app
+from app.api.broadcast import broadcaster
+from app.core import scheduler
+from app.tools.executor import tool_executor
+
+async def _scrape() -> str:
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        response = await ac.get("/metrics")
+    assert response.status_code == 200
+    return response.text
+
+def _value(text: str, sample: str) -> float:
+    line = next((line for line in text.splitlines() if line.startswith(sample + " ")), f"{sample} 0")
+    return float(line.rsplit(" ", 1)[1])
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint_reports_queue_depth_and_hot_path_metrics(mock_browser):
+    redis = await scheduler.get_redis()
+    await redis.delete("celery")
+    await redis.rpush("celery", "a", "b", "c")
+
+    with patch.object(scheduler.fair_scheduler, "broker", AsyncMock(return_value=redis)):
+        before = await _scrape()
+        await tool_executor.execute("no_such_tool", AsyncMock())
+        broadcaster._dispatch(b"session_updates:s1", b'{"type": "chat"}')
+        after = await _scrape()
+    await redis.delete("celery")
+
+    assert _value(after, 'rpa_queue_depth{queue="celery"}') == 3
+    tool = 'rpa_tool_seconds_count{success="false",tool="unknown"}'
+    assert _value(after, tool) == _value(before, tool) + 1
+    messages = 'rpa_pubsub_messages_total{kind="updates"}'
+    assert _value(after, messages) == _value(before, messages) + 1
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint_survives_an_unreachable_broker():
+    with patch.object(scheduler.fair_scheduler, "broker", AsyncMock(side_effect=ConnectionError("down"))):
+        text = await _scrape()
+    assert "rpa_session_duration_seconds" in text
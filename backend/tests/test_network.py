@@ -0,0 +1,110 @@
+import os
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from app.browser.network import DiskCache, NetworkRouter, freshness_lifetime
+from app.core.config import settings
+
+class Request:
+    def __init__(self, url, resource_type="script", method="GET", headers=None):
+        self.url = url
+        self.resource_type = resource_type
+        self.method = method
+        self.headers = headers or {}
+        self.frame = MagicMock(parent_frame=None)
+
+    def is_navigation_request(self):
+        return self.resource_type == "document"
+
+    async def all_headers(self):
+        return self.headers
+
+def _route(status=200, headers=None, body=b"console.log(1)"):
+    response = MagicMock(status=status, headers=headers or {}, body=AsyncMock(return_value=body))
+    return MagicMock(abort=AsyncMock(), continue_=AsyncMock(), fulfill=AsyncMock(),
+                     fetch=AsyncMock(return_value=response))
+
+def test_freshness_and_lru_eviction(tmp_path):
+    now = 1_700_000_000.0
+    assert freshness_lifetime({"cache-control": "public, max-age=600"}, now) == 600
+    assert freshness_lifetime({"cache-control": "private, max-age=600"}, now) is None
+    assert freshness_lifetime({"cache-control": "max-age=600, s-maxage=60"}, now) == 60
+    assert freshness_lifetime({"cache-control": "max-age=600", "vary": "Cookie"}, now) is None
+    assert freshness_lifetime({"cache-control": "no-cache"}, now) == 0
+    assert freshness_lifetime({"date": "Tue, 14 Nov 2023 22:13:20 GMT",
+                               "expires": "Tue, 14 Nov 2023 23:13:20 GMT"}, now) == 3600
+
+    cache = DiskCache(root=str(tmp_path), max_bytes=3000)
+    for name in ("a", "b", "c"):
+        cache._write(cache.key(name), {"expires": now}, b"x" * 900)
+    cache._read(cache.key("a"))  # now the most recently used
+    cache._write(cache.key("d"), {"expires": now}, b"x" * 900)
+    assert cache._read(cache.key("b")) is None  # least recently used went first
+    assert cache._read(cache.key("a")) is not None and cache._read(cache.key("d")) is not None
+    assert cache._size <= 3000
+
+    # Another process sharing the directory sees the entries on its first access
+    other = DiskCache(root=str(tmp_path), max_bytes=3000)
+    assert other._read(other.key("a"))[1] == b"x" * 900
+
+@pytest.mark.asyncio
+async def test_router_blocks_and_shares_cached_assets_across_contexts(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "NETWORK_BLOCK", ["tracking", "image"])
+    monkeypatch.setattr(settings, "NETWORK_BLOCK_DOMAINS", ["ads.example.net"])
+    router = NetworkRouter(cache=DiskCache(root=str(tmp_path)))
+    first, second = MagicMock(), MagicMock()
+
+    for url, resource_type in (("https://www.google-analytics.com/analytics.js", "script"),
+                               ("https://cdn.ads.example.net/banner.js", "script"),
+                               ("https://shop.test/logo.png", "image")):
+        route = _route()
+        await router.handle(first, route, Request(url, resource_type))
+        route.abort.assert_awaited_once_with("blockedbyclient")
+
+    route = _route()
+    await router.handle(first, route, Request("https://shop.test/", "document"))
+    route.continue_.assert_awaited_once()
+
+    headers = {"cache-control": "public, max-age=3600", "content-encoding": "gzip", "content-length": "20"}
+    route = _route(headers=headers)
+    await router.handle(first, route, Request("https://shop.test/app.js"))
+    route.fetch.assert_awaited_once()
+    fulfilled = route.fulfill.await_args.kwargs
+    assert fulfilled["body"] == b"console.log(1)" and "content-encoding" not in fulfilled["headers"]
+
+    route = _route()
+    await router.handle(second, route, Request("https://shop.test/app.js"))
+    route.fetch.assert_not_awaited()
+    assert route.fulfill.await_args.kwargs["body"] == b"console.log(1)"
+
+    # Requests carrying credentials bypass the shared cache: the response may be personalised
+    route = _route()
+    await router.handle(second, route, Request("https://shop.test/app.js", headers={"cookie": "sid=1"}))
+    route.continue_.assert_awaited_once()
+    route.fetch.assert_not_awaited()
+
+    assert router.stats(first).as_dict()["blocked"] == 3
+    assert router.stats(first).bytes_transferred == len(b"console.log(1)")
+    assert router.stats(second).cache_hits == 1 and router.stats(second).bytes_transferred == 0
+
+    # Pool reset: the next lease of a context starts from zero
+    await router.reset_hook(MagicMock(context=first))
+    assert router.stats(first).requests == 0
+
+@pytest.mark.asyncio
+async def test_stale_entry_is_revalidated(tmp_path):
+    router = NetworkRouter(cache=DiskCache(root=str(tmp_path)))
+    context = MagicMock()
+    route = _route(headers={"cache-control": "no-cache", "etag": '"v1"'}, body=b"body{}")
+    await router.handle(context, route, Request("https://shop.test/site.css", "stylesheet"))
+
+    route = _route(status=304, headers={"cache-control": "max-age=60"}, body=b"")
+    await router.handle(context, route, Request("https://shop.test/site.css", "stylesheet"))
+    assert route.fetch.await_args.kwargs["headers"]["if-none-match"] == '"v1"'
+    assert route.fulfill.await_args.kwargs["body"] == b"body{}"
+    assert router.stats(context).revalidated == 1
+
+    # The 304 refreshed the entry's lifetime: no request at all this time
+    route = _route()
+    await router.handle(context, route, Request("https://shop.test/site.css", "stylesheet"))
+    route.fetch.assert_not_awaited()
+    assert len(os.listdir(tmp_path)) == 1
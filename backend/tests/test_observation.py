@@ -0,0 +1,80 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from app.browser.observation import PageObserver, estimate_tokens
+
+def _snapshot(doc="d1", epoch=1, elements=None, text="Welcome"):
+    elements = elements if elements is not None else [
+        {"role": "textbox", "name": "Email", "selector": "#email"},
+        {"role": "button", "name": "Sign in", "selector": "#submit"},
+    ]
+    return {"doc": doc, "epoch": epoch, "unchanged": False, "title": "Login",
+            "elements": elements, "total": len(elements), "text": text}
+
+def _page(*results):
+    page = MagicMock()
+    page.url = "https://example.com/login"
+    page.evaluate = AsyncMock(side_effect=list(results))
+    return page
+
+@pytest.mark.asyncio
+async def test_full_digest_then_diffs_then_cache():
+    changed = _snapshot(epoch=2, elements=[
+        {"role": "textbox", "name": "Email", "selector": "#email", "value": "a@b.c"},
+        {"role": "button", "name": "Sign in", "selector": "#submit"},
+        {"role": "link", "name": "Forgot password?", "selector": "#forgot"},
+    ])
+    page = _page(_snapshot(), changed, {"doc": "d1", "epoch": 2, "unchanged": True})
+    observer = PageObserver(page, token_budget=500)
+
+    full = await observer.observe()
+    assert '[1] textbox "Email" -> #email' in full
+    assert '[2] button "Sign in" -> #submit' in full
+    assert "Welcome" in full
+
+    diff = await observer.observe()
+    assert '~ [1] textbox "Email" value="a@b.c" -> #email' in diff
+    assert '+ [3] link "Forgot password?" -> #forgot' in diff
+    assert "Sign in" not in diff and "Welcome" not in diff
+
+    # Same document and epoch: the page skips the DOM walk and nothing is resent.
+    unchanged = await observer.observe()
+    assert "No element changes." in unchanged
+    assert page.evaluate.await_args.args[1] == {"doc": "d1", "epoch": 2, "maxElements": 300, "maxText": 2000}
+    assert observer.stats["cached"] == 1
+
+@pytest.mark.asyncio
+async def test_navigation_and_reset_send_full_digest():
+    page = _page(_snapshot(), _snapshot(doc="d2"), _snapshot(doc="d2", epoch=3))
+    observer = PageObserver(page, token_budget=500)
+    await observer.observe()
+    assert "Interactive elements" in await observer.observe()  # new document
+    observer.reset()
+    assert "Interactive elements" in await observer.observe()
+    assert observer.stats["full"] == 3
+
+@pytest.mark.asyncio
+async def test_digest_respects_token_budget():
+    elements = [{"role": "link", "name": f"Result number {i}", "selector": f"#r{i}"} for i in range(500)]
+    page = _page({**_snapshot(elements=elements, text="x" * 10000), "total": 800})
+    observation = await PageObserver(page, token_budget=400).observe()
+    assert estimate_tokens(observation) <= 400
+    assert "more elements not shown" in observation
+
+@pytest.mark.asyncio
+async def test_falls_back_to_url_when_page_cannot_be_evaluated():
+    page = _page(RuntimeError("Execution context was destroyed"))
+    assert await PageObserver(page).observe() == "Current URL: https://example.com/login"
+
+@pytest.mark.asyncio
+async def test_elements_cut_by_the_budget_are_sent_in_a_later_diff():
+    elements = [{"role": "link", "name": f"Result number {i}", "selector": f"#r{i}"} for i in range(40)]
+    page = _page(_snapshot(elements=elements, text=""), _snapshot(epoch=2, elements=elements, text=""))
+    observer = PageObserver(page, token_budget=200)
+    full = await observer.observe()
+    assert "#r11" in full and "#r12" not in full
+
+    # Nothing changed on the page, but the elements the budget hid have not been seen yet
+    diff = await observer.observe()
+    assert "No element changes." not in diff
+    assert '+ [13] link "Result number 12" -> #r12' in diff
+    assert "Result number 11\"" not in diff
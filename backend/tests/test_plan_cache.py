@@ -0,0 +1,53 @@
+import json
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from app.agents.planner import Planner
+from app.agents.plan_cache import PlanCache
+from app.core.config import settings
+
+PLAN = {"thought_summary": "t", "action": "click", "args": {"selector": "#go"}, "confidence": 1.0, "done": False}
+
+def _step(execution_time):
+    return {"step": 0, "plan": PLAN, "result": {"success": True, "output": "ok", "execution_time": execution_time,
+                                                "wait_time": execution_time / 2, "settled": execution_time < 0.5}}
+
+@pytest.mark.asyncio
+async def test_identical_prompts_skip_the_model():
+    llm = MagicMock(spec=["model", "generate"], model="test-model")
+    llm.generate = AsyncMock(return_value=json.dumps(PLAN))
+    cache = PlanCache(shared=True)
+    with patch("app.agents.planner.llm_service", llm), patch("app.agents.planner.plan_cache", cache), \
+         patch.object(settings, "PLAN_CACHE_ENABLED", True):
+        planner = Planner()
+
+        # Timings differ between runs but do not change the key.
+        assert await planner.plan("task", [_step(0.1)], "Current URL: a") == PLAN
+        assert await planner.plan("task", [_step(0.7)], "Current URL: a") == PLAN
+        assert llm.generate.await_count == 1
+
+        # A different browser context is a miss; opting out always calls the model.
+        await planner.plan("task", [_step(0.1)], "Current URL: b")
+        await planner.plan("task", [_step(0.1)], "Current URL: a", use_cache=False)
+        assert llm.generate.await_count == 3
+
+        # A second worker (empty local tier) is served from Redis.
+        other = PlanCache(shared=True)
+        with patch("app.agents.planner.plan_cache", other):
+            assert await planner.plan("task", [_step(0.3)], "Current URL: a") == PLAN
+        assert llm.generate.await_count == 3
+        assert other.stats["shared_hits"] == 1
+        assert cache.stats["local_hits"] == 1
+
+@pytest.mark.asyncio
+async def test_local_tier_evicts_lru_and_expires():
+    cache = PlanCache(max_entries=2, ttl=60, shared=False)
+    await cache.set("a", "1")
+    await cache.set("b", "2")
+    assert await cache.get("a") == "1"
+    await cache.set("c", "3")
+    assert await cache.get("b") is None
+    assert await cache.get("a") == "1"
+
+    cache._local["a"] = (0, "1")
+    assert await cache.get("a") is None
+    assert cache.hit_rate == pytest.approx(2 / 4)
@@ -0,0 +1,59 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from app.browser.observation import VERSION_SCRIPT
+from app.tools.executor import ToolExecutor
+from app.tools.prefetch import ObservationPrefetcher
+
+class FakePage:
+    def __init__(self):
+        self.url = "https://shop.test/cart"
+        self.epoch = 0
+        self.text_reads = 0
+        self.screenshot = AsyncMock(return_value=b"jpeg")
+        self.set_default_timeout = MagicMock()
+        self.on = MagicMock()
+        self.on_text = None
+
+    async def evaluate(self, script, *args):
+        if script == VERSION_SCRIPT:
+            return {"doc": "d1", "epoch": self.epoch, "ready": "complete"}
+        self.text_reads += 1
+        if self.on_text:
+            self.on_text()
+        await asyncio.sleep(0.01)
+        return f"Total: ${10 + self.epoch}"
+
+@pytest.mark.asyncio
+async def test_prefetched_text_is_served_until_the_dom_changes(monkeypatch):
+    prefetcher = ObservationPrefetcher()
+    monkeypatch.setattr("app.tools.executor.observation_prefetcher", prefetcher)
+    monkeypatch.setattr("app.core.screenshots.screenshot_store", None)
+    page = FakePage()
+
+    prefetcher.start(page)  # the planner is thinking
+    result = await ToolExecutor().execute("get_page_text", page)
+    assert result.success and result.output == "Total: $10"
+    assert page.text_reads == 1 and prefetcher.stats["hits"] == 1
+
+    result = await ToolExecutor().execute("get_screenshot", page)
+    assert result.success and result.screenshot_base64
+    assert page.screenshot.await_count == 1
+
+    page.epoch += 1  # the page changed: read it again
+    result = await ToolExecutor().execute("get_page_text", page)
+    assert result.output == "Total: $11" and page.text_reads == 2
+    assert prefetcher.stats["misses"] == 1
+
+@pytest.mark.asyncio
+async def test_capture_that_raced_a_mutation_is_discarded():
+    prefetcher = ObservationPrefetcher()
+    page = FakePage()
+    page.on_text = lambda: setattr(page, "epoch", page.epoch + 1)
+
+    prefetcher.start(page)
+    assert await prefetcher.result("get_page_text", page, {}) is None
+    assert prefetcher.stats["discarded"] == 1
+
+    # Non-default arguments are never answered from the cache
+    assert await prefetcher.result("get_page_text", MagicMock(), {"selector": "#x"}) is None
@@ -0,0 +1,93 @@
+import pytest
+from unittest.mock import AsyncMock, patch
+from app.agents.orchestrator import AgentOrchestrator
+from app.agents.recipes import build_recipe, instantiate, normalize_task
+from app.core.config import settings
+from app.core.session import session_manager
+
+def _step(plan, url="https://shop.test/orders", success=True):
+    return {"plan": plan, "result": {"success": success}, "url": url}
+
+def test_recipe_binds_only_parameters_used_by_actions():
+    steps = [
+        _step({"action": "open_url", "args": {"url": "https://shop.test/orders"}}),
+        _step({"action": "click", "args": {"selector": "#broken"}}, success=False),
+        _step({"actions": [{"action": "type_text", "args": {"selector": "#qty-3", "text": "3"}},
+                           {"action": "type_text", "args": {"selector": "#email", "text": "jane@x.com"}}]}),
+    ]
+    recipe = build_recipe('Order 3 of "Blue Mug" for jane@x.com on https://shop.test/orders', steps, "Ordered for jane@x.com")
+    assert recipe["shape"] == "order {p0} of {p1} for {p2} on {p3}"
+    assert recipe["literals"] == {"1": "Blue Mug"}  # never typed, so it must match exactly
+    assert len(recipe["steps"]) == 2  # the failed click is dropped
+    assert recipe["steps"][1]["actions"][0]["args"] == {"selector": "#qty-3", "text": "{p0}"}
+
+    _, params = normalize_task('Order 5 of "Blue Mug" for bob@y.org on https://shop.test/orders')
+    plans = instantiate(recipe, params)
+    assert [a["args"]["text"] for a in plans[1]["actions"]] == ["5", "bob@y.org"]
+    assert plans[-1]["action"] == "finish" and plans[-1]["args"]["final_answer"] == "Ordered for bob@y.org"
+
+def test_answer_read_from_the_page_is_not_replayed():
+    steps = [_step({"action": "get_page_text", "args": {}})]
+    assert build_recipe("Read the price", steps, "$5")["final_answer"] is None
+
+    # The element digest shows page text too, so an answer given after it may come from the page
+    steps = [{**_step({"action": "open_url", "args": {"url": "https://shop.test"}}),
+              "observation": "Current URL: https://shop.test\nTitle: Shop\nPrice: $5"}]
+    assert build_recipe("Read the price", steps, "$5")["final_answer"] is None
+    steps[0]["observation"] = "Current URL: https://shop.test"
+    assert build_recipe("Read the price", steps, "$5")["final_answer"] == "$5"
+
+def test_recipes_are_kept_per_tenant():
+    steps = [_step({"action": "open_url", "args": {"url": "https://shop.test"}})]
+    acme, other = build_recipe("Open the shop", steps, "ok", "acme"), build_recipe("Open the shop", steps, "ok", "other")
+    assert acme["tenant"] == "acme" and acme["_id"] != other["_id"]
+
+class InMemoryRecipeStore:
+    def __init__(self):
+        self.recipes, self.reports = {}, []
+
+    async def match(self, task, tenant="default"):
+        shape, params = normalize_task(task)
+        recipe = self.recipes.get((tenant, shape))
+        return instantiate(recipe, params) if recipe else None
+
+    async def record(self, task, steps, final_answer, tenant="default"):
+        recipe = build_recipe(task, steps, final_answer, tenant)
+        self.recipes[(tenant, recipe["shape"])] = recipe
+
+    async def report(self, recipe_id, success):
+        self.reports.append(success)
+
+@pytest.mark.asyncio
+async def test_replay_skips_the_llm_and_falls_back_on_divergence(mock_browser, monkeypatch):
+    monkeypatch.setattr(settings, "RECIPES_ENABLED", True)
+    # URL-only observations, so the recorded answer is replayed as well
+    monkeypatch.setattr(settings, "OBSERVATION_MODE", "url")
+    store = InMemoryRecipeStore()
+    orchestrator = AgentOrchestrator()
+
+    with patch("app.agents.orchestrator.recipe_store", store):
+        # MockLLMProvider: open_url -> type_text "Agentic RPA" -> finish
+        session_id = await session_manager.create_session()
+        await orchestrator.run_session(session_id, 'Search for "Agentic RPA"', wait_for_input=False)
+        assert store.recipes
+
+        with patch("app.agents.orchestrator.planner.plan", new_callable=AsyncMock) as plan:
+            session_id = await session_manager.create_session()
+            await orchestrator.run_session(session_id, 'Search for "Agentic RPA"', wait_for_input=False)
+            plan.assert_not_called()
+        session = await session_manager.get_session(session_id)
+        assert session["status"] == "completed"
+        assert session["steps"][1]["plan"]["args"]["text"] == "Agentic RPA"
+        assert store.reports == [True]
+
+        # The fill fails on replay, so the planner finishes the task.
+        page = await mock_browser.return_value.new_page()
+        page.fill.side_effect = [RuntimeError("element not found"), None]
+        session_id = await session_manager.create_session()
+        await orchestrator.run_session(session_id, 'Search for "Agentic RPA"', wait_for_input=False)
+        session = await session_manager.get_session(session_id)
+        assert session["status"] == "completed"
+        assert store.reports == [True, False]
+        assert not session["steps"][-1]["result"]["success"]
+        assert session["result"] == "Searched for Agentic RPA"
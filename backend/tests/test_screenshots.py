@@ -0,0 +1,54 @@
+import os
+import time
+import pytest
+from unittest.mock import patch
+from httpx import AsyncClient, ASGITransport
+from app.main import app
+from app.core.screenshots import FileScreenshotStore, screenshot_ref
+
+@pytest.mark.asyncio
+async def test_file_store_dedups_identical_frames(tmp_path):
+    store = FileScreenshotStore(root=str(tmp_path))
+    ref1 = await store.put(b"frame-a")
+    ref2 = await store.put(b"frame-a")
+    ref3 = await store.put(b"frame-b")
+
+    assert ref1 == ref2 == screenshot_ref(b"frame-a")
+    assert ref3 != ref1
+    assert len(list(tmp_path.rglob("*.jpg"))) == 2
+    assert await store.get(ref1) == b"frame-a"
+    assert await store.get("0" * 64) is None
+
+@pytest.mark.asyncio
+async def test_screenshot_endpoint_serves_bytes_with_cache_headers(tmp_path):
+    store = FileScreenshotStore(root=str(tmp_path))
+    ref = await store.put(b"\xff\xd8jpeg-bytes")
+
+    with patch("app.api.endpoints.screenshot_store", store):
+        transport = ASGITransport(app=app)
+        async with AsyncClient(transport=transport, base_url="http://test") as ac:
+            response = await ac.get(f"/api/v1/screenshots/{ref}")
+            cached = await ac.get(f"/api/v1/screenshots/{ref}", headers={"If-None-Match": f'"{ref}"'})
+            missing = await ac.get("/api/v1/screenshots/not-a-ref")
+
+    assert response.status_code == 200
+    assert response.content == b"\xff\xd8jpeg-bytes"
+    assert response.headers["content-type"] == "image/jpeg"
+    assert "immutable" in response.headers["cache-control"]
+    assert cached.status_code == 304
+    assert missing.status_code == 404
+
+@pytest.mark.asyncio
+async def test_file_store_prunes_frames_past_retention(tmp_path):
+    store = FileScreenshotStore(root=str(tmp_path))
+    old, new = await store.put(b"old-frame"), await store.put(b"new-frame")
+    stale = time.time() - 7200
+    os.utime(store._path(old), (stale, stale))
+
+    assert await store.prune(time.time() - 3600) == 1
+    assert await store.get(old) is None and await store.get(new) == b"new-frame"
+
+    # A frame stored again (another session saw the same page) counts as recent
+    os.utime(store._path(new), (stale, stale))
+    await FileScreenshotStore(root=str(tmp_path)).put(b"new-frame")
+    assert await store.prune(time.time() - 3600) == 0
@@ -0,0 +1,64 @@
+import pytest
+import asyncio
+from unittest.mock import patch
+from app.core import session as session_module
+from app.core.session import SessionManager
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("backend", ["json", "hash"])
+async def test_session_store_roundtrip(backend):
+    manager = SessionManager(backend=backend)
+    session_id = await manager.create_session()
+
+    await manager.update_session(session_id, {"status": "running", "task": "t", "memory": {"k": 1}})
+    for i in range(5):
+        await manager.add_step(session_id, {"step": i, "plan": {"action": "click"}})
+
+    session = await manager.get_session(session_id)
+    assert session["status"] == "running"
+    assert session["memory"] == {"k": 1}
+    assert session["step_count"] == 5
+    assert [s["step"] for s in session["steps"]] == [0, 1, 2, 3, 4]
+
+    page = await manager.get_session(session_id, step_offset=2, step_limit=2)
+    assert [s["step"] for s in page["steps"]] == [2, 3]
+    assert page["step_count"] == 5
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("backend", ["json", "hash"])
+async def test_session_store_ignores_unknown_sessions(backend):
+    manager = SessionManager(backend=backend)
+    await manager.update_session("missing", {"status": "running"})
+    await manager.add_step("missing", {"step": 0})
+    assert await manager.get_session("missing") is None
+
+@pytest.mark.asyncio
+async def test_hash_store_concurrent_writers_do_not_lose_updates():
+    manager = SessionManager(backend="hash")
+    session_id = await manager.create_session()
+
+    redis = await session_module.get_redis()
+    with patch.object(redis, "register_script", wraps=redis.register_script) as register:
+        await asyncio.gather(
+            *[manager.add_step(session_id, {"step": i}) for i in range(50)],
+            manager.update_session(session_id, {"status": "running"}),
+            manager.update_session(session_id, {"result": "done"}),
+        )
+    assert register.call_count == 2  # each script is registered once, not per write
+
+    session = await manager.get_session(session_id)
+    assert session["step_count"] == 50
+    assert session["status"] == "running" and session["result"] == "done"
+
+@pytest.mark.asyncio
+async def test_hash_store_converts_sessions_written_by_the_json_store():
+    legacy, manager = SessionManager(backend="json"), SessionManager(backend="hash")
+    session_id = await legacy.create_session()
+    await legacy.add_step(session_id, {"step": 0, "plan": {"action": "click"}})
+
+    session = await manager.get_session(session_id, step_limit=0)
+    assert session["status"] == "ready" and session["step_count"] == 1 and session["steps"] == []
+    await manager.add_step(session_id, {"step": 1, "plan": {"action": "click"}})
+    await manager.update_session(session_id, {"status": "running"})
+    session = await manager.get_session(session_id)
+    assert session["status"] == "running" and [s["step"] for s in session["steps"]] == [0, 1]
@@ -0,0 +1,54 @@
+import pytest
+from unittest.mock import AsyncMock, patch
+from app.agents.orchestrator import AgentOrchestrator
+from app.api.endpoints import deliver_input
+from app.core.config import settings
+from app.core.inbox import session_inbox
+from app.core.session import session_manager
+
+@pytest.mark.asyncio
+async def test_deliver_input_resumes_suspended_session_once():
+    session_id = await session_manager.create_session()
+
+    with patch("app.api.endpoints.run_agent_task") as task:
+        await deliver_input(session_id, "first")
+        task.delay.assert_not_called()  # not suspended: a waiting worker will BLPOP it
+
+        await session_manager.update_session(session_id, {"status": "suspended"})
+        await deliver_input(session_id, "second")
+        await deliver_input(session_id, "third")
+
+    task.delay.assert_called_once()
+    assert task.delay.call_args.args == (session_id,) and task.delay.call_args.kwargs["resume"] is True
+    assert (await session_manager.get_session(session_id))["status"] == "resuming"
+    assert [await session_inbox.pop(session_id) for _ in range(3)] == ["first", "second", "third"]
+    await session_inbox.release_resume(session_id)
+
+@pytest.mark.asyncio
+async def test_idle_session_is_suspended_and_resumed(mock_browser, monkeypatch):
+    monkeypatch.setattr(settings, "SESSION_IDLE_TIMEOUT", 0.1)
+    context = mock_browser.return_value
+    context.storage_state = AsyncMock(return_value={"cookies": [{"name": "sid"}], "origins": []})
+
+    orchestrator = AgentOrchestrator()
+    session_id = await session_manager.create_session()
+    await orchestrator.run_session(session_id, "Test task")
+
+    session = await session_manager.get_session(session_id)
+    assert session["status"] == "suspended"
+    assert session["result"] == "Searched for Agentic RPA"
+    snapshot = await session_manager.load_snapshot(session_id)
+    assert snapshot["storage_state"]["cookies"] == [{"name": "sid"}]
+    assert snapshot["url"] == "https://google.com"
+    context.close.assert_awaited()
+
+    # A follow-up message brings the session back with its storage state and history.
+    await session_inbox.push(session_id, "Follow-up task")
+    assert await session_inbox.claim_resume(session_id)
+    await orchestrator.run_session(session_id, None, resume=True)
+
+    assert mock_browser.await_args.kwargs["storage_state"] == snapshot["storage_state"]
+    session = await session_manager.get_session(session_id)
+    assert session["task"] == "Follow-up task"
+    assert session["status"] == "suspended"
+    assert await session_inbox.claim_resume(session_id)  # the claim was released
@@ -0,0 +1,64 @@
+import asyncio
+import pytest
+from unittest.mock import patch
+from app.agents.orchestrator import AgentOrchestrator
+from app.agents.side_effects import SideEffectPipeline
+from app.core.session import session_manager
+
+@pytest.mark.asyncio
+async def test_effects_run_in_order_with_backpressure_and_survive_failures():
+    pipeline = SideEffectPipeline("s1", max_pending=2)
+    done, release = [], asyncio.Event()
+
+    def effect(i):
+        async def run():
+            if i == 0:
+                await release.wait()
+            if i == 2:
+                raise RuntimeError("redis down")
+            done.append(i)
+        return run
+
+    await pipeline.submit("e0", effect(0))
+    await asyncio.sleep(0.01)  # e0 is running...
+    for i in (1, 2):
+        await pipeline.submit(f"e{i}", effect(i))  # ...and e1, e2 fill the queue
+    blocked = asyncio.create_task(pipeline.submit("e3", effect(3)))
+    await asyncio.sleep(0.01)
+    assert not blocked.done()  # backpressure: the submitter waits for the slow effect
+
+    release.set()
+    await blocked
+    await pipeline.flush()
+    assert done == [0, 1, 3]
+    assert pipeline.stats["failed"] == 1 and pipeline.stats["blocked"] == 1
+    await pipeline.close()
+
+@pytest.mark.asyncio
+async def test_next_plan_starts_before_the_step_is_persisted(mock_browser):
+    events = []
+    add_step = session_manager.add_step
+
+    async def slow_add_step(session_id, step_data):
+        events.append(("persist_start", step_data["step"]))
+        await asyncio.sleep(0.05)
+        await add_step(session_id, step_data)
+        events.append(("persist_end", step_data["step"]))
+
+    from app.agents.orchestrator import planner
+    plan = planner.plan
+
+    async def recording_plan(*args, **kwargs):
+        events.append(("plan", None))
+        return await plan(*args, **kwargs)
+
+    session_id = await session_manager.create_session()
+    with patch.object(session_manager, "add_step", slow_add_step), \
+         patch("app.agents.orchestrator.planner.plan", recording_plan):
+        await AgentOrchestrator().run_session(session_id, 'Search for "Agentic RPA"', wait_for_input=False)
+
+    # Step 0's write is still in flight when the second plan call starts
+    assert events.index(("plan", None), 1) < events.index(("persist_end", 0))
+    session = await session_manager.get_session(session_id)
+    # ...and the completed status is only written after every step was persisted
+    assert session["status"] == "completed" and [s["step"] for s in session["steps"]] == [0, 1]
@@ -0,0 +1,88 @@
+import json
+import time
+import random
+import asyncio
+import pytest
+from unittest.mock import patch
+from app.agents.llm import OpenAICompatibleProvider
+from app.agents.orchestrator import AgentOrchestrator
+from app.agents.planner import Planner
+from app.agents.stream_parser import PlanStreamParser
+from app.core.config import settings
+from app.core.session import session_manager
+from app.tools.actions import ToolResult
+from tests.llm_stub import stub_openai_server
+
+PLAN = {"action": "open_url", "args": {"url": "https://example.com/{a}"},
+        "thought_summary": "Open the \"example\" page — then look around.\nDone soon.",
+        "confidence": 0.9, "done": False}
+
+def test_parser_handles_any_chunking():
+    text = "```json\n" + json.dumps(PLAN, indent=2) + "\n```"
+    for seed in range(50):
+        rng = random.Random(seed)
+        parser, events, pos = PlanStreamParser(), [], 0
+        while pos < len(text):
+            step = rng.randint(1, 7)
+            events += parser.feed(text[pos:pos + step])
+            pos += step
+        thought = "".join(v for k, v in events if k == "thought")
+        actions = [v for k, v in events if k == "action"]
+        assert thought == PLAN["thought_summary"]
+        assert actions == [{"action": "open_url", "args": PLAN["args"]}]
+        assert parser.complete and parser.fields["done"] is False
+
+@pytest.mark.asyncio
+async def test_streamed_plan_dispatches_action_before_completion():
+    body = json.dumps(PLAN)
+    chunks = [body[i:i + 4] for i in range(0, len(body), 4)]
+    async with stub_openai_server(chunks, delay=0.01) as server:
+        with patch.object(settings, "LLM_BASE_URL", server.url), patch.object(settings, "LLM_API_KEY", "test"), \
+             patch.object(settings, "LLM_STREAMING", True):
+            provider = OpenAICompatibleProvider()
+            thoughts, dispatched = [], []
+
+            async def on_thought(delta):
+                thoughts.append(delta)
+
+            async def on_action(action, args):
+                dispatched.append((time.perf_counter(), action, args))
+
+            with patch("app.agents.planner.llm_service", provider):
+                start = time.perf_counter()
+                plan = await Planner().plan("task", [], "Current URL: about:blank", on_thought=on_thought, on_action=on_action)
+                end = time.perf_counter()
+
+    assert plan == PLAN
+    assert [(a, args) for _, a, args in dispatched] == [("open_url", PLAN["args"])]
+    # action/args are the first fields, so dispatch happens well before the stream ends
+    assert dispatched[0][0] - start < (end - start) / 2
+    assert len(thoughts) > 1 and "".join(thoughts) == PLAN["thought_summary"]
+
+@pytest.mark.asyncio
+async def test_dispatched_action_is_dropped_when_the_plan_differs(mock_browser):
+    executed = []
+
+    async def execute(action, page, **args):
+        executed.append(action)
+        if action == "click":
+            await asyncio.sleep(5)  # still running when the plan turns out different
+        return ToolResult(success=True, output="ok")
+
+    plans = iter([("click", {"action": "get_page_text", "args": {}}), (None, {"action": "finish", "args": {}})])
+
+    async def plan(task, history, context, use_cache=True, on_thought=None, on_action=None):
+        early, result = next(plans)
+        if early:
+            await on_action(early, {"selector": "#go"})
+            await asyncio.sleep(0)  # the dispatched tool starts
+        return result
+
+    session_id = await session_manager.create_session()
+    with patch("app.agents.orchestrator.planner.plan", plan), \
+         patch("app.agents.orchestrator.tool_executor.execute", execute):
+        started = time.monotonic()
+        status = await AgentOrchestrator().run_session(session_id, "t", wait_for_input=False)
+    assert status == "completed" and time.monotonic() - started < 2
+    # The click was cancelled, not awaited as the result of get_page_text
+    assert executed == ["click", "get_page_text"]
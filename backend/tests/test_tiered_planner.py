@@ -0,0 +1,43 @@
+import json
+import pytest
+from unittest.mock import AsyncMock, patch
+from app.agents.planner import Planner
+from app.core.config import settings
+
+TYPE = {"action": "type_text", "args": {"selector": "#q", "text": "rpa"}, "thought_summary": "t", "done": False}
+CLICK = {"action": "click", "args": {"selector": "#go"}, "thought_summary": "t", "confidence": 0.95, "done": False}
+
+def _step(plan, success=True):
+    return {"step": 0, "plan": plan, "result": {"success": success, "output": None}}
+
+async def _plan(fast_plan, history):
+    fast, large = AsyncMock(), AsyncMock()
+    fast.generate.return_value = json.dumps(fast_plan)
+    large.generate.return_value = json.dumps(CLICK)
+    with patch("app.agents.planner.llm_service", large), patch("app.agents.planner.fast_llm_service", fast), \
+         patch.object(settings, "PLANNER_TIERED", True), patch.object(settings, "PLAN_CACHE_ENABLED", False):
+        plan = await Planner().plan("task", history, "Current URL: a")
+    return plan, fast.generate.await_count, large.generate.await_count
+
+@pytest.mark.asyncio
+async def test_confident_fast_plan_is_used():
+    plan, fast_calls, large_calls = await _plan({**TYPE, "confidence": 0.9}, [])
+    assert plan["action"] == "type_text" and plan["tier"] == "fast"
+    assert (fast_calls, large_calls) == (1, 0)
+
+@pytest.mark.asyncio
+async def test_low_confidence_escalates():
+    plan, fast_calls, large_calls = await _plan({**TYPE, "confidence": 0.3}, [])
+    assert plan["action"] == "click" and plan["tier"] == "large"
+    assert (fast_calls, large_calls) == (1, 1)
+
+@pytest.mark.asyncio
+async def test_repeated_action_escalates():
+    plan, _, large_calls = await _plan({**TYPE, "confidence": 0.9}, [_step(TYPE)])
+    assert plan["tier"] == "large" and large_calls == 1
+
+@pytest.mark.asyncio
+async def test_failed_tool_goes_straight_to_the_large_model():
+    plan, fast_calls, large_calls = await _plan({**TYPE, "confidence": 0.9}, [_step(CLICK, success=False)])
+    assert plan["tier"] == "large"
+    assert (fast_calls, large_calls) == (0, 1)
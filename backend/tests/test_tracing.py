@@ -0,0 +1,73 @@
+import json
+import pytest
+from unittest.mock import AsyncMock, patch
+from httpx import AsyncClient, ASGITransport
+from app.main import app
+from app.core.config import settings
+from app.core.tracing import tracer, parse_traceparent, add_trace_context, FileExporter
+from app.worker.tasks import _run_session
+
+class ListExporter:
+    def __init__(self):
+        self.spans = []
+
+    def export(self, spans):
+        self.spans.extend(spans)
+
+@pytest.fixture
+def traced():
+    exporter = ListExporter()
+    tracer.flush()
+    with patch.object(settings, "TRACING_ENABLED", True), patch.object(tracer, "exporter", exporter):
+        yield exporter
+        tracer.flush()
+
+def test_nested_spans_share_a_trace(traced):
+    with tracer.span("outer") as outer:
+        with tracer.span("inner", tool="click") as inner:
+            pass
+        remote = parse_traceparent(outer.traceparent)
+    with tracer.span("remote", traceparent=outer.traceparent) as child:
+        pass
+    tracer.flush()
+
+    assert inner.parent_id == outer.span_id and inner.trace_id == outer.trace_id
+    assert remote == {"trace_id": outer.trace_id, "span_id": outer.span_id, "sampled": True}
+    assert child.trace_id == outer.trace_id and child.parent_id == outer.span_id
+    assert [span.name for span in traced.spans] == ["inner", "outer", "remote"]
+
+def test_log_lines_carry_the_trace_id(traced):
+    with tracer.span("step") as span:
+        inside = add_trace_context(None, "info", {"event": "inside"})
+    outside = add_trace_context(None, "info", {"event": "outside"})
+    assert inside["trace_id"] == span.trace_id and inside["span_id"] == span.span_id
+    assert "trace_id" not in outside
+
+def test_file_exporter_writes_otlp_json(traced, tmp_path):
+    with tracer.span("tool.execute", tool="click", success=True) as span:
+        pass
+    path = tmp_path / "traces.jsonl"
+    FileExporter(str(path)).export([span])
+    payload = json.loads(path.read_text().splitlines()[0])
+    exported = payload["resourceSpans"][0]["scopeSpans"][0]["spans"][0]
+    assert exported["traceId"] == span.trace_id and exported["name"] == "tool.execute"
+    assert {"key": "success", "value": {"boolValue": True}} in exported["attributes"]
+
+@pytest.mark.asyncio
+async def test_session_trace_spans_api_worker_planner_and_tools(traced, mock_browser):
+    with patch("app.api.endpoints.run_agent_task") as task:
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+            response = await ac.post("/api/v1/sessions", json={"task": "test task"})
+    assert response.status_code == 200
+    session_id, kwargs = task.delay.call_args.args[0], task.delay.call_args.kwargs
+
+    # What the worker does with the task's kwargs (a batch session, so it ends with its task)
+    with patch("app.worker.tasks.batch_manager", AsyncMock()):
+        await _run_session(session_id, "test task", False, "batch", kwargs["traceparent"], kwargs["enqueued_at"])
+    tracer.flush()
+
+    names = {span.name for span in traced.spans}
+    assert {"api.create_session", "celery.queue_wait", "worker.run_session", "agent.step",
+            "planner.plan", "tool.execute", "session.add_step"} <= names
+    root = next(span for span in traced.spans if span.name == "api.create_session")
+    assert {span.trace_id for span in traced.spans} == {root.trace_id}
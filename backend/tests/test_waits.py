@@ -0,0 +1,106 @@
+import time
+import asyncio
+import pytest
+from collections import defaultdict
+from unittest.mock import AsyncMock, MagicMock
+from app.core.config import settings
+from app.tools.executor import ToolExecutor
+
+class Request:
+    def __init__(self, resource_type: str = "xhr"):
+        self.resource_type = resource_type
+
+class FakePage:
+    """Emits Playwright-style page events on demand."""
+
+    def __init__(self):
+        self.url = "https://example.com/"
+        self.main_frame = object()
+        self.handlers = defaultdict(list)
+        self.set_default_timeout = MagicMock()
+        self.evaluate = AsyncMock(return_value={"settled": True, "mutations": 0})
+        self.wait_for_load_state = AsyncMock(return_value=None)
+        self.wait_for_selector = AsyncMock(return_value=None)
+        self.screenshot = AsyncMock(side_effect=RuntimeError("no screenshots in tests"))
+        self.click = AsyncMock(return_value=None)
+
+    def on(self, event, handler):
+        self.handlers[event].append(handler)
+
+    def emit(self, event, arg):
+        for handler in self.handlers[event]:
+            handler(arg)
+
+    def fetch(self, finish_after: float = None) -> Request:
+        request = Request()
+        self.emit("request", request)
+        if finish_after is not None:
+            asyncio.get_running_loop().call_later(finish_after, self.emit, "requestfinished", request)
+        return request
+
+@pytest.fixture
+def fast_waits(monkeypatch):
+    monkeypatch.setattr(settings, "WAIT_NETWORK_IDLE_MS", 100)
+    monkeypatch.setattr(settings, "WAIT_NETWORK_MAX_INFLIGHT", 2)
+
+@pytest.mark.asyncio
+async def test_click_returns_once_network_drops_to_threshold(fast_waits):
+    page = FakePage()
+
+    async def click(selector):
+        for delay in (0.1, 0.2, 0.3):
+            page.fetch(finish_after=delay)
+    page.click.side_effect = click
+
+    result = await ToolExecutor().execute("click", page, selector="#load")
+    assert result.success and result.settled
+    # Two requests pending count as idle: 0.1s for the first to finish + the 0.1s window
+    assert 0.15 <= result.wait_time < 0.3
+    # The tool's timeout applies to its own calls only; the page default is restored after
+    assert [call.args for call in page.set_default_timeout.call_args_list] == [(5000,), (30000,)]
+
+    page.click.side_effect = click
+    result = await ToolExecutor().execute("click", page, selector="#load", wait={"max_inflight": 0})
+    assert result.settled and 0.35 <= result.wait_time < 0.6
+
+@pytest.mark.asyncio
+async def test_click_that_navigates_waits_for_the_new_document(fast_waits):
+    page = FakePage()
+
+    async def click(selector):
+        page.url = "https://example.com/next"
+        page.emit("framenavigated", page.main_frame)
+    page.click.side_effect = click
+
+    result = await ToolExecutor().execute("click", page, selector="a")
+    assert result.success and result.settled
+    page.wait_for_load_state.assert_awaited_once()
+    assert page.wait_for_load_state.await_args.args == ("domcontentloaded",)
+
+    # type_text never waits for navigation, and its DOM check is the only wait
+    page.wait_for_load_state.reset_mock()
+    page.fill = AsyncMock(return_value=None)
+    result = await ToolExecutor().execute("type_text", page, selector="#q", text="shoes")
+    assert result.success and result.wait_time < 0.05
+    page.wait_for_load_state.assert_not_awaited()
+
+@pytest.mark.asyncio
+async def test_unmet_conditions_time_out_and_missing_selector_fails(fast_waits, monkeypatch):
+    monkeypatch.setattr(settings, "TOOL_TIMEOUTS_MS", {"click": 300})
+    page = FakePage()
+    page.click.side_effect = lambda selector: page.fetch() and None  # never finishes
+
+    start = time.monotonic()
+    result = await ToolExecutor().execute("click", page, selector="#go", wait={"max_inflight": 0})
+    assert result.success and result.settled is False
+    assert time.monotonic() - start < 0.5
+
+    page.wait_for_selector.side_effect = TimeoutError("Timeout 300ms exceeded.")
+    result = await ToolExecutor().execute("click", page, selector="#go", wait={"selector": "#results"})
+    assert not result.success and result.settled is False
+    assert "#results" in result.error
+
+    # The navigation that never came used up the budget: the selector check still gets a
+    # positive timeout (0 would make Playwright wait forever)
+    result = await ToolExecutor().execute("click", page, selector="#go", wait={"navigation": True, "selector": "#results"})
+    assert not result.success and page.wait_for_selector.await_args.kwargs["timeout"] >= 1
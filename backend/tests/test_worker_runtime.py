@@ -0,0 +1,54 @@
+import pytest
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from app.worker.runtime import AsyncWorkerRuntime
+
+def test_runtime_runs_sessions_concurrently_up_to_cap():
+    runtime = AsyncWorkerRuntime(max_sessions=3)
+    runtime.start()
+    lock = threading.Lock()
+    state = {"active": 0, "peak": 0, "loops": set()}
+
+    async def fake_session():
+        with lock:
+            state["active"] += 1
+            state["peak"] = max(state["peak"], state["active"])
+            state["loops"].add(id(asyncio.get_running_loop()))
+        await asyncio.sleep(0.05)
+        with lock:
+            state["active"] -= 1
+        return "done"
+
+    try:
+        with ThreadPoolExecutor(max_workers=6) as pool:
+            results = list(pool.map(lambda _: runtime.run(fake_session()), range(6)))
+    finally:
+        runtime.loop.call_soon_threadsafe(runtime.loop.stop)
+
+    assert results == ["done"] * 6
+    # All sessions share one loop, and never more than the cap run at once.
+    assert len(state["loops"]) == 1
+    assert state["peak"] == 3
+
+def test_runtime_run_times_out_when_full():
+    runtime = AsyncWorkerRuntime(max_sessions=1)
+    runtime.start()
+    release = threading.Event()
+
+    async def blocker():
+        while not release.is_set():
+            await asyncio.sleep(0.01)
+
+    try:
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            pending = pool.submit(runtime.run, blocker())
+            while runtime.active_sessions == 0:
+                time.sleep(0.01)
+            with pytest.raises(TimeoutError):
+                runtime.run(asyncio.sleep(0), timeout=0.05)
+            release.set()
+            pending.result()
+    finally:
+        runtime.loop.call_soon_threadsafe(runtime.loop.stop)
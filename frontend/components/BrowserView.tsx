@@ -15,16 +15,27 @@ export default function BrowserView({ sessionId }: BrowserViewProps) {
         if (!sessionId) return;
 
         const ws = new WebSocket(`ws://localhost:8000/api/v1/sessions/${sessionId}/ws`);
+        // Live-view frames arrive as binary JPEG messages
+        ws.binaryType = 'blob';
+        let frameUrl: string | null = null;
 
         ws.onopen = () => {
             console.log('Connected to session WS');
         };
 
         ws.onmessage = (event) => {
+            if (event.data instanceof Blob) {
+                const previous = frameUrl;
+                frameUrl = URL.createObjectURL(new Blob([event.data], { type: 'image/jpeg' }));
+                setScreenshot(frameUrl);
+                if (previous) URL.revokeObjectURL(previous);
+                return;
+            }
             try {
                 const parsed = JSON.parse(event.data);
                 if (parsed.type === 'image') {
-                    setScreenshot(parsed.data);
+                    // Frames arrive as a screenshot-store URL, or inline as a data URI
+                    setScreenshot(parsed.url ? `http://localhost:8000${parsed.url}` : parsed.data);
                 }
             } catch (e) {
                 // Ignore non-JSON or other formats
@@ -41,6 +52,7 @@ export default function BrowserView({ sessionId }: BrowserViewProps) {
 
         return () => {
             ws.close();
+            if (frameUrl) URL.revokeObjectURL(frameUrl);
         };
     }, [sessionId]);
 
@@ -10,6 +10,8 @@ export default function LogViewer({ sessionId }: LogViewerProps) {
     const [logs, setLogs] = useState<string[]>([]);
     const wsRef = useRef<WebSocket | null>(null);
     const endRef = useRef<HTMLDivElement>(null);
+    // Streamed planner thoughts arrive as deltas; keep them on one line
+    const thoughtRef = useRef<string | null>(null);
 
     useEffect(() => {
         if (!sessionId) return;
@@ -18,6 +20,22 @@ export default function LogViewer({ sessionId }: LogViewerProps) {
         wsRef.current = ws;
 
         ws.onmessage = (event) => {
+            // Skip binary live-view frames
+            if (typeof event.data !== 'string') return;
+            let data: any = null;
+            try {
+                data = JSON.parse(event.data);
+            } catch (e) {
+                // Not JSON, log as-is
+            }
+            if (data?.type === 'thought') {
+                const open = thoughtRef.current !== null;
+                thoughtRef.current = (thoughtRef.current ?? '') + data.delta;
+                const line = `thought: ${thoughtRef.current}`;
+                setLogs((prev) => open ? [...prev.slice(0, -1), line] : [...prev, line]);
+                return;
+            }
+            thoughtRef.current = null;
             setLogs((prev) => [...prev, event.data]);
         };
 